@@ -0,0 +1,2 @@
+# Connect Django signals
+from . import signals
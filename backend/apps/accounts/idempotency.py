@@ -0,0 +1,113 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+KEY_TTL = timedelta(hours=24)           # how long a key replays its stored response
+CLAIM_TIMEOUT = timedelta(seconds=60)   # an unfinished claim older than this belongs to a request that died
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    return _digest(json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str))
+
+
+def _claim(user_id, key_hash, request_hash, now):
+    """Take the key for this request; returns (row, None) when claimed, (None, existing row) otherwise"""
+    expires_at = now + KEY_TTL
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user_id=user_id, key_hash=key_hash, request_hash=request_hash,
+                created_at=now, expires_at=expires_at,
+            ), None
+    except IntegrityError:
+        pass
+    # Expired keys and claims abandoned by a crashed request can be taken over
+    keys = IdempotencyKey.objects.filter(user_id=user_id, key_hash=key_hash)
+    taken = keys.filter(
+        Q(expires_at__lte=now) | Q(status_code__isnull=True, created_at__lt=now - CLAIM_TIMEOUT)
+    ).update(request_hash=request_hash, status_code=None, response=None, created_at=now, expires_at=expires_at)
+    if taken:
+        return keys.get(), None
+    return None, keys.first()
+
+
+def replay(row, request_hash):
+    if row is None or row.status_code is None:
+        return Response({"detail": "A request with this Idempotency-Key is still in progress"},
+                        status=status.HTTP_409_CONFLICT)
+    if row.request_hash != request_hash:
+        return Response({"detail": "Idempotency-Key was already used for a different request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(row.response, status=row.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def run_once(request, run):
+    """
+    Run ``run()`` at most once per Idempotency-Key header of the requesting
+    user and return its response; a retry with the same key gets the stored
+    response back without running anything.
+
+    Only successful responses are kept. When ``run()`` fails the key is
+    released so the client can retry. Requests without the header run as
+    usual.
+    """
+    key = request.META.get(HEADER)
+    if not key or not request.user.is_authenticated:
+        return run()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({"detail": "Idempotency-Key is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+    key_hash = _digest(f"{request.method}:{request.path}:{key}")
+    request_hash = request_fingerprint(request)
+    claim, existing = _claim(request.user.pk, key_hash, request_hash, timezone.now())
+    if claim is None:
+        return replay(existing, request_hash)
+
+    mine = IdempotencyKey.objects.filter(pk=claim.pk, created_at=claim.created_at)
+    try:
+        # The stored response commits together with whatever the view wrote
+        with transaction.atomic():
+            response = run()
+            if status.is_success(response.status_code):
+                mine.update(status_code=response.status_code, response=response.data)
+            else:
+                mine.delete()
+    except Exception:
+        mine.delete()
+        raise
+    return response
+
+
+def idempotent(view):
+    """Honour the Idempotency-Key header on a function view or viewset action"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        return run_once(request, lambda: view(*args, **kwargs))
+    return wrapper
+
+
+def purge_expired(now=None):
+    """Delete keys past their TTL; returns how many were removed"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
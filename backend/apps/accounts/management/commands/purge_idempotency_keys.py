@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.accounts.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys past their TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=3600.0, help='Seconds between purges')
+        parser.add_argument('--once', action='store_true', help='Purge once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            deleted = purge_expired()
+            if deleted:
+                self.stdout.write(f"Purged {deleted} expired idempotency keys")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.utils.functional import SimpleLazyObject
+
+from .principals import ANONYMOUS, principal_for
+
+
+class PrincipalMiddleware:
+    """
+    Sets ``request.principal``: the role, vendor id and rider id of the
+    request user (ANONYMOUS when there is none).
+
+    It is resolved on first use, after DRF has authenticated the request,
+    and at most once per request; authenticated JWT users already carry it,
+    so it usually costs no query at all.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: principal_for(request.user) or ANONYMOUS)
+        return self.get_response(request)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_rider_license_plate_rider_vehicle_type_riderkyc_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(fields=['latitude', 'longitude'], name='vendor_lat_lon_idx'),
+        ),
+    ]
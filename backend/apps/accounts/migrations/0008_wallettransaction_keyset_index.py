@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_idempotencykey'),
+        ('orders', '0007_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['wallet', 'created_at', 'id'], name='wallet_txn_created_idx'),
+        ),
+    ]
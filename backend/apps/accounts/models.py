@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
@@ -37,6 +38,12 @@ class Vendor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Bounding-box range scans for nearby vendor search
+            models.Index(fields=['latitude', 'longitude'], name='vendor_lat_lon_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
@@ -123,6 +130,12 @@ class WalletTransaction(models.Model):
     order = models.ForeignKey('orders.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='wallet_transactions')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a wallet's history
+            models.Index(fields=['wallet', 'created_at', 'id'], name='wallet_txn_created_idx'),
+        ]
+
 class VendorKYC(models.Model):
     class Status(models.TextChoices):
         PENDING = 'pending', 'Pending Review'
@@ -277,3 +290,25 @@ class RiderKYC(models.Model):
         self.reviewed_by = admin_user
         self.admin_notes = notes
         self.save()
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key and the response its first request produced.
+
+    ``key_hash`` is the SHA-256 of the request method, path and raw key, so
+    raw keys never reach the database. ``status_code`` is null while the first request
+    is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key_hash = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key_hash'], name='idempotency_key_unique'),
+        ]
@@ -1,38 +1,27 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 from .models import Account
+from .principals import principal_for
+
+
+def _role(request):
+    # request.principal comes from PrincipalMiddleware; requests built without it resolve here
+    principal = getattr(request, "principal", None) or principal_for(getattr(request, "user", None))
+    return principal.role if principal else None
 
 
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
-        user = getattr(request, "user", None)
-        if not user or not user.is_authenticated:
-            return False
-        try:
-            return user.account.role == Account.Role.ADMIN
-        except Exception:
-            return False
+        return _role(request) == Account.Role.ADMIN
 
 
 class IsVendor(BasePermission):
     def has_permission(self, request, view):
-        user = getattr(request, "user", None)
-        if not user or not user.is_authenticated:
-            return False
-        try:
-            return user.account.role == Account.Role.VENDOR
-        except Exception:
-            return False
+        return _role(request) == Account.Role.VENDOR
 
 
 class IsRider(BasePermission):
     def has_permission(self, request, view):
-        user = getattr(request, "user", None)
-        if not user or not user.is_authenticated:
-            return False
-        try:
-            return user.account.role == Account.Role.RIDER
-        except Exception:
-            return False
+        return _role(request) == Account.Role.RIDER
 
 
 class ReadOnly(BasePermission):
@@ -47,8 +36,4 @@ class IsVendorOrRiderOrAdmin(BasePermission):
             return False
         if getattr(user, 'is_superuser', False):
             return True
-        try:
-            role = user.account.role
-            return role in (Account.Role.VENDOR, Account.Role.RIDER, Account.Role.ADMIN)
-        except Exception:
-            return False
+        return _role(request) in (Account.Role.VENDOR, Account.Role.RIDER, Account.Role.ADMIN)
@@ -0,0 +1,94 @@
+import copy
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from rest_framework_simplejwt.settings import api_settings
+
+
+MAX_ENTRIES = 10000  # users kept in the cache, least recently used evicted first
+
+# What authorization checks need to know about a user; role is None without an Account
+Principal = namedtuple('Principal', ['user_id', 'role', 'vendor_id', 'rider_id'])
+ANONYMOUS = Principal(None, None, None, None)
+
+
+def token_lifetime():
+    return api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of user id -> (User, Principal).
+
+    A miss loads the user with their role, vendor id and rider id in one
+    query. Entries expire after an access-token lifetime, and the
+    apps.accounts signals drop a user's entry when their user, account,
+    vendor or rider row changes. Other processes only see such a change
+    when their entry expires.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        user = User.objects.filter(pk=user_id).annotate(
+            principal_role=F('account__role'),
+            principal_vendor=F('vendor__id'),
+            principal_rider=F('rider__id'),
+        ).first()
+        if user is None:
+            return None
+        principal = Principal(user.pk, user.principal_role, user.principal_vendor, user.principal_rider)
+        del user.principal_role, user.principal_vendor, user.principal_rider
+        return user, principal
+
+    def lookup(self, user_id):
+        """(User, Principal) for ``user_id``, or None if there is no such user; the User is a private copy"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return copy.copy(entry[1]), entry[2]
+        loaded = self._load(user_id)
+        if loaded is None:
+            return None
+        ttl = self.ttl if self.ttl is not None else token_lifetime()
+        with self._lock:
+            self._entries[user_id] = (now + ttl, loaded[0], loaded[1])
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return copy.copy(loaded[0]), loaded[1]
+
+    def get(self, user_id):
+        """Principal for ``user_id``, or None"""
+        entry = self.lookup(user_id)
+        return entry[1] if entry else None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principals = PrincipalCache()
+
+
+def principal_for(user):
+    """Principal of a request or socket user; None for anonymous users"""
+    if user is None or not user.is_authenticated:
+        return None
+    principal = getattr(user, 'principal', None)
+    if principal is None:
+        principal = principals.get(user.pk)
+    return principal
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from core.serializers import SparseFieldsMixin
 from .models import Account, Vendor, Rider, Wallet, WalletTransaction, VendorKYC, RiderKYC
 
 
@@ -18,9 +19,10 @@ class AccountSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
 
-class VendorSerializer(serializers.ModelSerializer):
+class VendorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     owner_user_id = serializers.IntegerField(write_only=True, required=True, help_text="ID of the user who will own this vendor")
+    expandable_fields = ("owner",)
 
     class Meta:
         model = Vendor
@@ -176,8 +178,9 @@ class WalletSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
 
-class WalletTransactionSerializer(serializers.ModelSerializer):
+class WalletTransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     wallet = WalletSerializer(read_only=True)
+    expandable_fields = ("wallet",)
 
     class Meta:
         model = WalletTransaction
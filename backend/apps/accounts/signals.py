@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+def _forget(user_id):
+    from .principals import principals
+
+    principals.invalidate(user_id)
+    # Also after commit, so a concurrent request cannot re-cache the old row
+    transaction.on_commit(lambda: principals.invalidate(user_id))
+
+
+@receiver(post_save, sender='auth.User')
+@receiver(post_delete, sender='auth.User')
+def forget_user_principal(sender, instance, **kwargs):
+    _forget(instance.pk)
+
+
+@receiver(post_save, sender='accounts.Account')
+@receiver(post_delete, sender='accounts.Account')
+def forget_account_principal(sender, instance, **kwargs):
+    _forget(instance.user_id)
+
+
+@receiver(post_save, sender='accounts.Vendor')
+@receiver(post_delete, sender='accounts.Vendor')
+def forget_vendor_principal(sender, instance, created=False, **kwargs):
+    # Only the vendor id is cached; ordinary profile edits leave it unchanged
+    if created or kwargs.get('signal') is post_delete:
+        _forget(instance.owner_id)
+
+
+@receiver(post_save, sender='accounts.Rider')
+@receiver(post_delete, sender='accounts.Rider')
+def forget_rider_principal(sender, instance, created=False, **kwargs):
+    # Riders are saved on every status change; only creation and removal change the cached id
+    if created or kwargs.get('signal') is post_delete:
+        _forget(instance.user_id)
@@ -1,3 +1,241 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.catalog.models import Product
+from apps.orders.models import Order
+from apps.orders.outbox import outbox
+from .idempotency import _digest, purge_expired
+from .middleware import PrincipalMiddleware
+from .models import Account, IdempotencyKey, Rider, Vendor, Wallet, WalletTransaction
+from .principals import ANONYMOUS, PrincipalCache, principals
+
+
+class NearbyVendorTests(TestCase):
+    """Nearby vendor search with the sparse fieldset parameters"""
+
+    def setUp(self):
+        owner = User.objects.create(username='owner')
+        self.vendor = Vendor.objects.create(owner=owner, name='Deli', approved=True, latitude=2.046, longitude=45.318)
+        self.client = APIClient()
+
+    def test_fields_without_coordinates(self):
+        response = self.client.get('/api/vendors/nearby', {'lat': 2.04, 'lon': 45.31, 'fields': 'id,name'})
+        self.assertEqual(response.status_code, 200)
+        result = response.data['results'][0]
+        self.assertEqual(result['id'], self.vendor.id)
+        self.assertNotIn('latitude', result)
+        self.assertGreaterEqual(result['eta_minutes'], 1)
+
+
+class IdempotencyTests(TestCase):
+    """Retried order placements and withdrawals run once"""
+
+    withdraw_url = '/api/rider/wallet/withdraw/'
+
+    def setUp(self):
+        self.user = User.objects.create(username='rider')
+        self.wallet = Wallet.objects.create(rider=Rider.objects.create(user=self.user), balance=Decimal('50.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        outbox.reset()
+
+    def withdraw(self, amount, key='key-1'):
+        return self.client.post(self.withdraw_url, {'amount': amount}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_the_first_response(self):
+        first = self.withdraw('20')
+        second = self.withdraw('20')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((second.status_code, second.data), (200, first.data))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+        # Another key is another request
+        self.withdraw('20', key='key-2')
+        self.assertEqual(WalletTransaction.objects.count(), 2)
+
+    def test_order_placement_replays(self):
+        vendor = Vendor.objects.create(owner=User.objects.create(username='owner'), name='Deli')
+        product = Product.objects.create(vendor=vendor, name='Bread', price=Decimal('3.00'), stock=10)
+        payload = {'vendor': vendor.id, 'items': [{'product': product.id, 'quantity': 2}]}
+        first = self.client.post('/api/orders/', payload, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+        second = self.client.post('/api/orders/', payload, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((second.status_code, second.data['id']), (201, first.data['id']))
+        self.assertEqual(Order.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 8)
+
+    def test_same_key_different_body(self):
+        self.withdraw('20')
+        response = self.withdraw('30')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+    def test_request_in_flight(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key_hash=_digest(f"POST:{self.withdraw_url}:key-1"), request_hash='running',
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.withdraw('20').status_code, 409)
+        self.assertEqual(WalletTransaction.objects.count(), 0)
+
+    def test_failed_attempt_is_not_stored(self):
+        self.assertEqual(self.withdraw('80').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=Decimal('100.00'))
+        self.assertEqual(self.withdraw('80').status_code, 200)
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+    def test_purge_expired(self):
+        now = timezone.now()
+        for name, expires_at in (('old', now - timedelta(seconds=1)), ('live', now + timedelta(hours=1))):
+            IdempotencyKey.objects.create(user=self.user, key_hash=name, request_hash='', expires_at=expires_at)
+        self.assertEqual(purge_expired(now), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key_hash', flat=True)), ['live'])
+
+
+class PrincipalCacheTests(TestCase):
+    """Cached principals follow role, vendor, rider and activation changes"""
+
+    def setUp(self):
+        principals.clear()
+        self.user = User.objects.create(username='sam')
+        self.account = Account.objects.create(user=self.user, role=Account.Role.CUSTOMER, phone_number='1')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def tearDown(self):
+        principals.clear()
+
+    def test_lookup_is_cached(self):
+        with self.assertNumQueries(1):
+            user, principal = principals.lookup(self.user.pk)
+            self.assertEqual(principals.lookup(self.user.pk)[1], principal)
+        self.assertEqual(principal, (self.user.pk, 'customer', None, None))
+        # Callers get their own copy of the user
+        user.first_name = 'changed'
+        self.assertEqual(principals.lookup(self.user.pk)[0].first_name, '')
+        self.assertIsNone(principals.lookup(self.user.pk + 100))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = PrincipalCache(max_entries=2)
+        others = [User.objects.create(username=name) for name in ('a', 'b')]
+        cache.lookup(self.user.pk)
+        cache.lookup(others[0].pk)
+        cache.lookup(self.user.pk)
+        cache.lookup(others[1].pk)
+        with self.assertNumQueries(0):
+            cache.lookup(self.user.pk)
+        with self.assertNumQueries(1):
+            cache.lookup(others[0].pk)
+
+    def test_entries_expire(self):
+        cache = PrincipalCache(ttl=0)
+        cache.lookup(self.user.pk)
+        with self.assertNumQueries(1):
+            cache.lookup(self.user.pk)
+
+    def test_role_and_vendor_change_seen_on_next_request(self):
+        self.assertEqual(self.client.get('/api/vendor/products/').data, [])
+        self.account.role = Account.Role.VENDOR
+        self.account.save()
+        vendor = Vendor.objects.create(owner=self.user, name='Bakery')
+        Product.objects.create(vendor=vendor, name='Cake', price=Decimal('9.00'), stock=1)
+        response = self.client.get('/api/vendor/products/')
+        self.assertEqual([product['name'] for product in response.data], ['Cake'])
+        self.assertEqual(principals.get(self.user.pk), (self.user.pk, 'vendor', vendor.pk, None))
+
+    def test_rider_change_seen_on_next_request(self):
+        self.account.role = Account.Role.RIDER
+        self.account.save()
+        self.assertEqual(principals.get(self.user.pk).rider_id, None)
+        rider = Rider.objects.create(user=self.user)
+        self.assertEqual(principals.get(self.user.pk).rider_id, rider.pk)
+        rider.delete()
+        self.assertEqual(principals.get(self.user.pk).rider_id, None)
+
+    def test_deactivated_user_rejected(self):
+        self.assertEqual(self.client.get('/api/orders/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+
+
+class PrincipalMiddlewareTests(TestCase):
+    """Order scoping by request.principal matches scoping by the user's vendor and rider rows"""
+
+    def setUp(self):
+        principals.clear()
+        self.customer = self.user('customer', Account.Role.CUSTOMER)
+        other = self.user('other', Account.Role.CUSTOMER)
+        vendors = [Vendor.objects.create(owner=self.user(name, Account.Role.VENDOR), name=name)
+                   for name in ('deli', 'bakery')]
+        riders = [Rider.objects.create(user=self.user(name, Account.Role.RIDER)) for name in ('ali', 'bo')]
+        Order.objects.create(customer=self.customer, vendor=vendors[0], rider=riders[0])
+        Order.objects.create(customer=other, vendor=vendors[1], rider=riders[1])
+        Order.objects.create(customer=self.customer, vendor=vendors[1])
+
+    def tearDown(self):
+        principals.clear()
+
+    def user(self, name, role):
+        user = User.objects.create(username=name)
+        Account.objects.create(user=user, role=role, phone_number=name)
+        return user
+
+    def listed(self, username, **params):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(User.objects.get(username=username))}")
+        response = client.get('/api/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(order['id'] for order in response.data['results'])
+
+    def assertScoped(self, username, orders):
+        expected = sorted(orders.values_list('id', flat=True))
+        self.assertEqual(self.listed(username), expected)
+        # The nesting serializer path scopes the queryset the same way
+        self.assertEqual(self.listed(username, expand='items'), expected)
+
+    def test_customer(self):
+        self.assertScoped('customer', Order.objects.filter(customer=self.customer))
+
+    def test_vendor(self):
+        for user in User.objects.filter(account__role=Account.Role.VENDOR):
+            self.assertScoped(user.username, Order.objects.filter(vendor=user.vendor))
+
+    def test_vendor_without_profile(self):
+        self.user('pending', Account.Role.VENDOR)
+        self.assertEqual(self.listed('pending'), [])
+
+    def test_rider(self):
+        for user in User.objects.filter(account__role=Account.Role.RIDER):
+            self.assertScoped(user.username, Order.objects.filter(rider=user.rider))
+
+    def test_admin(self):
+        self.user('root', Account.Role.ADMIN)
+        self.assertScoped('root', Order.objects.all())
+
+    def test_other_vendors_order_hidden(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(User.objects.get(username='deli'))}")
+        hidden = Order.objects.exclude(vendor__owner__username='deli').first()
+        self.assertEqual(client.get(f'/api/orders/{hidden.id}/').status_code, 404)
+
+    def test_anonymous_rejected(self):
+        self.assertEqual(APIClient().get('/api/orders/').status_code, 401)
+        self.assertEqual(APIClient().get('/api/vendor/products/').status_code, 401)
+
+    def test_anonymous_principal(self):
+        seen = []
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        PrincipalMiddleware(lambda request: seen.append(request.principal.role))(request)
+        self.assertEqual((seen, request.principal), ([None], ANONYMOUS))
@@ -19,8 +19,36 @@ from .serializers import (
 )
 from .serializers import AdminUserCreateSerializer
 from .permissions import IsAdmin, IsVendor, ReadOnly
+from .idempotency import idempotent
+from core.pagination import KeysetPagination
 from apps.catalog.models import Product
 from apps.catalog.serializers import ProductSerializer
+from apps.orders.eta import eta_minutes
+from apps.orders.geo import bounding_box, haversine_km
+
+
+NEARBY_DEFAULT_RADIUS_KM = 5.0
+NEARBY_MAX_RADIUS_KM = 50.0
+NEARBY_PAGE_SIZE = 20
+NEARBY_MAX_PAGE_SIZE = 50
+
+# Nearby ranking weights; each component is normalised to 0..1
+RANK_DISTANCE_WEIGHT = 0.5
+RANK_RATING_WEIGHT = 0.35
+RANK_DISCOUNT_WEIGHT = 0.15
+RATING_PRIOR_MEAN = 3.5   # ratings are shrunk towards this...
+RATING_PRIOR_COUNT = 10   # ...as if every vendor had this many extra reviews
+
+
+def vendor_rank_score(distance_km, radius_km, rating, rating_count, discount_percent):
+    """Blend proximity, review-count-weighted rating and discount into one score"""
+    proximity = 1 - distance_km / radius_km
+    rating = (float(rating) * rating_count + RATING_PRIOR_MEAN * RATING_PRIOR_COUNT) / (rating_count + RATING_PRIOR_COUNT)
+    return (
+        RANK_DISTANCE_WEIGHT * proximity
+        + RANK_RATING_WEIGHT * rating / 5
+        + RANK_DISCOUNT_WEIGHT * min(discount_percent, 100) / 100
+    )
 
 
 class VendorProductViewSet(viewsets.ModelViewSet):
@@ -36,51 +64,33 @@ class VendorProductViewSet(viewsets.ModelViewSet):
         """
         Return only products belonging to the authenticated vendor.
         """
-        user = self.request.user
-        if not hasattr(user, 'account') or user.account.role != 'vendor':
-            return Product.objects.none()
-
-        try:
-            vendor = Vendor.objects.get(owner=user)  # Use owner field
-            return Product.objects.filter(vendor=vendor)
-        except Vendor.DoesNotExist:
+        principal = self.request.principal
+        if principal.role != 'vendor' or principal.vendor_id is None:
             return Product.objects.none()
+        return Product.objects.filter(vendor_id=principal.vendor_id)
+
+    def own_vendor_id(self, verb):
+        """The requesting vendor's id; only vendors with a profile may ``verb`` products"""
+        principal = self.request.principal
+        if principal.role != 'vendor':
+            raise PermissionDenied(f"Only vendors can {verb} products")
+        if principal.vendor_id is None:
+            raise PermissionDenied("Vendor profile not found")
+        return principal.vendor_id
 
     def perform_create(self, serializer):
         """
         Create a product for the authenticated vendor.
         """
-        user = self.request.user
-
-        # Ensure the user is a vendor
-        if not hasattr(user, 'account') or user.account.role != 'vendor':
-            raise PermissionDenied("Only vendors can create products")
-
-        try:
-            vendor = Vendor.objects.get(owner=user)
-        except Vendor.DoesNotExist:
-            raise PermissionDenied("Vendor profile not found")
-
-        # Create product for this vendor
-        serializer.save(vendor=vendor)
+        serializer.save(vendor_id=self.own_vendor_id("create"))
 
     def perform_update(self, serializer):
         """
         Update a product - ensure vendor owns the product.
         """
-        user = self.request.user
         product = self.get_object()
-
-        # Ensure the user is a vendor and owns this product
-        if not hasattr(user, 'account') or user.account.role != 'vendor':
-            raise PermissionDenied("Only vendors can update products")
-
-        try:
-            vendor = Vendor.objects.get(owner=user)
-            if product.vendor != vendor:
-                raise PermissionDenied("You can only update your own products")
-        except Vendor.DoesNotExist:
-            raise PermissionDenied("Vendor profile not found")
+        if product.vendor_id != self.own_vendor_id("update"):
+            raise PermissionDenied("You can only update your own products")
 
         serializer.save()
 
@@ -88,37 +98,17 @@ class VendorProductViewSet(viewsets.ModelViewSet):
         """
         Delete a product - ensure vendor owns the product.
         """
-        user = self.request.user
-
-        # Ensure the user is a vendor and owns this product
-        if not hasattr(user, 'account') or user.account.role != 'vendor':
-            raise PermissionDenied("Only vendors can delete products")
-
-        try:
-            vendor = Vendor.objects.get(owner=user)
-            if instance.vendor != vendor:
-                raise PermissionDenied("You can only delete your own products")
-        except Vendor.DoesNotExist:
-            raise PermissionDenied("Vendor profile not found")
+        if instance.vendor_id != self.own_vendor_id("delete"):
+            raise PermissionDenied("You can only delete your own products")
 
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         """Approve a product (vendor can approve their own products)"""
         product = self.get_object()
-        user = request.user
-
-        # Ensure the user is a vendor and owns this product
-        if not hasattr(user, 'account') or user.account.role != 'vendor':
-            raise PermissionDenied("Only vendors can approve products")
+        if product.vendor_id != self.own_vendor_id("approve"):
+            raise PermissionDenied("You can only approve your own products")
 
-        try:
-            vendor = Vendor.objects.get(owner=user)
-            if product.vendor != vendor:
-                raise PermissionDenied("You can only approve your own products")
-        except Vendor.DoesNotExist:
-            raise PermissionDenied("Vendor profile not found")
-
-        product.approve(user)
+        product.approve(request.user)
 
         # Return updated product data
         serializer = self.get_serializer(product)
@@ -128,21 +118,11 @@ class VendorProductViewSet(viewsets.ModelViewSet):
     def reject(self, request, pk=None):
         """Reject a product (vendor can reject their own products)"""
         product = self.get_object()
-        user = request.user
         reason = request.data.get('reason', '')
+        if product.vendor_id != self.own_vendor_id("reject"):
+            raise PermissionDenied("You can only reject your own products")
 
-        # Ensure the user is a vendor and owns this product
-        if not hasattr(user, 'account') or user.account.role != 'vendor':
-            raise PermissionDenied("Only vendors can reject products")
-
-        try:
-            vendor = Vendor.objects.get(owner=user)
-            if product.vendor != vendor:
-                raise PermissionDenied("You can only reject your own products")
-        except Vendor.DoesNotExist:
-            raise PermissionDenied("Vendor profile not found")
-
-        product.reject(user, reason)
+        product.reject(request.user, reason)
 
         # Return updated product data
         serializer = self.get_serializer(product)
@@ -598,12 +578,14 @@ class VendorViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return qs.filter(approved=True)
 
+        role = self.request.principal.role
+
         # Superusers and admins can see all vendors
-        if user.is_superuser or (hasattr(user, 'account') and user.account.role == 'admin'):
+        if user.is_superuser or role == 'admin':
             return qs
 
         # Vendors can only see their own vendor profile
-        if hasattr(user, 'account') and user.account.role == 'vendor':
+        if role == 'vendor':
             return qs.filter(owner=user)
 
         # Default: only show approved vendors to other authenticated users
@@ -661,9 +643,7 @@ class VendorViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         # Only admins can create vendors via the API
-        if not (self.request.user.is_superuser or
-               (hasattr(self.request.user, 'account') and
-                self.request.user.account.role == 'admin')):
+        if not (self.request.user.is_superuser or self.request.principal.role == 'admin'):
             raise PermissionDenied("Only administrators can create vendors")
 
         # The actual creation is handled by the serializer
@@ -672,13 +652,66 @@ class VendorViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         # Only admins or the vendor owner can update vendor info
         user = self.request.user
-        if not (user.is_superuser or
-               (hasattr(user, 'account') and
-                (user.account.role == 'admin' or
-                 (user.account.role == 'vendor' and serializer.instance.owner == user)))):
+        principal = self.request.principal
+        if not (user.is_superuser or principal.role == 'admin' or
+                (principal.role == 'vendor' and serializer.instance.pk == principal.vendor_id)):
             raise PermissionDenied("You do not have permission to update this vendor")
         serializer.save()
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def nearby(self, request):
+        """
+        Approved vendors around ?lat=&lon= within ?radius= km (default 5, max 50),
+        ranked by a blend of distance, rating confidence and discount.
+        Paged with ?page= and ?page_size=.
+        """
+        params = request.query_params
+        try:
+            lat = float(params['lat'])
+            lon = float(params['lon'])
+            radius = min(float(params.get('radius', NEARBY_DEFAULT_RADIUS_KM)), NEARBY_MAX_RADIUS_KM)
+            page = max(int(params.get('page', 1)), 1)
+            page_size = min(max(int(params.get('page_size', NEARBY_PAGE_SIZE)), 1), NEARBY_MAX_PAGE_SIZE)
+        except (KeyError, ValueError, TypeError):
+            return Response({'detail': 'lat and lon are required numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius <= 0:
+            return Response({'detail': 'Invalid coordinates or radius'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Index-backed range scan on the bounding box, then exact haversine refinement
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius)
+        candidates = Vendor.objects.filter(
+            approved=True,
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon),
+        ).values_list('id', 'latitude', 'longitude', 'rating', 'rating_count', 'discount_percent')
+
+        ranked = []
+        for vendor_id, v_lat, v_lon, rating, rating_count, discount in candidates:
+            distance = haversine_km(lat, lon, v_lat, v_lon)
+            if distance <= radius:
+                ranked.append((vendor_rank_score(distance, radius, rating, rating_count, discount), distance, vendor_id))
+        ranked.sort(key=lambda r: (-r[0], r[1]))
+
+        start = (page - 1) * page_size
+        page_rows = ranked[start:start + page_size]
+        vendors = Vendor.objects.select_related('owner').in_bulk([vendor_id for _, _, vendor_id in page_rows])
+        results = []
+        for score, distance, vendor_id in page_rows:
+            vendor = vendors[vendor_id]
+            data = self.get_serializer(vendor).data
+            data['distance_km'] = round(distance, 2)
+            # From the model: ?fields= may have trimmed the coordinates out of data
+            data['eta_minutes'] = eta_minutes(vendor.latitude, vendor.longitude, distance)
+            data['score'] = round(score, 4)
+            results.append(data)
+
+        return Response({
+            'count': len(ranked),
+            'page': page,
+            'page_size': page_size,
+            'results': results,
+        })
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def analytics(self, request):
         """Get vendor analytics for the current user"""
@@ -782,18 +815,22 @@ def rider_wallet_transactions(request):
 
     try:
         wallet = Wallet.objects.get(rider__user=user)
-        transactions = WalletTransaction.objects.filter(wallet=wallet).order_by('-created_at')
-        serializer = WalletTransactionSerializer(transactions, many=True)
+        transactions = WalletTransaction.objects.filter(wallet=wallet).select_related('wallet__rider__user')
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(transactions, request)
+        serializer = WalletTransactionSerializer(page, many=True, context={'request': request})
         return Response({
             'transactions': serializer.data,
+            'next': paginator.get_next_link(),
             'total_transactions': transactions.count()
         })
     except Wallet.DoesNotExist:
-        return Response({'transactions': [], 'total_transactions': 0})
+        return Response({'transactions': [], 'next': None, 'total_transactions': 0})
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent
 def rider_wallet_withdraw(request):
     """Process rider wallet withdrawal request"""
     user = request.user
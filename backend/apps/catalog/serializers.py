@@ -1,12 +1,14 @@
 from rest_framework import serializers
 from .models import Product
 from apps.accounts.serializers import VendorSerializer
+from core.serializers import SparseFieldsMixin
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     vendor = VendorSerializer(read_only=True)
     vendor_id = serializers.IntegerField(write_only=True, required=False)
     approved_by = serializers.StringRelatedField(read_only=True)
+    expandable_fields = ("vendor", "approved_by")
 
     class Meta:
         model = Product
@@ -35,14 +35,11 @@ class ProductViewSet(viewsets.ModelViewSet):
         if not user or not user.is_authenticated:
             return qs  # Return all products for testing
 
-        try:
-            role = user.account.role
-        except Exception:
-            role = None
+        role = self.request.principal.role
 
         if role == 'vendor':
             # Vendors can only see their own products
-            return qs.filter(vendor__owner=user)
+            return qs.filter(vendor_id=self.request.principal.vendor_id)
         elif user.is_superuser or role == 'admin':
             # Admins can see all products
             return qs
@@ -51,14 +48,10 @@ class ProductViewSet(viewsets.ModelViewSet):
             return qs.filter(approval_status='approved', active=True)
 
     def perform_update(self, serializer):
-        user = self.request.user
         obj = self.get_object()
         # If vendor, ensure ownership
-        try:
-            role = user.account.role
-        except Exception:
-            role = None
-        if role == 'vendor' and obj.vendor.owner != user:
+        role = self.request.principal.role
+        if role == 'vendor' and obj.vendor_id != self.request.principal.vendor_id:
             raise permissions.PermissionDenied("Cannot modify products of other vendors")
         serializer.save()
 
@@ -79,10 +72,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         user = request.user
 
         # Check if user is admin
-        try:
-            role = user.account.role
-        except Exception:
-            role = None
+        role = self.request.principal.role
 
         if not (user.is_superuser or role == 'admin'):
             raise permissions.PermissionDenied("Only administrators can approve products")
@@ -101,10 +91,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         reason = request.data.get('reason', '')
 
         # Check if user is admin
-        try:
-            role = user.account.role
-        except Exception:
-            role = None
+        role = self.request.principal.role
 
         if not (user.is_superuser or role == 'admin'):
             raise permissions.PermissionDenied("Only administrators can reject products")
@@ -122,10 +109,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         user = request.user
 
         # Check if user is admin
-        try:
-            role = user.account.role
-        except Exception:
-            role = None
+        role = self.request.principal.role
 
         if not (user.is_superuser or role == 'admin'):
             raise permissions.PermissionDenied("Only administrators can toggle product active status")
@@ -139,11 +123,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def perform_destroy(self, instance):
-        user = self.request.user
-        try:
-            role = user.account.role
-        except Exception:
-            role = None
-        if role == 'vendor' and instance.vendor.owner != user:
+        role = self.request.principal.role
+        if role == 'vendor' and instance.vendor_id != self.request.principal.vendor_id:
             raise permissions.PermissionDenied("Cannot delete products of other vendors")
         return super().perform_destroy(instance)
@@ -1,6 +1,12 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
 from .models import Order, OrderItem, OrderEvent
+from .counters import status_counters
+from .dashboard import dashboard_publisher
+from .rollups import day_bounds, rebuild
+from .placement import release_stock
+from .snapshots import snapshots
 from core.admin import marketplace_admin
 
 
@@ -44,33 +50,49 @@ class OrderAdmin(admin.ModelAdmin):
     )
     actions = ['mark_pending', 'mark_accepted', 'mark_assigned', 'mark_on_way', 'mark_delivered', 'mark_cancelled']
 
+    def _set_status(self, queryset, status):
+        # Bulk updates skip post_save, so rebuild the affected rollup days and recount
+        start, end = day_bounds(queryset)
+        order_ids = list(queryset.values_list('id', flat=True))
+        queryset.update(status=status)
+        snapshots.mark_stale(order_ids)
+        if start is not None:
+            rebuild(start, end)
+        status_counters.reconcile()
+        dashboard_publisher.mark_changed()
+
     def mark_pending(self, request, queryset):
-        queryset.update(status=Order.Status.PENDING)
+        self._set_status(queryset, Order.Status.PENDING)
         self.message_user(request, f"Marked {queryset.count()} order(s) as pending")
     mark_pending.short_description = "Mark selected orders as pending"
 
     def mark_accepted(self, request, queryset):
-        queryset.update(status=Order.Status.ACCEPTED)
+        self._set_status(queryset, Order.Status.ACCEPTED)
         self.message_user(request, f"Marked {queryset.count()} order(s) as accepted")
     mark_accepted.short_description = "Mark selected orders as accepted"
 
     def mark_assigned(self, request, queryset):
-        queryset.update(status=Order.Status.ASSIGNED)
+        self._set_status(queryset, Order.Status.ASSIGNED)
         self.message_user(request, f"Marked {queryset.count()} order(s) as assigned")
     mark_assigned.short_description = "Mark selected orders as assigned"
 
     def mark_on_way(self, request, queryset):
-        queryset.update(status=Order.Status.ON_WAY)
+        self._set_status(queryset, Order.Status.ON_WAY)
         self.message_user(request, f"Marked {queryset.count()} order(s) as on the way")
     mark_on_way.short_description = "Mark selected orders as on the way"
 
     def mark_delivered(self, request, queryset):
-        queryset.update(status=Order.Status.DELIVERED)
+        self._set_status(queryset, Order.Status.DELIVERED)
         self.message_user(request, f"Marked {queryset.count()} order(s) as delivered")
     mark_delivered.short_description = "Mark selected orders as delivered"
 
     def mark_cancelled(self, request, queryset):
-        queryset.update(status=Order.Status.CANCELLED)
+        with transaction.atomic():
+            # Orders still holding stock give it back
+            release_stock(list(queryset.exclude(
+                status__in=[Order.Status.CANCELLED, Order.Status.DELIVERED]
+            ).values_list('id', flat=True)))
+            self._set_status(queryset, Order.Status.CANCELLED)
         self.message_user(request, f"Marked {queryset.count()} order(s) as cancelled")
     mark_cancelled.short_description = "Mark selected orders as cancelled"
 
@@ -0,0 +1,197 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderEvent
+
+
+GENERATION_KEY = 'analytics:generation'
+
+# Named ranges accepted by the detailed analytics endpoint and consumer
+RANGES = ('today', 'yesterday', 'last_7_days', 'last_30_days')
+
+
+def day_start(day):
+    """Aware datetime at midnight of ``day``; range filters on it can use the created_at index"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def order_totals(today):
+    """All-time and today's order totals in a single aggregate query"""
+    today_filter = Q(created_at__gte=day_start(today), created_at__lt=day_start(today + timedelta(days=1)))
+    totals = Order.objects.aggregate(
+        total_orders=Count('id'),
+        total_revenue=Sum('total_amount'),
+        total_users=Count('customer', distinct=True),
+        active_vendors=Count('vendor', distinct=True),
+        orders_today=Count('id', filter=today_filter),
+        gmv_today=Sum('total_amount', filter=today_filter),
+    )
+    totals['total_revenue'] = float(totals['total_revenue'] or 0)
+    totals['gmv_today'] = float(totals['gmv_today'] or 0)
+    return totals
+
+
+def status_counts():
+    """Number of orders per status, every status present"""
+    counts = {status: 0 for status, _ in Order.Status.choices}
+    for row in Order.objects.order_by().values('status').annotate(n=Count('id')):
+        counts[row['status']] = row['n']
+    return counts
+
+
+def daily_counts(today, days=7):
+    """Orders per day for the last ``days`` days, oldest first, zero-filled"""
+    start = today - timedelta(days=days - 1)
+    per_day = dict(
+        Order.objects.filter(created_at__gte=day_start(start), created_at__lt=day_start(today + timedelta(days=1)))
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values('day')
+        .annotate(n=Count('id'))
+        .values_list('day', 'n')
+    )
+    return [
+        {'date': (start + timedelta(days=i)).strftime('%Y-%m-%d'), 'count': per_day.get(start + timedelta(days=i), 0)}
+        for i in range(days)
+    ]
+
+
+def summary(today, counts=None):
+    """
+    The admin dashboard summary: totals, status and daily counts, recent activity.
+
+    ``counts`` may supply per-status counts already at hand (the in-process
+    counters) instead of counting them again.
+    """
+    from apps.accounts.models import Rider
+    from apps.payments.models import Payment
+
+    # Today's and all-time totals, grouped counts: a fixed number of queries
+    totals = order_totals(today)
+
+    # Recent activity (last 20 events)
+    recent_events = []
+    order_events = OrderEvent.objects.order_by('-created_at')[:20]
+    for event in order_events:
+        recent_events.append({
+            'type': 'order',
+            'id': event.order_id,
+            'timestamp': event.created_at.isoformat(),
+            'description': f'Order #{event.order_id} {event.status}',
+            'status': event.status
+        })
+
+    # Payment events (last 10)
+    payment_events = Payment.objects.order_by('-created_at')[:10]
+    for payment in payment_events:
+        recent_events.append({
+            'type': 'payment',
+            'id': payment.id,
+            'timestamp': payment.created_at.isoformat(),
+            'description': f'Payment {payment.provider} - {payment.status}',
+            'amount': float(payment.amount),
+            'status': payment.status
+        })
+
+    # Sort by timestamp
+    recent_events.sort(key=lambda x: x['timestamp'], reverse=True)
+
+    return {
+        'orders_today': totals['orders_today'],
+        'gmv_today': totals['gmv_today'],
+        'status_counts': counts if counts is not None else status_counts(),
+        'last_7_days': daily_counts(today),
+        'recent_activity': recent_events[:10],
+        'total_stats': {
+            'total_orders': totals['total_orders'],
+            'total_revenue': totals['total_revenue'],
+            'total_users': totals['total_users'],
+            'active_vendors': totals['active_vendors'],
+            'active_riders': Rider.objects.filter(verified=True).count()
+        }
+    }
+
+
+def range_bounds(date_range, today):
+    """(start, end) dates of a named range; unknown names mean today"""
+    if date_range == 'yesterday':
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if date_range == 'last_7_days':
+        return today - timedelta(days=6), today
+    if date_range == 'last_30_days':
+        return today - timedelta(days=29), today
+    return today, today
+
+
+def detailed(start, end):
+    """Revenue, vendor and payment breakdowns for [start, end] from the daily rollups"""
+    from . import rollups
+
+    revenue_by_day = rollups.revenue_by_day(start, end)
+    vendors = rollups.vendor_stats(start, end)
+    total_orders = sum(day['orders'] for day in revenue_by_day)
+    total_revenue = sum(day['revenue'] for day in revenue_by_day)
+    return {
+        'revenue_by_day': revenue_by_day,
+        'top_vendors': vendors,
+        'payment_methods': rollups.payment_methods(start, end),
+        'vendor_performance': [
+            {
+                'vendor__name': row['vendor__name'],
+                'total_orders': row['order_count'],
+                'total_revenue': row['revenue'],
+                'avg_order_value': row['revenue'] / row['order_count'],
+            }
+            for row in vendors
+        ],
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'average_order_value': total_revenue / total_orders if total_orders else 0
+    }
+
+
+def _cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE', 'default')]
+
+
+def invalidate():
+    """Drop every cached snapshot by moving to a new key generation"""
+    cache = _cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def cached(name, compute):
+    """Snapshot ``name`` from the analytics cache, computing and storing it on a miss"""
+    cache = _cache()
+    generation = cache.get_or_set(GENERATION_KEY, 0, timeout=None)
+    key = f'analytics:{generation}:{name}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = compute()
+        cache.set(key, snapshot)
+    return snapshot
+
+
+def summary_snapshot():
+    """The shared summary snapshot served to REST requests, consumers and pushes"""
+    from .counters import status_counters
+
+    today = timezone.localdate()
+    return cached(f'summary:{today}', lambda: summary(today, counts=status_counters.status_counts()))
+
+
+def detailed_snapshot(date_range):
+    """The shared detailed snapshot for a named range"""
+    if date_range not in RANGES:
+        date_range = 'today'
+    today = timezone.localdate()
+    return cached(f'detailed:{date_range}:{today}', lambda: detailed(*range_bounds(date_range, today)))
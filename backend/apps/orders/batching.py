@@ -0,0 +1,206 @@
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.models import Rider
+from .dispatch import ACTIVE_STATUSES, notify_assigned, select_rider
+from .geo import haversine_km
+from .models import DeliveryBatch, Order, OrderEvent
+from .outbox import UPDATED, enqueue_many
+
+
+MAX_BATCH_SIZE = 3            # orders carried in one trip
+PICKUP_RADIUS_KM = 1.0        # vendors this close share a pickup run
+DROPOFF_RADIUS_KM = 3.0       # drop-offs this close to the first one are compatible
+MAX_MARGINAL_RATIO = 0.6      # adding an order may cost at most this share of a solo trip
+BATCH_POOL_LIMIT = 200        # pending orders considered per batching round
+
+PICKUP = 'pickup'
+DROPOFF = 'dropoff'
+
+
+def order_stops(order):
+    """Pickup and drop-off stops for one order"""
+    return [
+        {"order_id": order.id, "kind": PICKUP,
+         "lat": float(order.vendor.latitude), "lon": float(order.vendor.longitude)},
+        {"order_id": order.id, "kind": DROPOFF,
+         "lat": float(order.delivery_latitude), "lon": float(order.delivery_longitude)},
+    ]
+
+
+def route_length(stops, start=None):
+    """Length in km of visiting ``stops`` in order, optionally from a start point"""
+    points = [(s["lat"], s["lon"]) for s in stops]
+    if start is not None:
+        points.insert(0, start)
+    return sum(haversine_km(*a, *b) for a, b in zip(points, points[1:]))
+
+
+def _feasible(stops):
+    """Every drop-off must come after the pickup of the same order"""
+    picked = set()
+    for stop in stops:
+        if stop["kind"] == PICKUP:
+            picked.add(stop["order_id"])
+        elif stop["order_id"] not in picked:
+            return False
+    return True
+
+
+def plan_route(stops, start=None):
+    """
+    Order pickup and drop-off stops into a short route.
+
+    A nearest-neighbour tour (only stops whose pickup is done are eligible)
+    is improved with 2-opt segment reversals that keep every pickup ahead of
+    its drop-off. The route is open: it ends at the last drop-off.
+    """
+    if not stops:
+        return []
+    remaining = list(stops)
+    picked = set()
+    route = []
+    here = start
+    while remaining:
+        eligible = [s for s in remaining if s["kind"] == PICKUP or s["order_id"] in picked]
+        if here is None:
+            nxt = eligible[0]
+        else:
+            nxt = min(eligible, key=lambda s: haversine_km(here[0], here[1], s["lat"], s["lon"]))
+        remaining.remove(nxt)
+        route.append(nxt)
+        if nxt["kind"] == PICKUP:
+            picked.add(nxt["order_id"])
+        here = (nxt["lat"], nxt["lon"])
+
+    best = route_length(route, start)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(route) - 1):
+            for j in range(i + 1, len(route)):
+                candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                if not _feasible(candidate):
+                    continue
+                length = route_length(candidate, start)
+                if length < best - 1e-9:
+                    route, best = candidate, length
+                    improved = True
+    return route
+
+
+def _compatible(seed, order):
+    return (
+        haversine_km(seed.vendor.latitude, seed.vendor.longitude,
+                     order.vendor.latitude, order.vendor.longitude) <= PICKUP_RADIUS_KM
+        and haversine_km(seed.delivery_latitude, seed.delivery_longitude,
+                         order.delivery_latitude, order.delivery_longitude) <= DROPOFF_RADIUS_KM
+    )
+
+
+def group_orders(orders):
+    """
+    Greedily group orders into trips, oldest first.
+
+    Each group is seeded with the oldest ungrouped order; a compatible order
+    joins when it lengthens the planned route by no more than
+    MAX_MARGINAL_RATIO of what delivering it on its own would take.
+    Returns a list of (orders, stops) pairs; single-order groups are included.
+    """
+    pending = list(orders)
+    groups = []
+    while pending:
+        seed = pending.pop(0)
+        members = [seed]
+        stops = plan_route(order_stops(seed))
+        length = route_length(stops)
+        for order in list(pending):
+            if len(members) >= MAX_BATCH_SIZE:
+                break
+            if not _compatible(seed, order):
+                continue
+            own = order_stops(order)
+            candidate = plan_route(stops + own)
+            candidate_length = route_length(candidate)
+            if candidate_length - length <= MAX_MARGINAL_RATIO * route_length(own):
+                members.append(order)
+                pending.remove(order)
+                stops, length = candidate, candidate_length
+        groups.append((members, stops))
+    return groups
+
+
+def assign_batches(limit=BATCH_POOL_LIMIT):
+    """
+    Assign groups of two or more compatible accepted orders to one rider each.
+
+    Orders without a drop-off location, and groups of one, are left for the
+    regular dispatcher. The stop sequence is re-planned from the chosen
+    rider's position before it is stored on the DeliveryBatch.
+    Returns the list of created batches.
+    """
+    from .locations import location_store
+
+    orders = [
+        order for order in Order.objects.filter(
+            status=Order.Status.ACCEPTED, rider__isnull=True,
+            delivery_latitude__isnull=False, delivery_longitude__isnull=False,
+        ).select_related('vendor').order_by('created_at')[:limit]
+        if order.vendor.latitude is not None and order.vendor.longitude is not None
+    ]
+
+    batches = []
+    assigned = []
+    busy = set()
+    for members, stops in group_orders(orders):
+        if len(members) < 2:
+            continue
+        rider = select_rider(members[0].vendor, exclude=busy)
+        if rider is None:
+            break
+        busy.add(rider.id)
+        fix = location_store.position(rider)
+        start = (fix[0], fix[1]) if fix else None
+        stops = plan_route(stops, start)
+
+        now = timezone.now()
+        with transaction.atomic():
+            if not Rider.objects.select_for_update().filter(pk=rider.pk, is_online=True).exists():
+                continue
+            batch = DeliveryBatch.objects.create(
+                rider=rider, stops=stops, route_km=round(route_length(stops, start), 3),
+            )
+            # Conditional update: any order taken meanwhile drops out of the batch
+            ids = [order.id for order in members]
+            Order.objects.filter(
+                pk__in=ids, status=Order.Status.ACCEPTED, rider__isnull=True
+            ).update(rider=rider, batch=batch, status=Order.Status.ASSIGNED, updated_at=now)
+            taken = set(Order.objects.filter(pk__in=ids, batch=batch).values_list('id', flat=True))
+            if len(taken) < 2:
+                transaction.set_rollback(True)
+                continue
+            if len(taken) < len(ids):
+                batch.stops = plan_route([s for s in stops if s["order_id"] in taken], start)
+                batch.route_km = round(route_length(batch.stops, start), 3)
+                batch.save(update_fields=['stops', 'route_km', 'updated_at'])
+            OrderEvent.objects.bulk_create([
+                OrderEvent(order_id=order_id, status=Order.Status.ASSIGNED,
+                           note=f"Order batched (#{batch.id}) to rider #{rider.id}")
+                for order_id in sorted(taken)
+            ])
+            enqueue_many(sorted(taken), UPDATED)
+        batches.append(batch)
+        assigned.extend((order, rider.id) for order in members if order.id in taken)
+
+    notify_assigned(assigned)
+    return batches
+
+
+def complete_batch(batch_id):
+    """Close a batch once none of its orders is still in progress"""
+    if batch_id is None:
+        return
+    if not Order.objects.filter(batch_id=batch_id, status__in=ACTIVE_STATUSES).exists():
+        DeliveryBatch.objects.filter(pk=batch_id, status=DeliveryBatch.Status.ACTIVE).update(
+            status=DeliveryBatch.Status.COMPLETED, updated_at=timezone.now()
+        )
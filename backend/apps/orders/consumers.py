@@ -1,109 +1,251 @@
+import asyncio
+import json
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from .dashboard import DASHBOARD_GROUP
+from .fanout import OrderEventMixin
 
-class OrdersConsumer(AsyncJsonWebsocketConsumer):
-    group_name = "orders"
 
-    async def connect(self):
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+def token_user_id(token):
+    """User id carried by a JWT access token, None when it is missing or invalid"""
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        return AccessToken(token)['user_id']
+    except Exception:
+        return None
+
+
+def resolve_principal(user_id):
+    """Principal of an active user from the shared principal cache, None otherwise"""
+    from apps.accounts.principals import principals
+
+    entry = principals.lookup(user_id)
+    if entry is None or not entry[0].is_active:
+        return None
+    return entry[1]
 
-    async def disconnect(self, code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
-
-    async def broadcast(self, event):
-        # Handle the new message format
-        message_data = event
-        message_type = message_data.get("type")
-
-        if message_type == "order_created":
-            await self.send_json({
-                "type": "order_created",
-                "order": message_data.get("order")
-            })
-        elif message_type == "order_status_changed":
-            await self.send_json({
-                "type": "order_status_changed",
-                "order_id": message_data.get("order_id"),
-                "status": message_data.get("status")
-            })
-        elif message_type == "order_updated":
-            await self.send_json({
-                "type": "order_updated",
-                "order": message_data.get("order")
-            })
-        else:
-            # Fallback for other message types
-            await self.send_json(message_data)
 
+def subscription_groups(principal):
+    """Websocket groups a user follows; users without an account are customers"""
+    if principal.role == 'admin':
+        return [DASHBOARD_GROUP]
+    if principal.role == 'vendor':
+        return ["orders"] + ([f"vendor_{principal.vendor_id}"] if principal.vendor_id else [])
+    if principal.role == 'rider':
+        return ["orders"] + ([f"rider_{principal.rider_id}"] if principal.rider_id else [])
+    return ["orders", f"customer_{principal.user_id}"]
+
+
+class OrderStreamConsumer(OrderEventMixin, AsyncJsonWebsocketConsumer):
+    """
+    Base of every order websocket.
+
+    Protocol: the client connects and sends ``{"type": "auth", "token": ...}``
+    (a session-authenticated socket is authenticated on connect); the server
+    answers ``auth_success`` and joins the user's groups, or ``auth_error``.
+    ``{"type": "ping"}`` is answered with ``pong``. Order changes arrive as
+    pre-encoded frames through ``order_event``.
+
+    ``required_role`` limits an endpoint to one role; None accepts any.
+    """
+    required_role = None
+    close_on_auth_error = True
 
-class OrderDetailConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
-        self.order_id = self.scope['url_route']['kwargs']['order_id']
-        self.group_name = f"order_{self.order_id}"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        self.principal = None
+        self.joined = []
         await self.accept()
+        user = self.scope.get("user")
+        if user is not None and user.is_authenticated:
+            await self.authenticate(user.id)
 
     async def disconnect(self, code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
-
-    async def broadcast(self, event):
-        # Handle the new message format
-        message_data = event
-        message_type = message_data.get("type")
-
-        if message_type == "order_created":
-            await self.send_json({
-                "type": "order_created",
-                "order": message_data.get("order")
-            })
-        elif message_type == "order_status_changed":
-            await self.send_json({
-                "type": "order_status_changed",
-                "order_id": message_data.get("order_id"),
-                "status": message_data.get("status")
-            })
-        elif message_type == "order_updated":
-            await self.send_json({
-                "type": "order_updated",
-                "order": message_data.get("order")
-            })
-        else:
-            # Fallback for other message types
-            await self.send_json(message_data)
+        for group in self.joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return json.dumps(content, separators=(',', ':'))
 
+    async def join(self, group):
+        await self.channel_layer.group_add(group, self.channel_name)
+        self.joined.append(group)
+
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get("type")
+        if message_type == "auth":
+            if self.principal is None:
+                await self.authenticate(token_user_id(content.get("token")))
+        elif message_type == "ping":
+            await self.send_json({"type": "pong"})
+        elif self.principal is not None:
+            await self.handle(content)
+
+    async def authenticate(self, user_id):
+        principal = await database_sync_to_async(resolve_principal)(user_id) if user_id else None
+        if principal is None or not await self.authorize(principal):
+            await self.send_json({"type": "auth_error", "message": "Authentication failed or not permitted"})
+            if self.close_on_auth_error:
+                await self.close()
+            return
+        self.principal = principal
+        for group in self.subscriptions(principal):
+            await self.join(group)
+        await self.send_json({"type": "auth_success", "message": "Connected successfully"})
+        await self.authenticated()
+
+    async def authorize(self, principal):
+        return self.required_role is None or (principal.role or 'customer') == self.required_role
+
+    def subscriptions(self, principal):
+        return subscription_groups(principal)
+
+    async def authenticated(self):
+        """Hook run once the socket is authenticated and subscribed"""
+
+    async def handle(self, content):
+        """Hook for endpoint-specific messages from authenticated clients"""
+
+
+class CustomerOrderConsumer(OrderStreamConsumer):
+    required_role = 'customer'
+
+
+class VendorOrderConsumer(OrderStreamConsumer):
+    required_role = 'vendor'
+
+
+class RiderOrderConsumer(OrderStreamConsumer):
+    required_role = 'rider'
+
+
+class AdminDashboardConsumer(OrderStreamConsumer):
+    """Admin dashboard: the analytics snapshot on connect, coalesced updates, detailed analytics on request"""
+    required_role = 'admin'
+
+    async def authenticated(self):
+        await self.send_summary()
+
+    async def handle(self, content):
+        message_type = content.get("type")
+        if message_type == "refresh_analytics":
+            await self.send_summary()
+        elif message_type == "get_detailed_analytics":
+            await self.send_detailed(content.get("date_range", "today"))
+
+    async def analytics_update(self, event):
+        # Coalesced snapshot from apps.orders.dashboard
+        await self.send_json({"type": "analytics_update", "data": event.get("data")})
+
+    async def send_summary(self):
+        from .analytics import summary_snapshot
+
+        try:
+            data = await database_sync_to_async(summary_snapshot)()
+        except Exception as e:
+            await self.send_json({"type": "error", "message": "Failed to load analytics data", "error": str(e)})
+            return
+        await self.send_json({"type": "analytics_update", "data": data})
+
+    async def send_detailed(self, date_range):
+        from .analytics import detailed_snapshot
+
+        try:
+            data = await database_sync_to_async(detailed_snapshot)(date_range)
+        except Exception as e:
+            await self.send_json({"type": "error", "message": "Failed to load detailed analytics", "error": str(e)})
+            return
+        await self.send_json({"type": "detailed_analytics", "date_range": date_range, "data": data})
+
+
+class OrderDetailConsumer(OrderStreamConsumer):
+    """
+    Status updates for one order, plus the live rider position once the
+    subscriber has authenticated as a party to the order.
+
+    Location frames are throttled per subscriber: at most one frame every
+    ``location_interval`` seconds, intermediate fixes are dropped in favour
+    of the newest one, and frames after the first carry only microdegree
+    deltas against the previous frame (with a full keyframe every
+    ``keyframe_every`` frames so clients can resync). Positions are sent as
+    integer microdegrees.
+    """
+    close_on_auth_error = False
+    location_interval = 2.0
+    keyframe_every = 20
 
-class RiderConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
-        self.rider_id = self.scope['url_route']['kwargs']['rider_id']
-        self.group_name = f"rider_{self.rider_id}"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        self.order_id = self.scope['url_route']['kwargs']['order_id']
+        self._pending_fix = None
+        self._last_fix = None
+        self._last_sent_at = 0.0
+        self._frames_since_keyframe = 0
+        self._flush_task = None
+        await super().connect()
+        # The order id and status are public; location needs a successful auth
+        await self.join(f"order_{self.order_id}")
 
     async def disconnect(self, code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
-
-    async def broadcast(self, event):
-        # Handle the new message format
-        message_data = event
-        message_type = message_data.get("type")
-
-        if message_type == "order_created":
-            await self.send_json({
-                "type": "order_created",
-                "order": message_data.get("order")
-            })
-        elif message_type == "order_status_changed":
-            await self.send_json({
-                "type": "order_status_changed",
-                "order_id": message_data.get("order_id"),
-                "status": message_data.get("status")
-            })
-        elif message_type == "order_updated":
-            await self.send_json({
-                "type": "order_updated",
-                "order": message_data.get("order")
-            })
+        if self._flush_task:
+            self._flush_task.cancel()
+        await super().disconnect(code)
+
+    async def authorize(self, principal):
+        return await self.may_track(principal)
+
+    def subscriptions(self, principal):
+        return []
+
+    @database_sync_to_async
+    def may_track(self, principal):
+        """Only the order's customer, vendor, rider or an admin may see the rider position"""
+        from django.db.models import Q
+        from .models import Order
+
+        if principal.role == 'admin':
+            return True
+        parties = Q(customer_id=principal.user_id)
+        if principal.vendor_id:
+            parties |= Q(vendor_id=principal.vendor_id)
+        if principal.rider_id:
+            parties |= Q(rider_id=principal.rider_id)
+        return Order.objects.filter(parties, pk=self.order_id).exists()
+
+    async def rider_location(self, event):
+        if self.principal is None:
+            return
+        if self._last_fix and event["ts"] < self._last_fix[2]:
+            return  # out of order
+        # Keep only the newest fix; anything superseded before the next frame is dropped
+        self._pending_fix = event
+        wait = self._last_sent_at + self.location_interval - asyncio.get_running_loop().time()
+        if wait <= 0:
+            await self.send_location()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self.send_location_later(wait))
+
+    async def send_location_later(self, wait):
+        await asyncio.sleep(wait)
+        self._flush_task = None
+        await self.send_location()
+
+    async def send_location(self):
+        event, self._pending_fix = self._pending_fix, None
+        if event is None:
+            return
+        fix = (event["lat"], event["lon"], event["ts"], event["rider_id"])
+        last = self._last_fix
+        if last is None or last[3] != fix[3] or self._frames_since_keyframe >= self.keyframe_every:
+            frame = {"type": "rider_location", "order_id": event["order_id"], "rider_id": fix[3],
+                     "lat": fix[0], "lon": fix[1], "ts": fix[2]}
+            self._frames_since_keyframe = 0
         else:
-            # Fallback for other message types
-            await self.send_json(message_data)
+            frame = {"type": "rider_location_delta", "dlat": fix[0] - last[0],
+                     "dlon": fix[1] - last[1], "dt": fix[2] - last[2]}
+            self._frames_since_keyframe += 1
+        self._last_fix = fix
+        self._last_sent_at = asyncio.get_running_loop().time()
+        await self.send_json(frame)
@@ -0,0 +1,137 @@
+import threading
+import time
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Order
+
+
+RECONCILE_INTERVAL_SECONDS = 60  # recount from the database (other workers' writes, bulk updates)
+
+
+class StatusCounters:
+    """
+    In-process order counts per status, plus orders created today.
+
+    Counts are loaded from the database with one grouped query, adjusted by
+    status-transition deltas from the Order signals, and reconciled against
+    the database periodically so writes made by other worker processes or by
+    queryset updates are eventually reflected.
+    """
+
+    def __init__(self):
+        self._by_status = {}
+        self._today = None
+        self._created_today = 0
+        self._loaded_at = None
+        # Deltas applied while a reconciliation reads the database, None otherwise
+        self._since_read = None
+        self._created_since_read = 0
+        self._lock = threading.Lock()
+        self._reconciling = threading.Lock()
+
+    def ensure_loaded(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < RECONCILE_INTERVAL_SECONDS:
+            return
+        self.reconcile()
+
+    def reconcile(self):
+        """
+        Recount from the database.
+
+        Transitions committed while the counts are read are replayed on top of
+        them, so they are not lost when the counts are swapped in.
+        """
+        from .analytics import day_start
+
+        with self._reconciling:
+            with self._lock:
+                self._since_read = {}
+                self._created_since_read = 0
+            try:
+                today = timezone.localdate()
+                by_status = {status: 0 for status, _ in Order.Status.choices}
+                for row in Order.objects.order_by().values('status').annotate(n=Count('id')):
+                    by_status[row['status']] = row['n']
+                created_today = Order.objects.filter(created_at__gte=day_start(today)).count()
+            except BaseException:
+                with self._lock:
+                    self._since_read = None
+                raise
+            with self._lock:
+                for status, delta in self._since_read.items():
+                    by_status[status] = max(0, by_status.get(status, 0) + delta)
+                self._by_status = by_status
+                self._today = today
+                self._created_today = created_today
+                self._roll_day()
+                self._created_today += self._created_since_read
+                self._since_read = None
+                self._loaded_at = time.monotonic()
+
+    def _roll_day(self):
+        today = timezone.localdate()
+        if today != self._today:
+            self._today = today
+            self._created_today = 0
+
+    def _adjust(self, status, delta):
+        self._by_status[status] = max(0, self._by_status.get(status, 0) + delta)
+        if self._since_read is not None:
+            self._since_read[status] = self._since_read.get(status, 0) + delta
+
+    def _tracking(self):
+        return self._loaded_at is not None or self._since_read is not None
+
+    def transition(self, old_status, new_status, created=False):
+        """Apply one order's status change; ``old_status`` is ignored for new orders"""
+        # An unknown previous status is left for the next reconciliation
+        if not created and (old_status is None or old_status == new_status):
+            return
+        with self._lock:
+            if not self._tracking():
+                return
+            if not created:
+                self._adjust(old_status, -1)
+            self._adjust(new_status, 1)
+            if created:
+                self._roll_day()
+                self._created_today += 1
+                if self._since_read is not None:
+                    self._created_since_read += 1
+
+    def removed(self, status):
+        with self._lock:
+            if self._tracking():
+                self._adjust(status, -1)
+
+    def status_counts(self):
+        self.ensure_loaded()
+        with self._lock:
+            return dict(self._by_status)
+
+    def orders_today(self):
+        self.ensure_loaded()
+        with self._lock:
+            self._roll_day()
+            return self._created_today
+
+    def total_orders(self):
+        self.ensure_loaded()
+        with self._lock:
+            return sum(self._by_status.values())
+
+    def reset(self):
+        with self._lock:
+            self._by_status = {}
+            self._today = None
+            self._created_today = 0
+            self._loaded_at = None
+            self._since_read = None
+            self._created_since_read = 0
+
+
+status_counters = StatusCounters()
+
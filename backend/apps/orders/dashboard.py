@@ -0,0 +1,88 @@
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_GROUP = "admin_dashboard"
+WINDOW_SECONDS = 0.5  # changes within this window are pushed as one frame
+
+
+class DashboardPublisher:
+    """
+    Coalesces admin dashboard pushes.
+
+    Writers call ``mark_changed``, which also invalidates the cached
+    analytics snapshots; the first change of a window starts a timer, and
+    when it fires the shared summary snapshot is recomputed once and sent to
+    the dashboard group as a single ``analytics_update`` frame. Nothing is
+    sent when the snapshot equals the last one pushed.
+    """
+
+    def __init__(self, window=WINDOW_SECONDS):
+        self.window = window
+        self._changed = set()
+        self._timer = None
+        self._last = None
+        self._lock = threading.Lock()
+
+    def mark_changed(self, order_id=None):
+        """Invalidate cached snapshots and schedule a push once the current transaction commits"""
+        transaction.on_commit(lambda: self._schedule(order_id))
+
+    def _schedule(self, order_id):
+        from .analytics import invalidate
+
+        invalidate()
+        with self._lock:
+            if order_id is not None:
+                self._changed.add(order_id)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Dashboard push failed")
+        finally:
+            # The timer thread opened its own database connection
+            connections.close_all()
+
+    def flush(self):
+        """Compute and push one snapshot now; returns whether a frame was sent"""
+        from .analytics import summary_snapshot
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            changed = sorted(self._changed)
+            self._changed = set()
+
+        snapshot = summary_snapshot()
+        if snapshot == self._last:
+            return False
+        self._last = snapshot
+        async_to_sync(get_channel_layer().group_send)(
+            DASHBOARD_GROUP,
+            {"type": "analytics_update", "data": dict(snapshot, updated_orders=changed)}
+        )
+        return True
+
+    def reset(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._changed = set()
+            self._last = None
+
+
+dashboard_publisher = DashboardPublisher()
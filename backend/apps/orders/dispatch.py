@@ -0,0 +1,409 @@
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.accounts.models import Rider
+from .eta import travel_factor
+from .feeds import open_orders
+from .geo import GridIndex
+from .models import Order, OrderEvent
+from .outbox import UPDATED, enqueue_many
+
+
+# Orders a rider is currently carrying
+ACTIVE_STATUSES = (Order.Status.ASSIGNED, Order.Status.ON_WAY)
+
+CANDIDATE_COUNT = 10          # nearest riders considered per assignment
+MAX_PICKUP_KM = 15.0          # ignore riders further than this from the vendor
+STALE_AFTER_SECONDS = 10 * 60  # riders without a fix for this long are not dispatched
+RELOAD_INTERVAL_SECONDS = 60   # resync the pool with the database (other workers' writes)
+
+# Scoring: everything is expressed in "equivalent kilometres"
+FRESHNESS_KM_PER_MINUTE = 0.2
+LOAD_PENALTY_KM = 2.0
+
+BATCH_ORDER_LIMIT = 200       # orders solved per batch round
+BATCH_CANDIDATE_COUNT = 10    # nearest riders kept per order in the cost matrix
+COLUMNS_PER_ORDER = 3         # rider columns kept per order of a component
+UNASSIGNABLE = 1e9            # cost of a pair that must not be matched
+
+
+class RiderPool:
+    """
+    In-memory spatial index of online, verified riders with a known position.
+
+    The pool is loaded lazily from the database, kept current by the Rider
+    post_save signal and resynced periodically so writes made by other
+    worker processes are eventually picked up. Online, verified riders
+    without a position yet are remembered too, so their first ping puts
+    them in the index straight away.
+    """
+
+    def __init__(self):
+        self.index = GridIndex()
+        self._eligible = set()
+        self._seen_at = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+                return
+            rows = Rider.objects.filter(
+                verified=True,
+                is_online=True,
+            ).values_list('id', 'current_latitude', 'current_longitude', 'last_location_update')
+            from .locations import location_store
+
+            self.index.clear()
+            self._seen_at = {}
+            self._eligible = set()
+            for rider_id, lat, lon, seen_at in rows:
+                self._eligible.add(rider_id)
+                # Fixes not yet flushed to the database are newer than the row
+                fix = location_store.get(rider_id)
+                if fix is not None:
+                    lat, lon, seen_at = fix
+                if lat is not None and lon is not None:
+                    self._put(rider_id, lat, lon, seen_at)
+            self._loaded_at = time.monotonic()
+
+    def _put(self, rider_id, lat, lon, seen_at):
+        self.index.upsert(rider_id, lat, lon)
+        self._seen_at[rider_id] = seen_at.timestamp() if seen_at else 0.0
+
+    def update(self, rider_id, lat, lon, seen_at=None):
+        self._put(rider_id, lat, lon, seen_at or timezone.now())
+
+    def move(self, rider_id, lat, lon, seen_at):
+        """Update the position of an online, verified rider; others are left out"""
+        if rider_id in self._eligible:
+            self._put(rider_id, lat, lon, seen_at)
+
+    def remove(self, rider_id):
+        self._eligible.discard(rider_id)
+        self.index.remove(rider_id)
+        self._seen_at.pop(rider_id, None)
+
+    def sync(self, rider):
+        """Mirror a Rider instance into the pool"""
+        if self._loaded_at is None:
+            return
+        if not (rider.verified and rider.is_online):
+            self.remove(rider.id)
+            return
+        self._eligible.add(rider.id)
+        if rider.current_latitude is not None and rider.current_longitude is not None:
+            self._put(rider.id, rider.current_latitude, rider.current_longitude, rider.last_location_update)
+
+    def seen_at(self, rider_id):
+        return self._seen_at.get(rider_id, 0.0)
+
+    def nearest(self, lat, lon, k=CANDIDATE_COUNT, max_km=MAX_PICKUP_KM):
+        self.ensure_loaded()
+        return self.index.nearest(lat, lon, k=k, max_km=max_km)
+
+    def reset(self):
+        with self._lock:
+            self.index.clear()
+            self._eligible = set()
+            self._seen_at = {}
+            self._loaded_at = None
+
+
+rider_pool = RiderPool()
+
+
+def rider_loads(rider_ids):
+    """Number of active deliveries per rider id"""
+    return dict(
+        Order.objects.filter(rider_id__in=rider_ids, status__in=ACTIVE_STATUSES)
+        .values('rider_id')
+        .annotate(n=Count('id'))
+        .values_list('rider_id', 'n')
+    )
+
+
+def rider_score(distance_km, age_seconds, load):
+    """Lower is better: pickup distance penalised by stale fixes and current load"""
+    return distance_km + FRESHNESS_KM_PER_MINUTE * (age_seconds / 60.0) + LOAD_PENALTY_KM * load
+
+
+def select_rider(vendor, exclude=()):
+    """
+    Pick the best online rider for an order from ``vendor``.
+
+    Candidates are the nearest riders to the vendor, scored by distance
+    (scaled by the learned travel speed around the vendor), freshness of
+    their last fix and how many deliveries they already carry.
+    Vendors without coordinates fall back to the most recently active rider.
+    """
+    if vendor.latitude is None or vendor.longitude is None:
+        return Rider.objects.filter(
+            verified=True, is_online=True
+        ).exclude(id__in=exclude).select_related('user').order_by('-last_location_update').first()
+
+    now = timezone.now().timestamp()
+    # Slow areas make the same distance cost more
+    factor = travel_factor(vendor.latitude, vendor.longitude)
+    candidates = [
+        (distance * factor, rider_id)
+        for distance, rider_id in rider_pool.nearest(vendor.latitude, vendor.longitude)
+        if rider_id not in exclude and now - rider_pool.seen_at(rider_id) <= STALE_AFTER_SECONDS
+    ]
+    if not candidates:
+        return None
+
+    loads = rider_loads([rider_id for _, rider_id in candidates])
+    ranked = sorted(
+        candidates,
+        key=lambda c: rider_score(c[0], now - rider_pool.seen_at(c[1]), loads.get(c[1], 0)),
+    )
+    riders = Rider.objects.select_related('user').in_bulk([rider_id for _, rider_id in ranked])
+    for _, rider_id in ranked:
+        rider = riders.get(rider_id)
+        # The pool may lag behind other workers; trust the row we just read
+        if rider and rider.verified and rider.is_online:
+            return rider
+        rider_pool.remove(rider_id)
+    return None
+
+
+def min_cost_assignment(cost):
+    """
+    Solve the rectangular assignment problem with the Hungarian algorithm.
+
+    ``cost`` is a list of rows; returns a list giving the column matched to
+    each row. When there are more rows than columns the problem is solved on
+    the transpose, and rows left without a column are matched to ``None``.
+    """
+    if not cost or not cost[0]:
+        return [None] * len(cost)
+    n, m = len(cost), len(cost[0])
+    if n > m:
+        transposed = [[cost[i][j] for i in range(n)] for j in range(m)]
+        result = [None] * n
+        for j, i in enumerate(min_cost_assignment(transposed)):
+            result[i] = j
+        return result
+
+    inf = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)  # match[j] = row (1-based) assigned to column j
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            delta = inf
+            j1 = 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    result = [None] * n
+    for j in range(1, m + 1):
+        if match[j]:
+            result[match[j] - 1] = j - 1
+    return result
+
+
+def build_cost_rows(orders):
+    """
+    Cost of sending each order's nearest fresh riders to its vendor.
+
+    Returns one {rider id: cost} dict per order; riders outside an order's
+    BATCH_CANDIDATE_COUNT nearest are not candidates for it.
+    """
+    now = timezone.now().timestamp()
+    distances = []
+    rider_ids = set()
+    for order in orders:
+        row = {}
+        factor = travel_factor(order.vendor.latitude, order.vendor.longitude)
+        for distance, rider_id in rider_pool.nearest(
+                order.vendor.latitude, order.vendor.longitude, k=BATCH_CANDIDATE_COUNT):
+            if now - rider_pool.seen_at(rider_id) <= STALE_AFTER_SECONDS:
+                row[rider_id] = distance * factor
+                rider_ids.add(rider_id)
+        distances.append(row)
+
+    loads = rider_loads(rider_ids)
+    return [
+        {
+            rider_id: rider_score(distance, now - rider_pool.seen_at(rider_id), loads.get(rider_id, 0))
+            for rider_id, distance in row.items()
+        }
+        for row in distances
+    ]
+
+
+def cost_components(rows):
+    """
+    Indices of ``rows`` grouped into connected components: rows sharing a
+    candidate rider, directly or through other rows, land in one group.
+    Orders in different groups never compete, so each group is solved alone.
+    """
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, row in enumerate(rows):
+        for rider_id in row:
+            if rider_id in owner:
+                parent[find(i)] = find(owner[rider_id])
+            else:
+                owner[rider_id] = i
+    groups = {}
+    for i, row in enumerate(rows):
+        if row:
+            groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def component_columns(rows, limit):
+    """
+    Up to ``limit`` rider ids for a component, taken rank by rank: every
+    row's cheapest rider first, then every row's second cheapest, and so on.
+    """
+    ranked = [sorted(row, key=row.get) for row in rows]
+    columns = {}
+    for rank in range(max(len(riders) for riders in ranked)):
+        for riders in ranked:
+            if len(columns) >= limit:
+                return list(columns)
+            if rank < len(riders):
+                columns.setdefault(riders[rank], None)
+    return list(columns)
+
+
+def solve_assignment(rows):
+    """
+    Minimum-cost assignment of one rider per row of ``rows`` ({rider id: cost}).
+
+    Each connected component gets its own Hungarian solve, on at most
+    COLUMNS_PER_ORDER columns per row (every row keeps at least its
+    COLUMNS_PER_ORDER cheapest riders), so a round costs a number of small
+    solves instead of one over every candidate rider. Returns the rider id
+    matched to each row, or None.
+    """
+    result = [None] * len(rows)
+    for indices in cost_components(rows):
+        component = [rows[i] for i in indices]
+        columns = component_columns(component, COLUMNS_PER_ORDER * len(component))
+        matrix = [[row.get(rider_id, UNASSIGNABLE) for rider_id in columns] for row in component]
+        for i, j, row in zip(indices, min_cost_assignment(matrix), matrix):
+            if j is not None and row[j] < UNASSIGNABLE:
+                result[i] = columns[j]
+    return result
+
+
+def notify_assigned(assigned):
+    """Mirror queryset-level assignments into the in-memory indexes and the dashboard"""
+    # Queryset updates bypass post_save, so mirror the new state by hand
+    from .locations import active_deliveries
+    from .counters import status_counters
+    from .dashboard import dashboard_publisher
+    from .rollups import apply_order, loaded_status
+
+    for order, rider_id in assigned:
+        open_orders.remove(order.id)
+        order.rider_id = rider_id
+        order.status = Order.Status.ASSIGNED
+        active_deliveries.sync(order)
+        status_counters.transition(loaded_status(order), order.status)
+        apply_order(order)
+        dashboard_publisher.mark_changed(order.id)
+
+
+def assign_pending_orders(limit=BATCH_ORDER_LIMIT):
+    """
+    Globally match unassigned accepted orders to online riders.
+
+    Solves a minimum-cost assignment over the pending orders and commits
+    all resulting assignments, with their OrderEvent rows, in one transaction.
+    Returns the list of (order_id, rider_id) pairs that were committed.
+    """
+    orders = [
+        order for order in Order.objects.filter(
+            status=Order.Status.ACCEPTED, rider__isnull=True
+        ).select_related('vendor').order_by('created_at')[:limit]
+        if order.vendor.latitude is not None and order.vendor.longitude is not None
+    ]
+    if not orders:
+        return []
+
+    pairs = [
+        (order, rider_id)
+        for order, rider_id in zip(orders, solve_assignment(build_cost_rows(orders)))
+        if rider_id is not None
+    ]
+    if not pairs:
+        return []
+
+    now = timezone.now()
+    assigned = []
+    with transaction.atomic():
+        available = set(
+            Rider.objects.select_for_update().filter(
+                id__in=[rider_id for _, rider_id in pairs], verified=True, is_online=True
+            ).values_list('id', flat=True)
+        )
+        events = []
+        for order, rider_id in pairs:
+            if rider_id not in available:
+                continue
+            # Conditional update: a rider may have accepted the order manually meanwhile
+            updated = Order.objects.filter(
+                pk=order.pk, status=Order.Status.ACCEPTED, rider__isnull=True
+            ).update(rider_id=rider_id, status=Order.Status.ASSIGNED, updated_at=now)
+            if updated:
+                events.append(OrderEvent(
+                    order_id=order.pk,
+                    status=Order.Status.ASSIGNED,
+                    note=f"Order batch-assigned to rider #{rider_id}",
+                ))
+                assigned.append((order, rider_id))
+        OrderEvent.objects.bulk_create(events)
+        enqueue_many([order.pk for order, _ in assigned], UPDATED)
+
+    notify_assigned(assigned)
+
+    return [(order.id, rider_id) for order, rider_id in assigned]
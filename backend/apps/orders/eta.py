@@ -0,0 +1,167 @@
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .geo import DEFAULT_SPEED_KMH, estimate_minutes, haversine_km
+from .models import LocationPing, Order, OrderEvent, TravelSpeed
+
+
+CELL_DEG = 0.05                # ~5.5 km cells
+RELOAD_INTERVAL_SECONDS = 300
+MIN_LEG_SECONDS = 60
+MIN_SPEED_KMH = 3.0            # legs outside this band are GPS noise or idle riders
+MAX_SPEED_KMH = 80.0
+MIN_SAMPLES = 3                # fewer legs than this do not override the fallbacks
+CHUNK_SIZE = 500
+
+# A trip leg starts at the first status and ends at the second. Only the ride
+# from pickup to drop-off is pure travel: assigned -> on_way also holds the
+# wait at the vendor while the food is prepared, which would bias speeds low.
+LEGS = (
+    (Order.Status.ON_WAY, Order.Status.DELIVERED),
+)
+
+
+def cell_key(lat, lon):
+    return f"{math.floor(float(lat) / CELL_DEG)}:{math.floor(float(lon) / CELL_DEG)}"
+
+
+class SpeedTable:
+    """
+    In-memory copy of the TravelSpeed table with hour-of-day fallbacks.
+
+    Lookups go cell+hour, then the city-wide average for that hour, then
+    DEFAULT_SPEED_KMH, so every caller gets an answer without a query.
+    """
+
+    def __init__(self):
+        self._speeds = {}
+        self._hourly = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+                return
+            speeds = {}
+            hourly = {}
+            for cell, hour, speed, samples in TravelSpeed.objects.values_list('cell', 'hour', 'speed_kmh', 'samples'):
+                speeds[(cell, hour)] = speed
+                total, count = hourly.get(hour, (0.0, 0))
+                hourly[hour] = (total + speed * samples, count + samples)
+            self._speeds = speeds
+            self._hourly = {hour: total / count for hour, (total, count) in hourly.items() if count}
+            self._loaded_at = time.monotonic()
+
+    def speed_kmh(self, lat, lon, at=None):
+        self.ensure_loaded()
+        hour = timezone.localtime(at or timezone.now()).hour
+        if lat is not None and lon is not None:
+            speed = self._speeds.get((cell_key(lat, lon), hour))
+            if speed:
+                return speed
+        return self._hourly.get(hour, DEFAULT_SPEED_KMH)
+
+    def reset(self):
+        with self._lock:
+            self._speeds = {}
+            self._hourly = {}
+            self._loaded_at = None
+
+
+speed_table = SpeedTable()
+
+
+def eta_minutes(lat, lon, distance_km, at=None):
+    """Minutes to cover ``distance_km`` starting around (lat, lon) at the learned speed"""
+    return estimate_minutes(distance_km, speed_table.speed_kmh(lat, lon, at))
+
+
+def travel_factor(lat, lon, at=None):
+    """How much slower (>1) or faster (<1) than the default speed this area is right now"""
+    return DEFAULT_SPEED_KMH / speed_table.speed_kmh(lat, lon, at)
+
+
+def _trace_length_km(points):
+    return sum(
+        haversine_km(a[1], a[2], b[1], b[2])
+        for a, b in zip(points, points[1:])
+    )
+
+
+def learn_speeds(days=30):
+    """
+    Aggregate (cell, hour) -> (km, hours, legs) from recently delivered orders.
+
+    Each leg between two status events is measured by the length of the
+    rider trace recorded for the order inside that time window, attributed
+    to the vendor's cell (where the leg starts) and the hour it started.
+    """
+    since = timezone.now() - timedelta(days=days)
+    orders = list(
+        Order.objects.filter(
+            status=Order.Status.DELIVERED,
+            updated_at__gte=since,
+            vendor__latitude__isnull=False,
+            vendor__longitude__isnull=False,
+        ).values_list('id', 'vendor__latitude', 'vendor__longitude')
+    )
+    totals = {}
+    for start in range(0, len(orders), CHUNK_SIZE):
+        chunk = orders[start:start + CHUNK_SIZE]
+        ids = [order_id for order_id, _, _ in chunk]
+
+        events = {}
+        for order_id, event_status, created_at in OrderEvent.objects.filter(
+                order_id__in=ids, status__in=[s for leg in LEGS for s in leg]
+        ).order_by('created_at').values_list('order_id', 'status', 'created_at'):
+            # Keep the first time each status was reached
+            events.setdefault(order_id, {}).setdefault(event_status, created_at)
+
+        traces = {}
+        for order_id, recorded_at, lat_e6, lon_e6 in LocationPing.objects.filter(
+                order_id__in=ids
+        ).order_by('order_id', 'recorded_at').values_list('order_id', 'recorded_at', 'latitude_e6', 'longitude_e6'):
+            traces.setdefault(order_id, []).append((recorded_at, lat_e6 / 1e6, lon_e6 / 1e6))
+
+        for order_id, lat, lon in chunk:
+            reached = events.get(order_id, {})
+            cell = cell_key(lat, lon)
+            for first, second in LEGS:
+                if first not in reached or second not in reached:
+                    continue
+                begin, end = reached[first], reached[second]
+                seconds = (end - begin).total_seconds()
+                if seconds < MIN_LEG_SECONDS:
+                    continue
+                window = [p for p in traces.get(order_id, ()) if begin.timestamp() <= p[0] <= end.timestamp()]
+                km = _trace_length_km(window)
+                hours = seconds / 3600
+                if not (MIN_SPEED_KMH <= km / hours <= MAX_SPEED_KMH):
+                    continue
+                key = (cell, timezone.localtime(begin).hour)
+                total_km, total_hours, legs = totals.get(key, (0.0, 0.0, 0))
+                totals[key] = (total_km + km, total_hours + hours, legs + 1)
+    return totals
+
+
+def rebuild_speed_table(days=30):
+    """Replace the TravelSpeed table with speeds learned over the last ``days``"""
+    rows = [
+        TravelSpeed(cell=cell, hour=hour, speed_kmh=km / hours, samples=legs)
+        for (cell, hour), (km, hours, legs) in learn_speeds(days).items()
+        if legs >= MIN_SAMPLES
+    ]
+    with transaction.atomic():
+        TravelSpeed.objects.all().delete()
+        TravelSpeed.objects.bulk_create(rows)
+    speed_table.reset()
+    return len(rows)
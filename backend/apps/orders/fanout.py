@@ -0,0 +1,77 @@
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .dashboard import DASHBOARD_GROUP
+from .snapshots import public_document
+
+
+PAYLOAD_VERSION = 2          # bump when the frame shape changes incompatibly
+EVENT_TYPE = "order.event"   # channel layer message type, handled by OrderEventMixin.order_event
+
+
+def order_frame(frame_type, document, summary=None):
+    """
+    A versioned frame for one order change, built from its snapshot
+    document; ``summary`` reuses an already built public document.
+
+    Frames carry the order summary, so they only go to the order's own
+    parties; watcher groups get ``status_broadcast`` instead.
+    """
+    return {
+        "type": frame_type,
+        "v": PAYLOAD_VERSION,
+        "order_id": document["id"],
+        "status": document["status"],
+        "order": summary if summary is not None else public_document(document),
+    }
+
+
+def status_broadcast(document):
+    """The order id and status only, for groups open to users who are not party to the order"""
+    return {
+        "type": "broadcast",
+        "v": PAYLOAD_VERSION,
+        "payload": {"kind": "order_status", "order_id": document["id"], "status": document["status"]},
+    }
+
+
+def vendor_group(document):
+    return f"vendor_{document['vendor']}"
+
+
+def party_groups(document, vendor=True):
+    """Groups of the order's own parties: its customer, vendor, rider and admins"""
+    groups = [f"customer_{document['customer']['id']}"]
+    if vendor:
+        groups.append(vendor_group(document))
+    if document["rider"]:
+        groups.append(f"rider_{document['rider']}")
+    groups.append(DASHBOARD_GROUP)
+    return groups
+
+
+def watcher_groups(document):
+    """Groups open to any rider, vendor or customer, and to anonymous order trackers"""
+    return ["orders", f"order_{document['id']}"]
+
+
+def encode(frame):
+    return json.dumps(frame, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def publish(groups, frame, channel_layer=None):
+    """JSON-encode ``frame`` once and send the same text to every group"""
+    message = {"type": EVENT_TYPE, "text": encode(frame)}
+    channel_layer = channel_layer or get_channel_layer()
+    for group in groups:
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
+class OrderEventMixin:
+    """Consumer handler forwarding pre-encoded order frames without decoding them"""
+
+    async def order_event(self, event):
+        await self.send(text_data=event["text"])
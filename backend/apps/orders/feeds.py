@@ -0,0 +1,117 @@
+import threading
+import time
+
+from .eta import eta_minutes
+from .geo import GridIndex, bounding_box
+from .models import Order, OrderItem
+
+
+FEED_LIMIT = 10
+FEED_RADIUS_KM = 10.0
+RELOAD_INTERVAL_SECONDS = 60
+
+
+class OpenOrderIndex:
+    """
+    In-memory spatial index of accepted orders still waiting for a rider,
+    positioned at their vendor's coordinates. Kept current by the Order
+    post_save signal and resynced periodically from the database.
+    """
+
+    def __init__(self):
+        self.index = GridIndex()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+                return
+            rows = Order.objects.filter(
+                status=Order.Status.ACCEPTED,
+                rider__isnull=True,
+                vendor__latitude__isnull=False,
+                vendor__longitude__isnull=False,
+            ).values_list('id', 'vendor__latitude', 'vendor__longitude')
+            self.index.clear()
+            for order_id, lat, lon in rows:
+                self.index.upsert(order_id, lat, lon)
+            self._loaded_at = time.monotonic()
+
+    def sync(self, order):
+        """Mirror an Order instance into the index"""
+        if self._loaded_at is None:
+            return
+        if order.status == Order.Status.ACCEPTED and order.rider_id is None:
+            vendor = order.vendor
+            if vendor.latitude is not None and vendor.longitude is not None:
+                self.index.upsert(order.id, vendor.latitude, vendor.longitude)
+                return
+        self.index.remove(order.id)
+
+    def remove(self, order_id):
+        self.index.remove(order_id)
+
+    def nearest(self, lat, lon, k, max_km):
+        self.ensure_loaded()
+        return self.index.nearest(lat, lon, k=k, max_km=max_km)
+
+    def reset(self):
+        with self._lock:
+            self.index.clear()
+            self._loaded_at = None
+
+
+open_orders = OpenOrderIndex()
+
+
+FEED_FIELDS = ('id', 'status', 'total_amount', 'delivery_fee', 'created_at',
+               'vendor_id', 'vendor__name', 'vendor__location', 'customer__username')
+
+
+def _feed_rows(queryset, distances):
+    """Compact feed rows with item summaries, in a constant number of queries"""
+    rows = list(queryset.values(*FEED_FIELDS))
+    items = {}
+    for order_id, quantity, name in OrderItem.objects.filter(
+            order_id__in=[row['id'] for row in rows]
+    ).values_list('order_id', 'quantity', 'product__name'):
+        items.setdefault(order_id, []).append(f"{quantity}x {name}")
+    for row in rows:
+        row['items'] = items.get(row['id'], [])
+        row['distance_km'] = distances.get(row['id'])
+    return rows
+
+
+def available_orders_near(lat, lon, limit=FEED_LIMIT, radius_km=FEED_RADIUS_KM):
+    """
+    Unassigned accepted orders nearest to a position, closest first.
+
+    The spatial index picks the candidates; the database read re-checks
+    availability with a bounding-box filter on the vendor coordinates so
+    index entries that went stale in another worker are dropped.
+    """
+    if lat is None or lon is None:
+        queryset = Order.objects.filter(
+            status=Order.Status.ACCEPTED, rider__isnull=True
+        ).order_by('created_at')[:limit]
+        return _feed_rows(queryset, {})
+
+    # Over-fetch a little so stale entries do not shrink the page
+    hits = open_orders.nearest(lat, lon, k=limit * 2, max_km=radius_km)
+    distances = {order_id: distance for distance, order_id in hits}
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    queryset = Order.objects.filter(
+        pk__in=list(distances),
+        status=Order.Status.ACCEPTED,
+        rider__isnull=True,
+        vendor__latitude__range=(min_lat, max_lat),
+        vendor__longitude__range=(min_lon, max_lon),
+    )
+    rows = sorted(_feed_rows(queryset, distances), key=lambda row: row['distance_km'])[:limit]
+    for row in rows:
+        row['eta_minutes'] = eta_minutes(lat, lon, row['distance_km'])
+    return rows
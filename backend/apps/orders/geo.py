@@ -0,0 +1,184 @@
+import math
+import threading
+from collections import defaultdict
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+DEFAULT_SPEED_KMH = 20.0  # typical urban motorbike speed including stops
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres between two lat/lon points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def estimate_minutes(distance_km, speed_kmh=DEFAULT_SPEED_KMH):
+    """Travel time in whole minutes for a distance at an average speed"""
+    return max(1, int(round(distance_km / speed_kmh * 60)))
+
+
+def km_per_degree_lon(lat):
+    """Length of one degree of longitude at the given latitude"""
+    return KM_PER_DEGREE_LAT * max(math.cos(math.radians(float(lat))), 0.01)
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a radius around a point"""
+    lat = float(lat)
+    lon = float(lon)
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / km_per_degree_lon(lat)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def simplify_track(points, tolerance_km):
+    """
+    Douglas-Peucker simplification of a (latitude, longitude) polyline.
+
+    Returns the sorted indices of the points to keep; the first and last
+    points are always kept. Distances use a local equirectangular projection,
+    which is accurate at the scale of a delivery trip.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+
+    lon_km = km_per_degree_lon(points[0][0])
+    xy = [(float(lon) * lon_km, float(lat) * KM_PER_DEGREE_LAT) for lat, lon in points]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        seg_len_sq = dx * dx + dy * dy
+        farthest, max_dist = None, tolerance_km
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            if seg_len_sq == 0:
+                dist = math.hypot(px - x1, py - y1)
+            else:
+                t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / seg_len_sq))
+                dist = math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+            if dist > max_dist:
+                farthest, max_dist = i, dist
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid for k-nearest and radius lookups.
+
+    Points are bucketed into square cells of ``cell_deg`` degrees; a query
+    scans rings of cells outwards from the query point and stops as soon as
+    no unscanned cell can hold anything closer than the current k-th hit.
+    """
+
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self._cells = defaultdict(dict)
+        self._points = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def upsert(self, key, lat, lon):
+        lat = float(lat)
+        lon = float(lon)
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                self._discard_from_cell(key, previous[2])
+            self._points[key] = (lat, lon, cell)
+            self._cells[cell][key] = (lat, lon)
+
+    def remove(self, key):
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is not None:
+                self._discard_from_cell(key, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def get(self, key):
+        point = self._points.get(key)
+        return None if point is None else point[:2]
+
+    def _discard_from_cell(self, key, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, center, radius):
+        cy, cx = center
+        if radius == 0:
+            yield center
+            return
+        for dx in range(-radius, radius + 1):
+            yield (cy - radius, cx + dx)
+            yield (cy + radius, cx + dx)
+        for dy in range(-radius + 1, radius):
+            yield (cy + dy, cx - radius)
+            yield (cy + dy, cx + radius)
+
+    def nearest(self, lat, lon, k=10, max_km=None):
+        """Return up to ``k`` (distance_km, key) pairs sorted by distance"""
+        lat = float(lat)
+        lon = float(lon)
+        with self._lock:
+            if not self._points:
+                return []
+            center = self._cell(lat, lon)
+            # Smallest distance covered by one ring of cells around the query point
+            ring_km = self.cell_deg * min(KM_PER_DEGREE_LAT, km_per_degree_lon(lat))
+            occupied = len(self._cells)
+            hits = []
+            radius = 0
+            while True:
+                # On a sparse grid, scanning every occupied cell is cheaper than more rings
+                if (2 * radius + 1) ** 2 > 4 * occupied:
+                    hits = [
+                        (haversine_km(lat, lon, plat, plon), key)
+                        for key, (plat, plon, _) in self._points.items()
+                    ]
+                    break
+                for cell in self._ring(center, radius):
+                    for key, (plat, plon) in self._cells.get(cell, {}).items():
+                        hits.append((haversine_km(lat, lon, plat, plon), key))
+                covered_km = radius * ring_km
+                if max_km is not None and covered_km >= max_km:
+                    break
+                if len(hits) >= k:
+                    hits.sort()
+                    if hits[k - 1][0] <= covered_km:
+                        break
+                radius += 1
+
+        if max_km is not None:
+            hits = [hit for hit in hits if hit[0] <= max_km]
+        hits.sort()
+        return hits[:k]
@@ -0,0 +1,298 @@
+import atexit
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.accounts.models import Rider
+from .dispatch import ACTIVE_STATUSES, rider_pool
+from .models import LocationPing, Order
+
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 15
+COORDINATE_QUANTUM = Decimal('0.000001')  # matches Rider.current_latitude decimal_places
+TRACE_BATCH_SIZE = 500
+MAX_TRACE_BUFFER = 50000  # oldest pings are dropped if the trace database is unavailable
+RELOAD_INTERVAL_SECONDS = 60
+
+
+class ActiveDeliveries:
+    """
+    Rider id -> ids of the orders the rider is currently carrying.
+
+    Lets the ping path tag trace rows with their order without a query.
+    Kept current by the Order post_save signal and resynced periodically.
+    """
+
+    def __init__(self):
+        self._orders = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < RELOAD_INTERVAL_SECONDS:
+                return
+            orders = {}
+            for order_id, rider_id in Order.objects.filter(
+                    status__in=ACTIVE_STATUSES, rider__isnull=False
+            ).values_list('id', 'rider_id'):
+                orders.setdefault(rider_id, set()).add(order_id)
+            self._orders = orders
+            self._loaded_at = time.monotonic()
+
+    def orders_for(self, rider_id):
+        self.ensure_loaded()
+        return self._orders.get(rider_id, set())
+
+    def sync(self, order):
+        """Mirror an Order instance into the map"""
+        if self._loaded_at is None:
+            return
+        self.remove(order.id)
+        with self._lock:
+            if order.status in ACTIVE_STATUSES and order.rider_id is not None:
+                self._orders.setdefault(order.rider_id, set()).add(order.id)
+
+    def remove(self, order_id):
+        with self._lock:
+            for order_ids in self._orders.values():
+                order_ids.discard(order_id)
+
+    def reset(self):
+        with self._lock:
+            self._orders = {}
+            self._loaded_at = None
+
+
+active_deliveries = ActiveDeliveries()
+
+
+class LocationStore:
+    """
+    Write-behind store for rider GPS fixes.
+
+    The latest fix of every rider lives in array-backed latitude, longitude
+    and timestamp columns indexed by a per-rider slot. Pings only overwrite
+    the slot and mark it dirty; dirty slots are written to Rider in one
+    transaction at most every FLUSH_INTERVAL_SECONDS, so a rider pinging
+    every few seconds costs one row update per flush instead of one per ping.
+
+    Every accepted ping is also appended to a trace buffer that is written
+    to the LocationPing table with batched inserts on the same schedule.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._rider_ids = array('q')
+        self._lat = array('d')
+        self._lon = array('d')
+        self._ts = array('d')
+        self._dirty = set()
+        self._trace = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def record(self, rider_id, latitude, longitude, at=None):
+        """Store a fix; returns False when it is older than the one already held"""
+        at = at or timezone.now()
+        ts = at.timestamp()
+        # May reload from the database, so it runs before taking the lock every ping needs
+        order_ids = active_deliveries.orders_for(rider_id)
+        with self._lock:
+            slot = self._slots.get(rider_id)
+            if slot is None:
+                slot = len(self._rider_ids)
+                self._slots[rider_id] = slot
+                self._rider_ids.append(rider_id)
+                self._lat.append(latitude)
+                self._lon.append(longitude)
+                self._ts.append(ts)
+            elif ts < self._ts[slot]:
+                return False
+            else:
+                self._lat[slot] = latitude
+                self._lon[slot] = longitude
+                self._ts[slot] = ts
+            self._dirty.add(slot)
+            point = (int(ts), round(latitude * 1e6), round(longitude * 1e6))
+            for order_id in order_ids or (None,):
+                self._trace.append((rider_id, order_id) + point)
+
+        rider_pool.move(rider_id, latitude, longitude, at)
+        publish_rider_location(rider_id, order_ids, point)
+        self._schedule()
+        return True
+
+    def get(self, rider_id):
+        """Latest (latitude, longitude, datetime) held in memory, or None"""
+        slot = self._slots.get(rider_id)
+        if slot is None:
+            return None
+        return (
+            self._lat[slot],
+            self._lon[slot],
+            datetime.fromtimestamp(self._ts[slot], tz=dt_timezone.utc),
+        )
+
+    def position(self, rider):
+        """Latest known (latitude, longitude, datetime) for a Rider, memory first"""
+        fix = self.get(rider.id)
+        if fix is not None:
+            return fix
+        if rider.current_latitude is None or rider.current_longitude is None:
+            return None
+        return float(rider.current_latitude), float(rider.current_longitude), rider.last_location_update
+
+    def reset(self):
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        with self._lock:
+            self._slots = {}
+            self._rider_ids = array('q')
+            self._lat = array('d')
+            self._lon = array('d')
+            self._ts = array('d')
+            self._dirty = set()
+            self._trace = []
+
+    def pending(self):
+        return len(self._dirty)
+
+    def _schedule(self):
+        """Arm the background flush unless one is already due"""
+        with self._timer_lock:
+            if self._timer is None:
+                self._timer = threading.Timer(FLUSH_INTERVAL_SECONDS, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self):
+        with self._timer_lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Location flush failed")
+        finally:
+            # The timer thread opened its own database connection
+            connections.close_all()
+        # Fixes that arrived during the flush, or a failed flush, need another round
+        if self._dirty or self._trace:
+            self._schedule()
+
+    def shutdown(self):
+        """Stop the timer and write whatever is still buffered"""
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Location flush at exit failed")
+
+    def flush(self):
+        """Write every dirty fix to its Rider row; returns the number of riders written"""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # another thread is already flushing
+        try:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                fixes = [
+                    (self._rider_ids[slot], self._lat[slot], self._lon[slot], self._ts[slot])
+                    for slot in dirty
+                ]
+                trace, self._trace = self._trace, []
+            self._flush_trace(trace)
+            if not fixes:
+                return 0
+            try:
+                with transaction.atomic():
+                    for rider_id, lat, lon, ts in fixes:
+                        at = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+                        # Never move a rider back in time if another worker wrote a newer fix
+                        Rider.objects.filter(
+                            Q(last_location_update__isnull=True) | Q(last_location_update__lt=at),
+                            pk=rider_id,
+                        ).update(
+                            current_latitude=Decimal(lat).quantize(COORDINATE_QUANTUM),
+                            current_longitude=Decimal(lon).quantize(COORDINATE_QUANTUM),
+                            last_location_update=at,
+                        )
+            except Exception:
+                with self._lock:
+                    self._dirty.update(dirty)
+                raise
+            return len(fixes)
+        finally:
+            self._flush_lock.release()
+
+    def _flush_trace(self, trace):
+        if not trace:
+            return
+        try:
+            LocationPing.objects.bulk_create(
+                [
+                    LocationPing(
+                        rider_id=rider_id,
+                        order_id=order_id,
+                        recorded_at=recorded_at,
+                        latitude_e6=lat_e6,
+                        longitude_e6=lon_e6,
+                    )
+                    for rider_id, order_id, recorded_at, lat_e6, lon_e6 in trace
+                ],
+                batch_size=TRACE_BATCH_SIZE,
+            )
+        except Exception:
+            # Traces are best effort: never let them block the position flush
+            logger.exception("Failed to write %d location pings", len(trace))
+            with self._lock:
+                self._trace = (trace + self._trace)[-MAX_TRACE_BUFFER:]
+
+
+location_store = LocationStore()
+atexit.register(location_store.shutdown)
+
+
+def publish_rider_location(rider_id, order_ids, point):
+    """Push a fix to the tracking group of every order the rider is carrying"""
+    if not order_ids:
+        return
+    recorded_at, lat_e6, lon_e6 = point
+    channel_layer = get_channel_layer()
+    for order_id in order_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"order_{order_id}",
+                {
+                    "type": "rider_location",
+                    "order_id": order_id,
+                    "rider_id": rider_id,
+                    "lat": lat_e6,
+                    "lon": lon_e6,
+                    "ts": recorded_at,
+                }
+            )
+        except ChannelFull:
+            # Live positions are superseded by the next ping; never fail the ping over one
+            logger.warning("Dropped location of rider %s for order %s: channel layer full", rider_id, order_id)
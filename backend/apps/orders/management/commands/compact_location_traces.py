@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.geo import simplify_track
+from apps.orders.models import LocationPing
+from apps.orders.routers import TRACE_DB
+
+
+CHUNK_SIZE = 500  # stay under SQLite's bound-parameter limit
+SEGMENT_GAP_SECONDS = 10 * 60  # a longer silence starts a new route
+
+
+def segments(rows):
+    """Split ``(id, recorded_at, lat, lon)`` rows, in time order, wherever the rider went quiet"""
+    segment = []
+    for row in rows:
+        if segment and row[1] - segment[-1][1] > SEGMENT_GAP_SECONDS:
+            yield segment
+            segment = []
+        segment.append(row)
+    if segment:
+        yield segment
+
+
+class Command(BaseCommand):
+    help = 'Downsample old rider location traces with Douglas-Peucker simplification'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=7, help='Only compact pings older than this')
+        parser.add_argument('--tolerance-m', type=float, default=15.0, help='Maximum deviation of the simplified route in metres')
+
+    def handle(self, *args, **options):
+        cutoff = int((timezone.now() - timedelta(days=options['older_than_days'])).timestamp())
+        tolerance_km = options['tolerance_m'] / 1000.0
+        pending = LocationPing.objects.filter(compacted=False, recorded_at__lt=cutoff)
+
+        # Materialized first: the loop writes to the table this query reads
+        traces = list(pending.values_list('rider_id', 'order_id').distinct())
+        kept_total = removed_total = 0
+        for rider_id, order_id in traces:
+            rows = list(
+                pending.filter(rider_id=rider_id, order_id=order_id)
+                .order_by('recorded_at', 'id')
+                .values_list('id', 'recorded_at', 'latitude_e6', 'longitude_e6')
+            )
+            # Idle pings span days; only pings close in time form one route
+            kept_ids = []
+            for segment in segments(rows):
+                keep = simplify_track([(lat / 1e6, lon / 1e6) for _, _, lat, lon in segment], tolerance_km)
+                kept_ids += [segment[i][0] for i in keep]
+            removed_ids = sorted(set(row[0] for row in rows) - set(kept_ids))
+            with transaction.atomic(using=TRACE_DB):
+                for start in range(0, max(len(kept_ids), len(removed_ids)), CHUNK_SIZE):
+                    LocationPing.objects.filter(id__in=kept_ids[start:start + CHUNK_SIZE]).update(compacted=True)
+                    LocationPing.objects.filter(id__in=removed_ids[start:start + CHUNK_SIZE]).delete()
+            kept_total += len(kept_ids)
+            removed_total += len(removed_ids)
+
+        self.stdout.write(f"Compacted traces: kept {kept_total} pings, removed {removed_total}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.orders.eta import rebuild_speed_table
+
+
+class Command(BaseCommand):
+    help = 'Learn per-cell, per-hour rider travel speeds from completed orders and their traces'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='How many days of delivered orders to learn from')
+
+    def handle(self, *args, **options):
+        count = rebuild_speed_table(days=options['days'])
+        self.stdout.write(f"Stored {count} travel speed entries")
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or backfill) the daily order and payment rollup tables from the source rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only rebuild the last N days; all history when omitted')
+
+    def handle(self, *args, **options):
+        start = None
+        if options['days'] is not None:
+            start = timezone.localdate() - timedelta(days=options['days'] - 1)
+        order_rows, payment_rows = rebuild(start=start)
+        self.stdout.write(f"Wrote {order_rows} order and {payment_rows} payment rollup rows")
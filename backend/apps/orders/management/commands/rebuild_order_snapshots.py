@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.orders.models import Order
+from apps.orders.snapshots import snapshots
+
+
+BATCH_SIZE = 500  # stay under SQLite's bound-parameter limit
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or backfill) the order snapshot read model from the source rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only build snapshots that do not exist yet')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.order_by('id')
+        if options['missing']:
+            orders = orders.filter(snapshot__isnull=True)
+        order_ids = list(orders.values_list('id', flat=True))
+        for start in range(0, len(order_ids), BATCH_SIZE):
+            snapshots.refresh(order_ids[start:start + BATCH_SIZE])
+        self.stdout.write(f"Rebuilt {len(order_ids)} order snapshots")
@@ -0,0 +1,22 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.layers import DEFAULT_SHARD, Broker
+
+
+class Command(BaseCommand):
+    help = 'Run one channel broker shard relaying websocket groups between ASGI worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=DEFAULT_SHARD,
+                            help='tcp://host:port or unix:///path to listen on; start one process per shard')
+        parser.add_argument('--max-buffer', type=int, default=10000,
+                            help='Frames queued per worker before further frames to it are dropped')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Channel broker listening on {options['address']}")
+        try:
+            asyncio.run(Broker(max_buffer=options['max_buffer']).serve(options['address']))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.orders.batching import assign_batches
+from apps.orders.dispatch import assign_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Periodically match unassigned accepted orders to online riders in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between dispatch rounds')
+        parser.add_argument('--once', action='store_true', help='Run a single dispatch round and exit')
+        parser.add_argument('--batching', action='store_true',
+                            help='Group compatible orders into multi-stop trips before single assignment')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            close_old_connections()
+            if options['batching']:
+                batches = assign_batches()
+                if batches:
+                    self.stdout.write(f"Created {len(batches)} delivery batches")
+            assigned = assign_pending_orders()
+            if assigned:
+                self.stdout.write(f"Assigned {len(assigned)} orders")
+            if options['once']:
+                break
+            time.sleep(interval)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.orders.outbox import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send pending order websocket notifications from the outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sent = 0
+            while True:
+                drained = outbox.drain()
+                if not drained:
+                    break
+                sent += drained
+            if sent:
+                self.stdout.write(f"Sent {sent} outbox messages")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_orderevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationPing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rider_id', models.BigIntegerField()),
+                ('order_id', models.BigIntegerField(blank=True, null=True)),
+                ('recorded_at', models.IntegerField()),
+                ('latitude_e6', models.IntegerField()),
+                ('longitude_e6', models.IntegerField()),
+                ('compacted', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rider_id', 'recorded_at'], name='orders_loca_rider_i_70c814_idx'), models.Index(fields=['order_id', 'recorded_at'], name='orders_loca_order_i_48e5e7_idx')],
+            },
+        ),
+    ]
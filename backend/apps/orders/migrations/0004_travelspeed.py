@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_locationping'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravelSpeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=32)),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('speed_kmh', models.FloatField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'hour'), name='unique_travel_speed_cell_hour')],
+            },
+        ),
+    ]
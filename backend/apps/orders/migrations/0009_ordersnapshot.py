@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSnapshot',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='orders.order')),
+                ('document', models.JSONField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -14,17 +14,49 @@ class Order(models.Model):
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='orders')
     vendor = models.ForeignKey('accounts.Vendor', on_delete=models.PROTECT, related_name='orders')
     rider = models.ForeignKey('accounts.Rider', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    batch = models.ForeignKey('orders.DeliveryBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     subtotal_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     delivery_fee = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Drop-off point, used for route batching
+    delivery_address = models.CharField(max_length=255, blank=True)
+    delivery_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    delivery_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id), overall and per party
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['customer', 'created_at', 'id'], name='order_customer_created_idx'),
+            models.Index(fields=['vendor', 'created_at', 'id'], name='order_vendor_created_idx'),
+            models.Index(fields=['rider', 'created_at', 'id'], name='order_rider_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"Order #{self.id} - {self.status}"
 
 
+class DeliveryBatch(models.Model):
+    """Several orders carried by one rider in a single trip, see apps.orders.batching"""
+    class Status(models.TextChoices):
+        ACTIVE = 'active', 'Active'
+        COMPLETED = 'completed', 'Completed'
+
+    rider = models.ForeignKey('accounts.Rider', on_delete=models.SET_NULL, null=True, blank=True, related_name='batches')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
+    # Ordered stops: [{"order_id", "kind": "pickup"|"dropoff", "lat", "lon"}]
+    stops = models.JSONField(default=list)
+    route_km = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"DeliveryBatch #{self.id} - {self.status}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey('catalog.Product', on_delete=models.PROTECT)
@@ -46,3 +78,106 @@ class OrderEvent(models.Model):
 
     def __str__(self) -> str:
         return f"OrderEvent(order={self.order_id}, status={self.status})"
+
+
+class TravelSpeed(models.Model):
+    """Learned average rider speed per geographic cell and hour of day, see apps.orders.eta"""
+    cell = models.CharField(max_length=32)
+    hour = models.PositiveSmallIntegerField()
+    speed_kmh = models.FloatField()
+    samples = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cell', 'hour'], name='unique_travel_speed_cell_hour'),
+        ]
+
+    def __str__(self) -> str:
+        return f"TravelSpeed({self.cell} @ {self.hour}h = {self.speed_kmh:.1f} km/h)"
+
+
+class OrderSnapshot(models.Model):
+    """
+    Denormalized read model of one order: the JSON document served by the
+    order endpoints and websocket frames, rebuilt by apps.orders.snapshots
+    whenever the order changes.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    document = models.JSONField()
+    updated_at = models.DateTimeField()
+
+
+class OutboxMessage(models.Model):
+    """
+    Pending websocket notification about an order, written in the same
+    transaction as the change and sent later by apps.orders.outbox.
+    """
+    order_id = models.BigIntegerField()
+    kind = models.CharField(max_length=32)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set while a dispatcher is sending the row; stale claims are retried
+    claim = models.CharField(max_length=32, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"OutboxMessage #{self.id} {self.kind} for order #{self.order_id}"
+
+
+class OrderDailyStats(models.Model):
+    """Orders and revenue per day (of order creation), vendor and status, see apps.orders.rollups"""
+    day = models.DateField()
+    vendor = models.ForeignKey('accounts.Vendor', on_delete=models.CASCADE, related_name='daily_stats')
+    status = models.CharField(max_length=20, choices=Order.Status.choices)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'vendor', 'status'], name='unique_order_daily_stats'),
+        ]
+
+    def __str__(self) -> str:
+        return f"OrderDailyStats({self.day}, vendor #{self.vendor_id}, {self.status})"
+
+
+class PaymentDailyStats(models.Model):
+    """Payments per day (of order creation) and provider, see apps.orders.rollups"""
+    day = models.DateField()
+    provider = models.CharField(max_length=20)
+    payment_count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'provider'], name='unique_payment_daily_stats'),
+        ]
+
+    def __str__(self) -> str:
+        return f"PaymentDailyStats({self.day}, {self.provider})"
+
+
+class LocationPing(models.Model):
+    """
+    Append-only rider GPS trace row.
+
+    Rows are fixed width (integer ids, epoch seconds and microdegrees) and
+    live in the separate ``traces`` database, see apps.orders.routers.
+    Rider and order are plain ids because foreign keys cannot span databases.
+    """
+    rider_id = models.BigIntegerField()
+    order_id = models.BigIntegerField(null=True, blank=True)
+    recorded_at = models.IntegerField()  # unix epoch seconds
+    latitude_e6 = models.IntegerField()
+    longitude_e6 = models.IntegerField()
+    compacted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rider_id', 'recorded_at']),
+            models.Index(fields=['order_id', 'recorded_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"LocationPing(rider={self.rider_id}, order={self.order_id}, t={self.recorded_at})"
@@ -0,0 +1,155 @@
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from channels.layers import get_channel_layer
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .fanout import (
+    PAYLOAD_VERSION, order_frame, party_groups, publish, status_broadcast, vendor_group, watcher_groups,
+)
+from .models import OutboxMessage
+from .snapshots import public_document, snapshots
+
+
+logger = logging.getLogger(__name__)
+
+# Message kinds
+CREATED = 'created'                # new order: order_created to every party
+UPDATED = 'updated'                # order changed: status to the parties and watchers, order_updated to the vendor
+ASSIGNED = 'assigned'              # rider picked by the system gets order_created
+DELIVERY_REJECTED = 'delivery_rejected'
+
+BATCH_SIZE = 200                   # rows claimed per drain
+CLAIM_TIMEOUT_SECONDS = 60         # claims older than this are considered abandoned
+WAKE_DELAY_SECONDS = 0.05          # in-process drain shortly after a commit
+
+
+def enqueue(order_id, kind, **data):
+    """Record a notification; call inside the transaction that changes the order"""
+    OutboxMessage.objects.create(order_id=order_id, kind=kind, data=data)
+    # Every order change is notified, so this is also where its snapshot goes stale
+    snapshots.mark_stale([order_id])
+    outbox.wake()
+
+
+def enqueue_many(order_ids, kind):
+    OutboxMessage.objects.bulk_create([OutboxMessage(order_id=order_id, kind=kind) for order_id in order_ids])
+    snapshots.mark_stale(order_ids)
+    outbox.wake()
+
+
+def build_frames(document, kind, data, summary):
+    """(groups, frame) pairs for one deduplicated outbox entry"""
+    if kind == CREATED:
+        return [(party_groups(document), order_frame("order_created", document, summary))]
+    if kind == UPDATED:
+        return [
+            (party_groups(document, vendor=False), order_frame("order_status_changed", document, summary)),
+            ([vendor_group(document)], order_frame("order_updated", document, summary)),
+            (watcher_groups(document), status_broadcast(document)),
+        ]
+    if kind == ASSIGNED:
+        rider_id = data.get("rider_id") or document["rider"]
+        return [([f"rider_{rider_id}"], order_frame("order_created", document, summary))] if rider_id else []
+    if kind == DELIVERY_REJECTED:
+        return [(["orders"], {
+            "type": "delivery_rejected",
+            "v": PAYLOAD_VERSION,
+            "order_id": document["id"],
+            "rider_id": data.get("rider_id"),
+            "message": "Delivery request rejected by rider",
+        })]
+    logger.warning("Unknown outbox message kind %s", kind)
+    return []
+
+
+class OutboxDispatcher:
+    """
+    Drains OutboxMessage rows to the channel layer.
+
+    Rows are claimed in batches with a conditional update, so concurrent
+    dispatchers (request threads and the run_outbox_dispatcher worker)
+    never send the same row twice. Within a batch, messages of the same
+    kind for the same order collapse to one, each order's snapshot is read
+    and summarized once, and each frame is encoded once for all its groups.
+    """
+
+    def __init__(self):
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        """Drain in the background once the current transaction commits"""
+        transaction.on_commit(self._schedule)
+
+    def _schedule(self):
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(WAKE_DELAY_SECONDS, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+        try:
+            while self.drain():
+                pass
+        except Exception:
+            logger.exception("Outbox drain failed")
+        finally:
+            # The timer thread opened its own database connection
+            connections.close_all()
+
+    def _claim(self, limit):
+        token = uuid.uuid4().hex
+        now = timezone.now()
+        claimable = Q(claim='') | Q(claimed_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS))
+        ids = list(OutboxMessage.objects.filter(claimable).order_by('id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        OutboxMessage.objects.filter(claimable, id__in=ids).update(claim=token, claimed_at=now)
+        return list(OutboxMessage.objects.filter(claim=token).order_by('id'))
+
+    def drain(self, limit=BATCH_SIZE):
+        """Send one batch; returns the number of outbox rows consumed"""
+        rows = self._claim(limit)
+        if not rows:
+            return 0
+
+        # Keep the last entry per (order, kind); the order is sent as it is now,
+        # so a creation notice already carries any update made in the same batch
+        latest = {}
+        for row in rows:
+            latest[(row.order_id, row.kind)] = row
+        for order_id, kind in list(latest):
+            if kind == CREATED:
+                latest.pop((order_id, UPDATED), None)
+        documents = snapshots.documents(list({order_id for order_id, _ in latest}))
+
+        summaries = {}
+        channel_layer = get_channel_layer()
+        for (order_id, kind), row in latest.items():
+            document = documents.get(order_id)
+            if document is None:
+                continue
+            if order_id not in summaries:
+                summaries[order_id] = public_document(document)
+            for groups, frame in build_frames(document, kind, row.data, summaries[order_id]):
+                publish(groups, frame, channel_layer)
+
+        OutboxMessage.objects.filter(id__in=[row.id for row in rows]).delete()
+        return len(rows)
+
+    def reset(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+
+
+outbox = OutboxDispatcher()
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, When
+
+from apps.catalog.models import Product
+from .models import Order, OrderItem
+
+
+class PlacementError(Exception):
+    """An order that cannot be placed; the message is safe to return to the client"""
+
+
+def cart_lines(items):
+    """
+    ``[{product, quantity}]`` from the request as product id -> quantity,
+    in first-seen order, with repeated products merged into one line.
+    """
+    lines = OrderedDict()
+    try:
+        for item in items:
+            product_id = int(item.get("product"))
+            quantity = int(item.get("quantity", 1))
+            if quantity <= 0:
+                raise PlacementError("Quantity must be positive")
+            lines[product_id] = lines.get(product_id, 0) + quantity
+    except (TypeError, ValueError, AttributeError):
+        raise PlacementError("Invalid payload")
+    return lines
+
+
+def money(value):
+    try:
+        return Decimal(str(value or 0)).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return Decimal("0.00")
+
+
+def place_order(customer, vendor_id, items, delivery_fee=0, **fields):
+    """
+    Create a pending order for ``items`` and reserve its stock.
+
+    Runs a constant number of queries whatever the cart size: one locks all
+    products, one conditional UPDATE takes the stock of every line, one
+    inserts the order and one bulk-inserts its items. The UPDATE only
+    touches rows that still hold enough stock, so if it changes fewer rows
+    than the cart has products another checkout got there first and the
+    whole placement rolls back; stock can never go negative.
+
+    ``fields`` are extra Order fields (delivery address and location).
+    Raises PlacementError when the cart cannot be placed.
+    """
+    lines = cart_lines(items)
+    if not lines:
+        raise PlacementError("Items required")
+    delivery_fee = money(delivery_fee)
+
+    with transaction.atomic():
+        products = Product.objects.select_for_update().in_bulk(list(lines))
+        subtotal = Decimal("0.00")
+        for product_id, quantity in lines.items():
+            product = products.get(product_id)
+            if product is None or product.vendor_id != vendor_id:
+                raise PlacementError(f"Product {product_id} is not sold by this vendor")
+            if not product.active:
+                raise PlacementError(f"{product.name} is not available")
+            if product.stock < quantity:
+                raise PlacementError(f"Only {product.stock} of {product.name} left in stock")
+            subtotal += product.price * quantity
+
+        enough = Q()
+        for product_id, quantity in lines.items():
+            enough |= Q(pk=product_id, stock__gte=quantity)
+        reserved = Product.objects.filter(enough).update(stock=Case(
+            *[When(pk=product_id, then=F("stock") - quantity) for product_id, quantity in lines.items()],
+            default=F("stock"),
+            output_field=PositiveIntegerField(),
+        ))
+        if reserved != len(lines):
+            raise PlacementError("Some items just sold out")
+
+        order = Order.objects.create(
+            customer=customer,
+            vendor_id=vendor_id,
+            status=Order.Status.PENDING,
+            subtotal_amount=subtotal,
+            delivery_fee=delivery_fee,
+            total_amount=subtotal + delivery_fee,
+            **fields,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=products[product_id].price)
+            for product_id, quantity in lines.items()
+        ])
+    return order
+
+
+def release_stock(order_ids):
+    """Return the reserved stock of ``order_ids`` to their products in one UPDATE"""
+    quantities = dict(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list("product_id")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+    if quantities:
+        Product.objects.filter(pk__in=list(quantities)).update(stock=Case(
+            *[When(pk=product_id, then=F("stock") + quantity) for product_id, quantity in quantities.items()],
+            default=F("stock"),
+            output_field=PositiveIntegerField(),
+        ))
@@ -0,0 +1,54 @@
+from django.db.models import Prefetch
+
+from core.serializers import expand_paths, field_names
+from .models import OrderEvent, OrderItem
+
+
+TIMELINE_ATTR = 'timeline'   # prefetched events, oldest first; read by OrderSerializer.get_events
+
+# Item relations OrderSerializer nests, by ``expand`` path
+ITEM_RELATIONS = {
+    'items.product': 'product',
+    'items.product.vendor': 'product__vendor',
+    'items.product.vendor.owner': 'product__vendor__owner',
+    'items.product.approved_by': 'product__approved_by',
+}
+
+
+def timeline(order):
+    """An order's events oldest first, from the prefetch when there is one"""
+    events = getattr(order, TIMELINE_ATTR, None)
+    if events is None:
+        events = order.events.order_by('created_at', 'id')
+    return events
+
+
+def for_serializer(queryset, request=None):
+    """
+    ``queryset`` with everything OrderSerializer renders prefetched, so
+    serializing a page of orders costs the same few queries however many
+    orders, items and events it holds: one for the orders, one for their
+    items joined to products, vendors and owners, one for their events.
+
+    Honours the request's ``fields`` and ``expand`` so trimmed responses
+    skip the work for what they leave out.
+    """
+    fields = field_names(request)
+    expanded = expand_paths(request)
+
+    def shown(name):
+        return fields is None or name in fields
+
+    def expands(path):
+        return expanded is None or path in expanded
+
+    queryset = queryset.select_related('customer')
+    lookups = []
+    if shown('items'):
+        related = [lookup for path, lookup in ITEM_RELATIONS.items() if expands(path)]
+        lookups.append(Prefetch('items', queryset=OrderItem.objects.select_related(*related).order_by('id')))
+    if shown('events') and expands('events'):
+        lookups.append(Prefetch(
+            'events', queryset=OrderEvent.objects.order_by('created_at', 'id'), to_attr=TIMELINE_ATTR,
+        ))
+    return queryset.prefetch_related(*lookups)
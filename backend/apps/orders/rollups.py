@@ -0,0 +1,214 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderDailyStats, PaymentDailyStats
+
+
+# Order fields a rollup row depends on
+ORDER_FIELDS = ('created_at', 'vendor_id', 'status', 'total_amount')
+PAYMENT_FIELDS = ('order_id', 'provider', 'amount')
+
+
+def _bump(model, key, **deltas):
+    """Add ``deltas`` to the counters of the row identified by ``key``, creating it if needed"""
+    if not any(deltas.values()):
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**key).update(**changes)
+
+
+def _state(instance, fields):
+    """Loaded values of ``fields``, or None when any of them is deferred"""
+    values = instance.__dict__
+    if instance.pk is None or any(field not in values for field in fields):
+        return None
+    return tuple(values[field] for field in fields)
+
+
+def remember(instance):
+    """Snapshot the rollup-relevant fields of an Order or Payment as loaded"""
+    fields = ORDER_FIELDS if isinstance(instance, Order) else PAYMENT_FIELDS
+    instance._rollup_state = _state(instance, fields)
+
+
+def loaded_status(order):
+    """Status an Order had when it was loaded or last saved, None if unknown"""
+    state = getattr(order, '_rollup_state', None)
+    return state[ORDER_FIELDS.index('status')] if state else None
+
+
+def _order_key(created_at, vendor_id, status):
+    return {'day': timezone.localdate(created_at), 'vendor_id': vendor_id, 'status': status}
+
+
+def apply_order(order, created=False):
+    """Move an order's contribution from its previous rollup row to its current one"""
+    previous = None if created else getattr(order, '_rollup_state', None)
+    if previous is None and not created:
+        # Loaded with deferred fields: the last known state is unavailable
+        return
+    current = (order.created_at, order.vendor_id, order.status, Decimal(order.total_amount or 0))
+    if previous == current:
+        return
+    if previous is not None:
+        created_at, vendor_id, status, total = previous
+        _bump(OrderDailyStats, _order_key(created_at, vendor_id, status), order_count=-1, revenue=-Decimal(total or 0))
+    created_at, vendor_id, status, total = current
+    _bump(OrderDailyStats, _order_key(created_at, vendor_id, status), order_count=1, revenue=total)
+    order._rollup_state = current
+
+
+def discard_order(order):
+    state = getattr(order, '_rollup_state', None)
+    if state is not None:
+        created_at, vendor_id, status, total = state
+        _bump(OrderDailyStats, _order_key(created_at, vendor_id, status), order_count=-1, revenue=-Decimal(total or 0))
+
+
+def _payment_day(order_id):
+    created_at = Order.objects.filter(pk=order_id).values_list('created_at', flat=True).first()
+    return timezone.localdate(created_at) if created_at else None
+
+
+def apply_payment(payment, created=False):
+    """Same as apply_order for a Payment; the day is that of its order's creation"""
+    previous = None if created else getattr(payment, '_rollup_state', None)
+    if previous is None and not created:
+        return
+    current = (payment.order_id, payment.provider, Decimal(payment.amount or 0))
+    if previous == current:
+        return
+    day = _payment_day(payment.order_id)
+    if day is None:
+        return
+    if previous is not None:
+        order_id, provider, amount = previous
+        previous_day = day if order_id == payment.order_id else _payment_day(order_id)
+        _bump(PaymentDailyStats, {'day': previous_day, 'provider': provider},
+              payment_count=-1, amount=-Decimal(amount or 0))
+    _bump(PaymentDailyStats, {'day': day, 'provider': payment.provider}, payment_count=1, amount=current[2])
+    payment._rollup_state = current
+
+
+def discard_payment(payment):
+    state = getattr(payment, '_rollup_state', None)
+    if state is None:
+        return
+    order_id, provider, amount = state
+    day = _payment_day(order_id)
+    if day is not None:
+        _bump(PaymentDailyStats, {'day': day, 'provider': provider}, payment_count=-1, amount=-Decimal(amount or 0))
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute the rollup rows for days in [start, end] from the source tables.
+
+    Both bounds are optional; without them every row is rebuilt.
+    Returns (order_rows, payment_rows) written.
+    """
+    from apps.payments.models import Payment
+
+    orders = Order.objects.annotate(day=TruncDate('created_at'))
+    payments = Payment.objects.annotate(day=TruncDate('order__created_at'))
+    order_stats = OrderDailyStats.objects.all()
+    payment_stats = PaymentDailyStats.objects.all()
+    if start is not None:
+        orders, payments = orders.filter(day__gte=start), payments.filter(day__gte=start)
+        order_stats, payment_stats = order_stats.filter(day__gte=start), payment_stats.filter(day__gte=start)
+    if end is not None:
+        orders, payments = orders.filter(day__lte=end), payments.filter(day__lte=end)
+        order_stats, payment_stats = order_stats.filter(day__lte=end), payment_stats.filter(day__lte=end)
+
+    order_rows = [
+        OrderDailyStats(day=row['day'], vendor_id=row['vendor_id'], status=row['status'],
+                        order_count=row['n'], revenue=row['revenue'] or 0)
+        for row in orders.order_by().values('day', 'vendor_id', 'status').annotate(
+            n=Count('id'), revenue=Sum('total_amount'))
+    ]
+    payment_rows = [
+        PaymentDailyStats(day=row['day'], provider=row['provider'],
+                          payment_count=row['n'], amount=row['amount_sum'] or 0)
+        for row in payments.order_by().values('day', 'provider').annotate(
+            n=Count('id'), amount_sum=Sum('amount'))
+    ]
+    with transaction.atomic():
+        order_stats.delete()
+        payment_stats.delete()
+        OrderDailyStats.objects.bulk_create(order_rows, batch_size=500)
+        PaymentDailyStats.objects.bulk_create(payment_rows, batch_size=500)
+
+    from .analytics import invalidate
+
+    invalidate()
+    return len(order_rows), len(payment_rows)
+
+
+def day_bounds(queryset):
+    """(first, last) creation day of the orders in ``queryset``, or (None, None)"""
+    bounds = queryset.aggregate(first=Min('created_at'), last=Max('created_at'))
+    if bounds['first'] is None:
+        return None, None
+    return timezone.localdate(bounds['first']), timezone.localdate(bounds['last'])
+
+
+def revenue_by_day(start, end):
+    """[{date, revenue, orders}] for every day in [start, end], zero-filled"""
+    per_day = {
+        row['day']: row
+        for row in OrderDailyStats.objects.filter(day__gte=start, day__lte=end)
+        .order_by().values('day').annotate(revenue=Sum('revenue'), orders=Sum('order_count'))
+    }
+    result = []
+    day = start
+    while day <= end:
+        row = per_day.get(day, {})
+        result.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'revenue': float(row.get('revenue') or 0),
+            'orders': row.get('orders') or 0,
+        })
+        day += timedelta(days=1)
+    return result
+
+
+def vendor_stats(start, end, limit=10):
+    """Vendors ranked by revenue in [start, end]"""
+    rows = (
+        OrderDailyStats.objects.filter(day__gte=start, day__lte=end)
+        .values('vendor__name')
+        .annotate(revenue=Sum('revenue'), order_count=Sum('order_count'))
+        .filter(order_count__gt=0)
+        .order_by('-revenue')[:limit]
+    )
+    return [
+        {'vendor__name': row['vendor__name'], 'revenue': float(row['revenue'] or 0), 'order_count': row['order_count']}
+        for row in rows
+    ]
+
+
+def payment_methods(start, end):
+    """Payment count and amount per provider for orders created in [start, end]"""
+    rows = (
+        PaymentDailyStats.objects.filter(day__gte=start, day__lte=end)
+        .values('provider')
+        .annotate(count=Sum('payment_count'), total_amount=Sum('amount'))
+        .filter(count__gt=0)
+        .order_by('-total_amount')
+    )
+    return [
+        {'provider': row['provider'], 'count': row['count'], 'total_amount': float(row['total_amount'] or 0)}
+        for row in rows
+    ]
@@ -0,0 +1,26 @@
+TRACE_DB = 'traces'
+TRACE_MODELS = {'locationping'}
+
+
+class TraceRouter:
+    """Send the high-volume location trace table to its own database"""
+
+    def _is_trace(self, model):
+        return model._meta.app_label == 'orders' and model._meta.model_name in TRACE_MODELS
+
+    def db_for_read(self, model, **hints):
+        return TRACE_DB if self._is_trace(model) else None
+
+    def db_for_write(self, model, **hints):
+        return TRACE_DB if self._is_trace(model) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        is_trace = app_label == 'orders' and model_name in TRACE_MODELS
+        if db == TRACE_DB:
+            return is_trace
+        if is_trace:
+            return False
+        return None
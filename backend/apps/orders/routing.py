@@ -1,12 +1,14 @@
 from django.urls import re_path
 from . import consumers
-from . import admin_consumer
-from . import vendor_consumer
 
 websocket_urlpatterns = [
-    re_path(r"^ws/orders/$", consumers.OrdersConsumer.as_asgi()),
+    re_path(r"^ws/orders/$", consumers.OrderStreamConsumer.as_asgi()),
     re_path(r"^ws/orders/(?P<order_id>\d+)/$", consumers.OrderDetailConsumer.as_asgi()),
-    re_path(r"^ws/rider/(?P<rider_id>\d+)/$", consumers.RiderConsumer.as_asgi()),
-    re_path(r"^ws/admin/dashboard/$", admin_consumer.AdminDashboardConsumer.as_asgi()),
-    re_path(r"^ws/vendor/$", vendor_consumer.VendorConsumer.as_asgi()),
+    re_path(r"^ws/admin/dashboard/$", consumers.AdminDashboardConsumer.as_asgi()),
+    re_path(r"^ws/customer/orders/$", consumers.CustomerOrderConsumer.as_asgi()),
+    re_path(r"^ws/vendor/orders/$", consumers.VendorOrderConsumer.as_asgi()),
+    re_path(r"^ws/rider/orders/$", consumers.RiderOrderConsumer.as_asgi()),
+    # Older paths; the rider id in the URL is ignored, groups come from the authenticated user
+    re_path(r"^ws/vendor/$", consumers.VendorOrderConsumer.as_asgi()),
+    re_path(r"^ws/rider/(?P<rider_id>\d+)/$", consumers.RiderOrderConsumer.as_asgi()),
 ]
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from .models import Order, OrderItem, OrderEvent
+from .models import Order, OrderItem, OrderEvent, DeliveryBatch
 from apps.catalog.serializers import ProductSerializer
 from django.contrib.auth.models import User
+from core.serializers import SparseFieldsMixin
+from .prefetch import timeline
 
 
 class UserBasicSerializer(serializers.ModelSerializer):
@@ -10,18 +12,20 @@ class UserBasicSerializer(serializers.ModelSerializer):
         fields = ["id", "username"]
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
+    expandable_fields = ("product",)
 
     class Meta:
         model = OrderItem
         fields = ["id", "product", "quantity", "price"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer = UserBasicSerializer(read_only=True)
     items = OrderItemSerializer(many=True, read_only=True)
     events = serializers.SerializerMethodField()
+    expandable_fields = ("customer", "events")
 
     class Meta:
         model = Order
@@ -34,6 +38,9 @@ class OrderSerializer(serializers.ModelSerializer):
             "subtotal_amount",
             "delivery_fee",
             "total_amount",
+            "delivery_address",
+            "delivery_latitude",
+            "delivery_longitude",
             "created_at",
             "updated_at",
             "items",
@@ -42,8 +49,44 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
     def get_events(self, obj):
-        # Return list of {status, note, created_at}
+        # Return list of {status, note, created_at}; prefetch with apps.orders.prefetch.for_serializer
         return [
             {"status": e.status, "note": e.note, "created_at": e.created_at}
-            for e in obj.events.all().order_by("created_at")
+            for e in timeline(obj)
         ]
+
+
+class AvailableDeliverySerializer(serializers.Serializer):
+    """Compact rider feed entry built from feeds.available_orders_near rows"""
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+    customer = serializers.CharField(source="customer__username")
+    vendor = serializers.CharField(source="vendor__name")
+    vendor_id = serializers.IntegerField()
+    address = serializers.CharField(source="vendor__location")
+    items = serializers.ListField(child=serializers.CharField())
+    total = serializers.DecimalField(source="total_amount", max_digits=12, decimal_places=2)
+    delivery_fee = serializers.DecimalField(max_digits=12, decimal_places=2)
+    created_at = serializers.DateTimeField()
+    distance_km = serializers.SerializerMethodField()
+    distance = serializers.SerializerMethodField()
+    eta_minutes = serializers.IntegerField(required=False)
+    estimatedTime = serializers.SerializerMethodField()
+
+    def get_distance_km(self, row):
+        distance = row.get("distance_km")
+        return None if distance is None else round(distance, 2)
+
+    def get_distance(self, row):
+        distance = row.get("distance_km")
+        return None if distance is None else f"{distance:.1f} km"
+
+    def get_estimatedTime(self, row):
+        eta = row.get("eta_minutes")
+        return None if eta is None else f"{eta} min"
+
+
+class DeliveryBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeliveryBatch
+        fields = ["id", "status", "route_km", "stops", "created_at"]
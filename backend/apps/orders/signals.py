@@ -1,115 +1,136 @@
-import json
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from django.db import transaction
 from django.utils import timezone
 
 
+@receiver(post_save, sender='orders.Order')
+def count_order_status(sender, instance, created, **kwargs):
+    """Adjust the in-process status counters; registered before the broadcasts that read them"""
+    from .counters import status_counters
+    from .rollups import loaded_status
+
+    old_status, new_status = loaded_status(instance), instance.status
+    transaction.on_commit(lambda: status_counters.transition(old_status, new_status, created=created))
+
+
+@receiver(post_delete, sender='orders.Order')
+def uncount_order_status(sender, instance, **kwargs):
+    from .counters import status_counters
+
+    status = instance.__dict__.get('status')
+    if status is not None:
+        transaction.on_commit(lambda: status_counters.removed(status))
+
+
 @receiver(post_save, sender='orders.Order')
 def broadcast_order_updates(sender, instance, created, **kwargs):
-    """Broadcast WebSocket updates when orders are created or updated"""
-    from .models import Order
-    from .serializers import OrderSerializer
-
-    channel_layer = get_channel_layer()
-
-    try:
-        order_data = OrderSerializer(instance).data
-
-        if created:
-            # Broadcast order creation to all relevant parties
-            broadcast_order_creation(channel_layer, instance, order_data)
-        else:
-            # Broadcast order updates to all relevant parties
-            broadcast_order_update(channel_layer, instance, order_data)
-
-    except Exception as e:
-        # Log error but don't break the save operation
-        print(f"Error broadcasting order update: {e}")
-
-
-def broadcast_order_creation(channel_layer, order, order_data):
-    """Broadcast order creation to all relevant parties"""
-    from .models import Order
-
-    # Broadcast to vendor
-    async_to_sync(channel_layer.group_send)(
-        f"vendor_{order.vendor.id}",
-        {
-            "type": "order_created",
-            "order": order_data
-        }
-    )
-
-    # Broadcast to customer
-    async_to_sync(channel_layer.group_send)(
-        f"customer_{order.customer.id}",
-        {
-            "type": "order_created",
-            "order": order_data
-        }
-    )
-
-    # Broadcast to admin dashboard for analytics update
-    async_to_sync(channel_layer.group_send)(
-        "admin_dashboard",
-        {
-            "type": "analytics_update",
-            "data": {
-                "orders_today": Order.objects.filter(created_at__date=order.created_at.date()).count(),
-                "total_orders": Order.objects.count(),
-                "new_order": order_data
-            }
-        }
-    )
-
-
-def broadcast_order_update(channel_layer, order, order_data):
-    """Broadcast order updates to all relevant parties"""
-    from .models import Order
-
-    # Broadcast status change to customer
-    async_to_sync(channel_layer.group_send)(
-        f"customer_{order.customer.id}",
-        {
-            "type": "order_status_changed",
-            "order_id": order.id,
-            "status": order.status
-        }
-    )
-
-    # Broadcast order update to vendor
-    async_to_sync(channel_layer.group_send)(
-        f"vendor_{order.vendor.id}",
-        {
-            "type": "order_updated",
-            "order": order_data
-        }
-    )
-
-    # Broadcast to rider if assigned
-    if order.rider:
-        async_to_sync(channel_layer.group_send)(
-            f"rider_{order.rider.id}",
-            {
-                "type": "order_status_changed",
-                "order_id": order.id,
-                "status": order.status
-            }
-        )
-
-    # Broadcast to admin dashboard for analytics update
-    async_to_sync(channel_layer.group_send)(
-        "admin_dashboard",
-        {
-            "type": "analytics_update",
-            "data": {
-                "status_counts": {
-                    status: Order.objects.filter(status=status).count()
-                    for status, _ in Order.Status.choices
-                },
-                "updated_order": order_data
-            }
-        }
-    )
+    """Queue WebSocket updates in the outbox; they are sent once the change commits"""
+    from .dashboard import dashboard_publisher
+    from .outbox import CREATED, UPDATED, enqueue
+
+    enqueue(instance.id, CREATED if created else UPDATED)
+
+    # Admin dashboard gets one coalesced analytics frame per push window
+    dashboard_publisher.mark_changed(instance.id)
+
+
+@receiver(post_save, sender='orders.OrderEvent')
+@receiver(post_save, sender='orders.OrderItem')
+@receiver(post_delete, sender='orders.OrderItem')
+def mark_snapshot_stale(sender, instance, **kwargs):
+    """Events and items are part of the order snapshot; order saves mark it through the outbox"""
+    from .snapshots import snapshots
+
+    snapshots.mark_stale([instance.order_id])
+
+
+@receiver(post_save, sender='orders.Order')
+def sync_open_order_index(sender, instance, **kwargs):
+    """Keep the rider feed index limited to accepted, unassigned orders"""
+    from .feeds import open_orders
+    from .locations import active_deliveries
+
+    open_orders.sync(instance)
+    active_deliveries.sync(instance)
+
+
+@receiver(post_save, sender='orders.Order')
+def close_finished_batch(sender, instance, **kwargs):
+    """Mark a delivery batch completed once its last order is delivered or cancelled"""
+    from .batching import complete_batch
+    from .dispatch import ACTIVE_STATUSES
+
+    if instance.batch_id and instance.status not in ACTIVE_STATUSES:
+        complete_batch(instance.batch_id)
+
+
+@receiver(post_delete, sender='orders.Order')
+def drop_order_from_index(sender, instance, **kwargs):
+    from .feeds import open_orders
+    from .locations import active_deliveries
+
+    open_orders.remove(instance.id)
+    active_deliveries.remove(instance.id)
+
+
+@receiver(post_save, sender='accounts.Rider')
+def sync_rider_pool(sender, instance, **kwargs):
+    """Keep the in-memory dispatch pool in step with rider availability and position"""
+    from .dispatch import rider_pool
+
+    rider_pool.sync(instance)
+
+
+@receiver(post_delete, sender='accounts.Rider')
+def drop_rider_from_pool(sender, instance, **kwargs):
+    from .dispatch import rider_pool
+
+    rider_pool.remove(instance.id)
+
+
+@receiver(post_init, sender='orders.Order')
+@receiver(post_init, sender='payments.Payment')
+def remember_rollup_state(sender, instance, **kwargs):
+    """Keep the loaded state so a later save can move its rollup contribution"""
+    from .rollups import remember
+
+    remember(instance)
+
+
+@receiver(post_save, sender='orders.Order')
+def update_order_rollups(sender, instance, created, **kwargs):
+    from .rollups import apply_order
+
+    apply_order(instance, created=created)
+
+
+@receiver(post_delete, sender='orders.Order')
+def discard_order_rollups(sender, instance, **kwargs):
+    from .rollups import discard_order
+
+    discard_order(instance)
+
+
+@receiver(post_save, sender='payments.Payment')
+def update_payment_rollups(sender, instance, created, **kwargs):
+    from .rollups import apply_payment
+
+    apply_payment(instance, created=created)
+
+
+@receiver(post_delete, sender='payments.Payment')
+def discard_payment_rollups(sender, instance, **kwargs):
+    from .rollups import discard_payment
+
+    discard_payment(instance)
+
+
+@receiver(post_delete, sender='orders.Order')
+@receiver(post_save, sender='payments.Payment')
+@receiver(post_delete, sender='payments.Payment')
+def push_change_to_dashboard(sender, instance, **kwargs):
+    """Order saves push from the broadcast handlers; deletes and payments push here"""
+    from .dashboard import dashboard_publisher
+
+    dashboard_publisher.mark_changed(getattr(instance, 'order_id', instance.pk))
@@ -0,0 +1,150 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+from .models import Order, OrderEvent, OrderItem, OrderSnapshot
+from .prefetch import TIMELINE_ATTR, timeline
+
+
+# Fields of a document sent in websocket frames to the order's parties; the
+# customer, drop-off point and event notes stay out of pushed frames
+PUBLIC_FIELDS = (
+    "id", "vendor", "vendor_name", "rider", "status", "subtotal_amount", "delivery_fee",
+    "total_amount", "items", "created_at", "updated_at",
+)
+
+_datetime = DateTimeField()
+
+
+def _decimal(value):
+    return None if value is None else str(value)
+
+
+def _timestamp(value):
+    return None if value is None else _datetime.to_representation(value)
+
+
+def build_document(order):
+    """
+    The read-model document of an order loaded by ``load_orders``.
+
+    Shaped like OrderSerializer output, but each item carries only its
+    product's id and name, the vendor is an id plus its name and location,
+    and the customer is an id plus username. Product and vendor details
+    are as they were when the order last changed.
+    """
+    vendor = order.vendor
+    vendor_location = None
+    if vendor.latitude is not None and vendor.longitude is not None:
+        vendor_location = {"latitude": float(vendor.latitude), "longitude": float(vendor.longitude)}
+    return {
+        "id": order.id,
+        "customer": {"id": order.customer_id, "username": order.customer.username},
+        "vendor": order.vendor_id,
+        "vendor_name": vendor.name,
+        "vendor_location": vendor_location,
+        "rider": order.rider_id,
+        "status": order.status,
+        "subtotal_amount": _decimal(order.subtotal_amount),
+        "delivery_fee": _decimal(order.delivery_fee),
+        "total_amount": _decimal(order.total_amount),
+        "delivery_address": order.delivery_address,
+        "delivery_latitude": _decimal(order.delivery_latitude),
+        "delivery_longitude": _decimal(order.delivery_longitude),
+        "created_at": _timestamp(order.created_at),
+        "updated_at": _timestamp(order.updated_at),
+        "items": [
+            {
+                "id": item.id,
+                "product": {"id": item.product_id, "name": item.product.name},
+                "quantity": item.quantity,
+                "price": _decimal(item.price),
+            }
+            for item in order.items.all()
+        ],
+        "events": [
+            {"status": event.status, "note": event.note, "created_at": _timestamp(event.created_at)}
+            for event in timeline(order)
+        ],
+    }
+
+
+def public_document(document):
+    return {name: document[name] for name in PUBLIC_FIELDS}
+
+
+def load_orders(order_ids):
+    """Orders with everything build_document reads, in three queries"""
+    return Order.objects.filter(pk__in=order_ids).select_related('customer', 'vendor').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('id')),
+        Prefetch('events', queryset=OrderEvent.objects.order_by('created_at', 'id'), to_attr=TIMELINE_ATTR),
+    )
+
+
+class SnapshotStore:
+    """
+    Keeps OrderSnapshot rows in step with their orders.
+
+    Order changes mark the order stale inside their transaction; the marked
+    snapshots are rebuilt together once it commits. A rebuild locks the
+    order rows while it reads and writes, so a slow rebuild can never
+    overwrite a newer one. Reads fall back to building a missing snapshot,
+    which covers orders from before this table existed.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _pending(self):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = set()
+        return pending
+
+    def mark_stale(self, order_ids):
+        """Rebuild these orders' snapshots when the current transaction commits"""
+        self._pending().update(order_ids)
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        pending = self._pending()
+        if not pending:
+            return
+        order_ids = list(pending)
+        pending.clear()
+        self.refresh(order_ids)
+
+    def refresh(self, order_ids):
+        """Rebuild and store the snapshots of ``order_ids``; returns {order id: document}"""
+        with transaction.atomic():
+            # Locking the orders serializes rebuilds with each other and with writers
+            orders = list(load_orders(order_ids).select_for_update(of=('self',)))
+            documents = {order.id: build_document(order) for order in orders}
+            now = timezone.now()
+            OrderSnapshot.objects.bulk_create(
+                [OrderSnapshot(order_id=order_id, document=document, updated_at=now)
+                 for order_id, document in documents.items()],
+                update_conflicts=True, unique_fields=['order'], update_fields=['document', 'updated_at'],
+            )
+        return documents
+
+    def documents(self, order_ids):
+        """{order id: document} for the existing orders among ``order_ids``"""
+        documents = dict(OrderSnapshot.objects.filter(pk__in=order_ids).values_list('order_id', 'document'))
+        missing = [order_id for order_id in order_ids if order_id not in documents]
+        if missing:
+            documents.update(self.refresh(missing))
+        return documents
+
+    def get(self, order_id):
+        """One order's document by primary key, None when the order does not exist"""
+        return self.documents([order_id]).get(order_id)
+
+    def reset(self):
+        self._pending().clear()
+
+
+snapshots = SnapshotStore()
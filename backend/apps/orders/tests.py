@@ -1,3 +1,416 @@
-from django.test import TestCase
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.accounts.models import Account, Rider, Vendor
+from apps.accounts.principals import principals
+from apps.catalog.models import Product
+from . import analytics
+from .counters import StatusCounters
+from .dashboard import DASHBOARD_GROUP, DashboardPublisher, dashboard_publisher
+from .dispatch import (
+    BATCH_CANDIDATE_COUNT, BATCH_ORDER_LIMIT, UNASSIGNABLE, min_cost_assignment, rider_pool, solve_assignment,
+)
+from .geo import GridIndex
+from .locations import active_deliveries, location_store
+from .models import LocationPing, Order, OrderEvent, OrderItem
+from .outbox import CREATED, UPDATED, build_frames, outbox
+from .prefetch import for_serializer
+from .serializers import OrderSerializer
+
+
+class OrderListQueryCountTests(TestCase):
+    """Serializing orders must not cost extra queries per order, item or event"""
+
+    def setUp(self):
+        principals.clear()
+        self.customer = User.objects.create(username='customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            owner = User.objects.create(username=f'vendor{Vendor.objects.count()}')
+            vendor = Vendor.objects.create(owner=owner, name=owner.username)
+            order = Order.objects.create(customer=self.customer, vendor=vendor)
+            for price in (Decimal('2.50'), Decimal('4.00'), Decimal('1.25')):
+                product = Product.objects.create(vendor=vendor, name=f'p{price}', price=price, stock=10)
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=price)
+            OrderEvent.objects.create(order=order, status='accepted', note='second')
+            OrderEvent.objects.create(order=order, status='pending', note='first')
+
+    def serialize_all(self):
+        return OrderSerializer(for_serializer(Order.objects.all()), many=True).data
+
+    def test_serializer_queries_are_constant(self):
+        self.add_orders(2)
+        # orders with customers, items with products, vendors and owners, events
+        with self.assertNumQueries(3):
+            self.serialize_all()
+        self.add_orders(8)
+        with self.assertNumQueries(3):
+            data = self.serialize_all()
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['items'][0]['product']['vendor']['owner']['username'], 'vendor0')
+
+    def test_events_keep_their_order(self):
+        self.add_orders(1)
+        order = Order.objects.get()
+        prefetched = OrderSerializer(for_serializer(Order.objects.all()).get()).data['events']
+        self.assertEqual([e['note'] for e in prefetched], ['second', 'first'])
+        self.assertEqual(prefetched, OrderSerializer(order).data['events'])
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_list_endpoint_queries_are_constant(self):
+        nested = '/api/orders/?expand=customer,events,items.product.vendor.owner,items.product.approved_by'
+        self.add_orders(2)
+        self.list_queries(nested)  # resolve the principal once
+        few = self.list_queries(nested)
+        self.add_orders(8)
+        self.assertEqual(self.list_queries(nested), few)
+        self.assertLessEqual(self.list_queries('/api/orders/?expand=items'), few)
+
+
+class OrderSnapshotTests(TestCase):
+    """List, retrieve and tracking read the denormalized order snapshot"""
+
+    def setUp(self):
+        principals.clear()
+        self.customer = User.objects.create(username='customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        owner = User.objects.create(username='owner')
+        self.vendor = Vendor.objects.create(owner=owner, name='Deli')
+        self.product = Product.objects.create(vendor=self.vendor, name='Bread', price=Decimal('3.00'), stock=50)
+
+    @contextmanager
+    def committed(self):
+        """Run the on-commit work inline, without the background outbox drain"""
+        with self.captureOnCommitCallbacks(execute=True):
+            yield
+        outbox.reset()
+
+    def place(self, count=1):
+        with self.committed():
+            for _ in range(count):
+                response = self.client.post('/api/orders/', {
+                    'vendor': self.vendor.id, 'items': [{'product': self.product.id, 'quantity': 2}],
+                }, format='json')
+                self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_snapshot_follows_changes(self):
+        order_id = self.place()
+        with self.committed():
+            order = Order.objects.get(pk=order_id)
+            order.status = Order.Status.ACCEPTED
+            order.save()
+            OrderEvent.objects.create(order=order, status=order.status, note='accepted')
+        document = self.client.get(f'/api/orders/{order_id}/').data
+        self.assertEqual(document['status'], 'accepted')
+        self.assertEqual(document['vendor_name'], 'Deli')
+        self.assertEqual(document['items'], [
+            {'id': order.items.get().id, 'product': {'id': self.product.id, 'name': 'Bread'},
+             'quantity': 2, 'price': '3.00'},
+        ])
+        self.assertEqual([e['note'] for e in document['events']], ['accepted'])
+
+    def test_reads_are_one_lookup(self):
+        order_id = self.place(3)
+        self.client.get('/api/orders/')  # resolve the principal once
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/orders/{order_id}/')
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/orders/{order_id}/track/')
+        # the page of order ids, then their documents
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_other_customers_cannot_read(self):
+        order_id = self.place()
+        self.client.force_authenticate(User.objects.create(username='other'))
+        self.assertEqual(self.client.get(f'/api/orders/{order_id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/orders/{order_id}/track/').status_code, 404)
+
+
+class OrderFanoutTests(TestCase):
+    """Order details go to the order's parties only; watcher groups get the status"""
+
+    document = {
+        'id': 7, 'customer': {'id': 3, 'username': 'c'}, 'vendor': 4, 'vendor_name': 'Deli', 'rider': 5,
+        'status': 'accepted', 'subtotal_amount': '6.00', 'delivery_fee': '1.00', 'total_amount': '7.00',
+        'items': [], 'created_at': None, 'updated_at': None,
+    }
+
+    def frames(self, kind):
+        return {group: frame for groups, frame in build_frames(self.document, kind, {}, None) for group in groups}
+
+    def test_watchers_get_only_the_status(self):
+        for kind in (CREATED, UPDATED):
+            frames = self.frames(kind)
+            for group in ('orders', 'order_7'):
+                self.assertNotIn('order', frames.get(group, {}))
+        frames = self.frames(UPDATED)
+        self.assertEqual(frames['order_7']['payload'], {'kind': 'order_status', 'order_id': 7, 'status': 'accepted'})
+
+    def test_each_party_gets_one_frame(self):
+        frames = self.frames(UPDATED)
+        self.assertEqual(frames['vendor_4']['type'], 'order_updated')
+        self.assertEqual(frames['customer_3']['type'], 'order_status_changed')
+        self.assertEqual(frames['rider_5']['type'], 'order_status_changed')
+        sent = [group for groups, _ in build_frames(self.document, UPDATED, {}, None) for group in groups]
+        self.assertEqual(len(sent), len(set(sent)))
+
+
+class DispatchSolveTests(SimpleTestCase):
+    """A full dispatch round solves quickly and as well as one solve over every rider"""
+
+    def cost_rows(self, riders, spread_deg, orders=BATCH_ORDER_LIMIT):
+        rng = random.Random(7)
+        index = GridIndex()
+        for rider_id in range(riders):
+            index.upsert(rider_id, 2.0 + rng.random() * spread_deg, 45.3 + rng.random() * spread_deg)
+        return [
+            {rider_id: distance for distance, rider_id in index.nearest(
+                2.0 + rng.random() * spread_deg, 45.3 + rng.random() * spread_deg, k=BATCH_CANDIDATE_COUNT)}
+            for _ in range(orders)
+        ]
+
+    def total(self, rows, choices):
+        return round(sum(row[rider_id] for row, rider_id in zip(rows, choices) if rider_id is not None), 6)
+
+    def test_busy_round_is_fast(self):
+        # A city-wide evening peak, then a rush where every order competes for the same riders
+        for riders, spread_deg in ((5000, 0.5), (220, 0.05)):
+            rows = self.cost_rows(riders, spread_deg)
+            started = time.perf_counter()
+            choices = solve_assignment(rows)
+            self.assertLess(time.perf_counter() - started, 1.0)
+            matched = [rider_id for rider_id in choices if rider_id is not None]
+            self.assertEqual(len(matched), len(set(matched)))
+
+    def test_matches_single_solve(self):
+        rows = self.cost_rows(60, 0.05, orders=40)
+        columns = sorted({rider_id for row in rows for rider_id in row})
+        matrix = [[row.get(rider_id, UNASSIGNABLE) for rider_id in columns] for row in rows]
+        single = [
+            columns[j] if j is not None and matrix[i][j] < UNASSIGNABLE else None
+            for i, j in enumerate(min_cost_assignment(matrix))
+        ]
+        self.assertEqual(self.total(rows, solve_assignment(rows)), self.total(rows, single))
+
+
+class OrderCancelTests(TestCase):
+    """Every way of cancelling an order returns its reserved stock"""
+
+    def setUp(self):
+        principals.clear()
+        self.customer = User.objects.create(username='customer')
+        owner = User.objects.create(username='owner')
+        Account.objects.create(user=owner, role=Account.Role.VENDOR, phone_number='1')
+        self.vendor = Vendor.objects.create(owner=owner, name='Deli')
+        self.product = Product.objects.create(vendor=self.vendor, name='Bread', price=Decimal('3.00'), stock=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/', {
+            'vendor': self.vendor.id, 'items': [{'product': self.product.id, 'quantity': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.order_id = response.data['id']
+        self.client.force_authenticate(owner)
+
+    def tearDown(self):
+        outbox.reset()
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_patch_cancel_releases_stock(self):
+        self.assertEqual(self.stock(), 3)
+        response = self.client.patch(f'/api/orders/{self.order_id}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 5)
+        # Cancelling again must not return the stock twice
+        self.client.patch(f'/api/orders/{self.order_id}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(self.stock(), 5)
+
+    def test_set_status_cancel_releases_stock_once(self):
+        url = f'/api/orders/{self.order_id}/set-status/'
+        self.assertEqual(self.client.post(url, {'status': 'cancelled'}, format='json').status_code, 200)
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(self.client.post(url, {'status': 'cancelled'}, format='json').status_code, 200)
+        self.assertEqual(self.stock(), 5)
+
+    def test_stale_instance_does_not_release_twice(self):
+        # A second cancel that loaded the order before the first one committed
+        stale = Order.objects.get(pk=self.order_id)
+        self.client.post(f'/api/orders/{self.order_id}/set-status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(stale.status, Order.Status.PENDING)
+        with mock.patch('apps.orders.views.OrderViewSet.get_object', return_value=stale):
+            self.client.post(f'/api/orders/{self.order_id}/set-status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(self.stock(), 5)
+
+
+class CompactTracesTests(TestCase):
+    """Trace compaction simplifies each route on its own"""
+
+    databases = {'default', 'traces'}
+
+    def test_idle_pings_are_split_where_the_rider_went_quiet(self):
+        start = int(time.time()) - 30 * 86400
+        # Two straight runs two days apart; each keeps only its own end points
+        for offset, lon in [(0, 0), (60, 100), (120, 200), (2 * 86400, 5000), (2 * 86400 + 60, 5100)]:
+            LocationPing.objects.create(
+                rider_id=1, order_id=None, recorded_at=start + offset, latitude_e6=2040000, longitude_e6=45300000 + lon,
+            )
+        call_command('compact_location_traces', stdout=StringIO())
+        kept = list(LocationPing.objects.order_by('recorded_at').values_list('recorded_at', flat=True))
+        self.assertEqual(kept, [start, start + 120, start + 2 * 86400, start + 2 * 86400 + 60])
+        self.assertTrue(all(LocationPing.objects.values_list('compacted', flat=True)))
+
+
+class RiderPoolTests(TestCase):
+    """A rider's first ping makes them dispatchable without waiting for a flush"""
+
+    def setUp(self):
+        rider_pool.reset()
+        location_store.reset()
+        active_deliveries.reset()
+
+    def tearDown(self):
+        location_store.reset()
+        rider_pool.reset()
+
+    def test_first_ping_joins_the_pool(self):
+        rider = Rider.objects.create(user=User.objects.create(username='rider'), verified=True, is_online=True)
+        offline = Rider.objects.create(user=User.objects.create(username='offline'), verified=True)
+        self.assertEqual(rider_pool.nearest(2.04, 45.3), [])
+        location_store.record(rider.id, 2.04, 45.3)
+        location_store.record(offline.id, 2.04, 45.3)
+        self.assertEqual([rider_id for _, rider_id in rider_pool.nearest(2.04, 45.3)], [rider.id])
+
+
+class AnalyticsCacheTests(TestCase):
+    """Counters, cached snapshots and the coalesced dashboard push"""
+
+    def setUp(self):
+        analytics._cache().clear()
+        owner = User.objects.create(username='owner')
+        self.customer = User.objects.create(username='customer')
+        self.vendor = Vendor.objects.create(owner=owner, name='Deli')
+
+    def tearDown(self):
+        dashboard_publisher.reset()
+        outbox.reset()
+        analytics._cache().clear()
+
+    def order(self, **fields):
+        return Order.objects.create(customer=self.customer, vendor=self.vendor, **fields)
+
+    def test_counters_follow_transitions(self):
+        counters = StatusCounters()
+        self.order()
+        self.assertEqual(counters.status_counts()['pending'], 1)
+        self.assertEqual(counters.orders_today(), 1)
+        counters.transition(None, 'pending', created=True)
+        counters.transition('pending', 'accepted')
+        counters.transition(None, 'delivered')  # unknown previous status: ignored
+        counters.removed('pending')
+        counts = counters.status_counts()
+        self.assertEqual((counts['pending'], counts['accepted'], counts['delivered']), (0, 1, 0))
+        self.assertEqual((counters.orders_today(), counters.total_orders()), (2, 1))
+
+    def test_reconcile_keeps_transitions_made_while_reading(self):
+        counters = StatusCounters()
+        order = self.order()
+        counters.reconcile()
+        read_status_counts = analytics.day_start
+
+        def commit_during_read(day):
+            # Another request commits an order after the status counts were read
+            Order.objects.filter(pk=order.pk).update(status=Order.Status.ACCEPTED)
+            counters.transition('pending', 'accepted')
+            self.order()
+            counters.transition(None, 'pending', created=True)
+            return read_status_counts(day)
+
+        with mock.patch.object(analytics, 'day_start', commit_during_read):
+            counters.reconcile()
+        counts = counters.status_counts()
+        self.assertEqual((counts['pending'], counts['accepted']), (1, 1))
+        self.assertEqual(counters.orders_today(), 3)  # the read itself saw the new order too
+
+    def test_cached_until_invalidated(self):
+        compute = mock.Mock(side_effect=[{'n': 1}, {'n': 2}])
+        self.assertEqual(analytics.cached('probe', compute), {'n': 1})
+        self.assertEqual(analytics.cached('probe', compute), {'n': 1})
+        analytics.invalidate()
+        self.assertEqual(analytics.cached('probe', compute), {'n': 2})
+        self.assertEqual(compute.call_count, 2)
+        # Invalidating works with no generation stored yet
+        analytics._cache().clear()
+        analytics.invalidate()
+        self.assertEqual(analytics._cache().get(analytics.GENERATION_KEY), 1)
+
+    def test_summary_snapshot_shared_until_invalidated(self):
+        first = analytics.summary_snapshot()
+        self.order()  # its on-commit invalidation does not run inside the test transaction
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics.summary_snapshot(), first)
+        analytics.invalidate()
+        self.assertEqual(analytics.summary_snapshot()['total_stats']['total_orders'],
+                         first['total_stats']['total_orders'] + 1)
+
+    def test_publisher_coalesces_changes(self):
+        publisher = DashboardPublisher(window=60)
+        with mock.patch('apps.orders.dashboard.get_channel_layer') as layer:
+            layer.return_value.group_send = mock.AsyncMock()
+            send = layer.return_value.group_send
+            with mock.patch.object(analytics, 'invalidate') as invalidate:
+                with self.captureOnCommitCallbacks(execute=True):
+                    publisher.mark_changed(2)
+                    publisher.mark_changed(1)
+                    publisher.mark_changed()
+                    self.assertIsNone(publisher._timer)  # nothing before commit
+                self.assertEqual(invalidate.call_count, 3)
+            timer = publisher._timer
+            self.assertTrue(timer.is_alive())
+
+            self.assertTrue(publisher.flush())
+            self.assertIsNone(publisher._timer)
+            timer.join(1)
+            self.assertFalse(timer.is_alive())
+            send.assert_called_once()
+            group, message = send.call_args.args
+            self.assertEqual((group, message['type'], message['data']['updated_orders']),
+                             (DASHBOARD_GROUP, 'analytics_update', [1, 2]))
+
+            # An unchanged snapshot is not pushed again
+            self.assertFalse(publisher.flush())
+            self.assertEqual(send.call_count, 1)
+            self.order()
+            analytics.invalidate()
+            self.assertTrue(publisher.flush())
+            self.assertEqual(send.call_args.args[1]['data']['updated_orders'], [])
+
+            publisher.reset()
+            self.assertIsNone(publisher._last)
+            self.assertTrue(publisher.flush())
+            self.assertEqual(send.call_count, 3)
@@ -1,15 +1,25 @@
 from django.shortcuts import render
+from django.http import Http404
 from rest_framework import viewsets, permissions, decorators, response, status
 from django.db import transaction
-from .models import Order, OrderItem, OrderEvent
-from .serializers import OrderSerializer
+from .models import Order, OrderEvent, LocationPing, DeliveryBatch
+from .serializers import OrderSerializer, AvailableDeliverySerializer, DeliveryBatchSerializer
+from .dispatch import select_rider
+from .feeds import available_orders_near
+from .locations import location_store
+from .eta import eta_minutes
+from .geo import haversine_km
+from .analytics import summary_snapshot, detailed_snapshot
+from .outbox import ASSIGNED, DELIVERY_REJECTED, enqueue
+from .placement import PlacementError, place_order, release_stock
+from .prefetch import for_serializer
+from .snapshots import snapshots
+from apps.accounts.idempotency import idempotent
+from core.pagination import KeysetPagination
+from core.serializers import trim_fields
 from apps.accounts.permissions import IsVendor, IsRider, IsAdmin, IsVendorOrRiderOrAdmin
-from apps.catalog.models import Product
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from apps.accounts.models import Rider, Wallet, WalletTransaction
 from django.utils import timezone
-from django.db.models import Sum, Count, Avg
 from datetime import timedelta
 import json
 
@@ -25,33 +35,29 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
 
     def get_permissions(self):
         # Only riders can access these endpoints
-        if not hasattr(self.request.user, 'account') or self.request.user.account.role != 'rider':
-            from rest_framework.permissions import IsAuthenticated
-            return [IsAuthenticated()]
+        if self.request.principal.role != 'rider':
+            return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
 
     def list(self, request):
         """Get available delivery requests for the rider"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Get orders that are accepted by vendor but not yet assigned to a rider
-        available_orders = Order.objects.filter(
-            status=Order.Status.ACCEPTED,
-            rider__isnull=True
-        ).select_related('vendor', 'customer').prefetch_related('items')[:10]  # Limit to 10
+        # Accepted orders without a rider, nearest to the rider's last known position
+        fix = location_store.get(rider_id) or location_store.position(Rider.objects.get(pk=rider_id))
+        lat, lon = (fix[0], fix[1]) if fix else (None, None)
+        available_orders = available_orders_near(lat, lon)
 
-        serializer = OrderSerializer(available_orders, many=True, context={'request': request})
+        serializer = AvailableDeliverySerializer(available_orders, many=True)
         return response.Response(serializer.data)
 
     @decorators.action(detail=True, methods=['post'])
     def accept(self, request, pk=None):
         """Accept a delivery request"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
@@ -59,23 +65,14 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
         except Order.DoesNotExist:
             return response.Response({"detail": "Order not available for delivery"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Assign order to rider
-        order.rider = rider
-        order.status = Order.Status.ASSIGNED
-        order.save(update_fields=['rider', 'status', 'updated_at'])
-
-        # Log event
-        OrderEvent.objects.create(order=order, status=order.status, note="Order assigned to rider")
+        # Assign order to rider; the outbox row written by post_save commits with it
+        with transaction.atomic():
+            order.rider_id = rider_id
+            order.status = Order.Status.ASSIGNED
+            order.save(update_fields=['rider', 'status', 'updated_at'])
 
-        # Broadcast update
-        channel_layer = get_channel_layer()
-        payload = {"kind": "order_status", "order_id": order.id, "status": order.status}
-
-        groups = ["orders", f"order_{order.id}", "admin_dashboard"]
-        for group in groups:
-            async_to_sync(channel_layer.group_send)(
-                group, {"type": "broadcast", "payload": payload}
-            )
+            # Log event
+            OrderEvent.objects.create(order=order, status=order.status, note="Order assigned to rider")
 
         serializer = OrderSerializer(order, context={'request': request})
         return response.Response(serializer.data)
@@ -83,9 +80,8 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
     @decorators.action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
         """Reject a delivery request"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
@@ -93,33 +89,24 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
         except Order.DoesNotExist:
             return response.Response({"detail": "Order not available for delivery"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Log rejection event
-        OrderEvent.objects.create(order=order, status=order.status, note=f"Delivery rejected by rider {rider.user.username}")
-
-        # Broadcast update to remove from available deliveries for other riders
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "orders",
-            {
-                "type": "delivery_rejected",
-                "order_id": order.id,
-                "rider_id": rider.id,
-                "message": "Delivery request rejected by rider"
-            }
-        )
+        with transaction.atomic():
+            # Log rejection event
+            OrderEvent.objects.create(order=order, status=order.status, note=f"Delivery rejected by rider {request.user.username}")
+
+            # Notify other riders to remove it from available deliveries
+            enqueue(order.id, DELIVERY_REJECTED, rider_id=rider_id)
 
         return response.Response({"detail": "Delivery request rejected"})
 
     @decorators.action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         """Update delivery status (assigned → on_way → delivered)"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            order = Order.objects.get(pk=pk, rider=rider)
+            order = Order.objects.get(pk=pk, rider_id=rider_id)
         except Order.DoesNotExist:
             return response.Response({"detail": "Order not assigned to this rider"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -127,58 +114,45 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
         if new_status not in ['on_way', 'delivered']:
             return response.Response({"detail": "Invalid status for rider update"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Update order status
-        order.status = new_status
-        if new_status == 'delivered':
-            # Process rider earnings when delivery is completed
-            rider_earning = float(order.total_amount) * 0.15  # 15% commission for rider
+        with transaction.atomic():
+            # Update order status
+            order.status = new_status
+            if new_status == 'delivered':
+                # Process rider earnings when delivery is completed
+                rider_earning = float(order.total_amount) * 0.15  # 15% commission for rider
 
-            # Get or create rider's wallet
-            try:
-                wallet = rider.wallet
-            except Wallet.DoesNotExist:
-                wallet = Wallet.objects.create(rider=rider, balance=0)
-
-            # Add earnings to wallet
-            wallet.balance += rider_earning
-            wallet.save(update_fields=['balance'])
-
-            # Create transaction record
-            WalletTransaction.objects.create(
-                wallet=wallet,
-                amount=rider_earning,
-                transaction_type=Wallet.TransactionType.EARNING,
-                description=f"Delivery earnings for order #{order.id}",
-                order=order
-            )
+                # Get or create rider's wallet
+                wallet, _ = Wallet.objects.get_or_create(rider_id=rider_id, defaults={'balance': 0})
 
-        order.save(update_fields=['status', 'updated_at'])
+                # Add earnings to wallet
+                wallet.balance += rider_earning
+                wallet.save(update_fields=['balance'])
 
-        # Log event
-        OrderEvent.objects.create(order=order, status=new_status, note="Status updated by rider")
+                # Create transaction record
+                WalletTransaction.objects.create(
+                    wallet=wallet,
+                    amount=rider_earning,
+                    transaction_type=Wallet.TransactionType.EARNING,
+                    description=f"Delivery earnings for order #{order.id}",
+                    order=order
+                )
 
-        # Broadcast update
-        channel_layer = get_channel_layer()
-        payload = {"kind": "order_status", "order_id": order.id, "status": new_status}
+            order.save(update_fields=['status', 'updated_at'])
 
-        groups = ["orders", f"order_{order.id}", "admin_dashboard"]
-        for group in groups:
-            async_to_sync(channel_layer.group_send)(
-                group, {"type": "broadcast", "payload": payload}
-            )
+            # Log event
+            OrderEvent.objects.create(order=order, status=new_status, note="Status updated by rider")
 
         serializer = OrderSerializer(order, context={'request': request})
         return response.Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """Get details of an assigned delivery"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            order = Order.objects.get(pk=pk, rider=rider)
+            order = Order.objects.get(pk=pk, rider_id=rider_id)
         except Order.DoesNotExist:
             return response.Response({"detail": "Order not assigned to this rider"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -188,9 +162,8 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
     @decorators.action(detail=False, methods=['post'])
     def update_location(self, request):
         """Update rider's current location"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
         latitude = request.data.get('latitude')
@@ -200,31 +173,51 @@ class RiderDeliveryViewSet(viewsets.ViewSet):
             return response.Response({"detail": "Latitude and longitude are required"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            rider.update_location(float(latitude), float(longitude))
-            return response.Response({"detail": "Location updated successfully"})
+            latitude = float(latitude)
+            longitude = float(longitude)
         except (ValueError, TypeError):
             return response.Response({"detail": "Invalid latitude or longitude values"}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return response.Response({"detail": "Invalid latitude or longitude values"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Buffered in memory and written to the Rider row in periodic bulk flushes
+        location_store.record(rider_id, latitude, longitude)
+        return response.Response({"detail": "Location updated successfully"})
 
     @decorators.action(detail=False, methods=['get'])
     def my_deliveries(self, request):
         """Get rider's assigned deliveries"""
-        try:
-            rider = Rider.objects.get(user=request.user)
-        except Rider.DoesNotExist:
+        rider_id = request.principal.rider_id
+        if rider_id is None:
             return response.Response({"detail": "Rider profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Get orders assigned to this rider
+        # Get orders assigned to this rider, a page at a time
         my_orders = Order.objects.filter(
-            rider=rider
-        ).select_related('vendor', 'customer').prefetch_related('items').order_by('-created_at')
-
-        serializer = OrderSerializer(my_orders, many=True, context={'request': request})
-        return response.Response(serializer.data)
+            rider_id=rider_id
+        ).select_related('vendor', 'batch')
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(for_serializer(my_orders, request), request, view=self)
+
+        serializer = OrderSerializer(page, many=True, context={'request': request})
+        data = serializer.data
+
+        # Orders carried in an active multi-stop trip share its stop sequence
+        batches = {}
+        for order, row in zip(page, data):
+            batch = order.batch
+            if batch is None or batch.status != DeliveryBatch.Status.ACTIVE:
+                row["batch"] = None
+                continue
+            if batch.id not in batches:
+                batches[batch.id] = DeliveryBatchSerializer(batch).data
+            row["batch"] = batches[batch.id]
+        return paginator.get_paginated_response(data)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().select_related("vendor", "rider", "customer").prefetch_related("items")
+    queryset = Order.objects.all().select_related("vendor", "rider", "customer")
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -242,16 +235,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         user = getattr(self.request, "user", None)
         if not user or not user.is_authenticated:
             return qs.none()
-        # Admins see all
-        try:
-            role = getattr(user, 'account', None) and user.account.role
-        except Exception:
-            role = None
+        principal = self.request.principal
+        role = principal.role
         # Base scoping by role
         if role == 'vendor':
-            qs = qs.filter(vendor__owner=user)
+            qs = qs.filter(vendor_id=principal.vendor_id) if principal.vendor_id else qs.none()
         elif role == 'rider':
-            qs = qs.filter(rider__user=user)
+            qs = qs.filter(rider_id=principal.rider_id) if principal.rider_id else qs.none()
         elif role == 'admin' or user.is_superuser:
             qs = qs
         else:
@@ -268,12 +258,68 @@ class OrderViewSet(viewsets.ModelViewSet):
             qs = qs.filter(created_at__date__gte=from_date)
         if to_date:
             qs = qs.filter(created_at__date__lte=to_date)
+        if self.action in ("list", "retrieve") and not self.reads_snapshots():
+            qs = for_serializer(qs, self.request)
         return qs
 
+    def reads_snapshots(self):
+        """List and retrieve answer from order snapshots unless ``expand`` asks for the nesting serializer"""
+        return "expand" not in self.request.query_params
+
+    def can_view(self, document):
+        """The role scoping of get_queryset, applied to a snapshot document"""
+        user = self.request.user
+        principal = self.request.principal
+        if principal.role == 'vendor':
+            return principal.vendor_id is not None and document["vendor"] == principal.vendor_id
+        if principal.role == 'rider':
+            return principal.rider_id is not None and document["rider"] == principal.rider_id
+        if principal.role == 'admin' or user.is_superuser:
+            return True
+        return document["customer"]["id"] == user.pk
+
+    def get_snapshot(self):
+        """The requested order's snapshot document from one primary-key lookup"""
+        try:
+            document = snapshots.get(int(self.kwargs["pk"]))
+        except ValueError:
+            document = None
+        if document is None or not self.can_view(document):
+            raise Http404
+        return document
+
+    def list(self, request, *args, **kwargs):
+        if not self.reads_snapshots():
+            return super().list(request, *args, **kwargs)
+        # Page through the order index, then read the page's documents in one query
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).only("id", "created_at")
+        page = self.paginate_queryset(queryset)
+        documents = snapshots.documents([order.id for order in page])
+        return self.get_paginated_response([
+            trim_fields(documents[order.id], request) for order in page if order.id in documents
+        ])
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.reads_snapshots():
+            return super().retrieve(request, *args, **kwargs)
+        return response.Response(trim_fields(self.get_snapshot(), request))
+
+    def perform_update(self, serializer):
+        # A plain update may cancel the order too; return its stock as set-status does
+        with transaction.atomic():
+            old_status = Order.objects.select_for_update().values_list("status", flat=True).get(
+                pk=serializer.instance.pk
+            )
+            order = serializer.save()
+            if order.status == Order.Status.CANCELLED and old_status not in (Order.Status.CANCELLED, Order.Status.DELIVERED):
+                release_stock([order.id])
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         """Create an order with items and compute totals.
         Expected payload:
-        { vendor: vendor_id, items: [{product: id, quantity: n}], delivery_fee? }
+        { vendor: vendor_id, items: [{product: id, quantity: n}], delivery_fee?,
+          delivery_address?, delivery_latitude?, delivery_longitude? }
         """
         data = request.data
         try:
@@ -283,73 +329,84 @@ class OrderViewSet(viewsets.ModelViewSet):
             return response.Response({"detail": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST)
         if not items:
             return response.Response({"detail": "Items required"}, status=status.HTTP_400_BAD_REQUEST)
-        delivery_fee = data.get("delivery_fee") or 0
-        try:
-            delivery_fee = float(delivery_fee)
-        except Exception:
-            delivery_fee = 0
+        delivery_latitude = data.get("delivery_latitude")
+        delivery_longitude = data.get("delivery_longitude")
+        if delivery_latitude is not None and delivery_longitude is not None:
+            try:
+                delivery_latitude = round(float(delivery_latitude), 6)
+                delivery_longitude = round(float(delivery_longitude), 6)
+            except (ValueError, TypeError):
+                return response.Response({"detail": "Invalid delivery location"}, status=status.HTTP_400_BAD_REQUEST)
+            if not (-90 <= delivery_latitude <= 90 and -180 <= delivery_longitude <= 180):
+                return response.Response({"detail": "Invalid delivery location"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            delivery_latitude = delivery_longitude = None
 
-        with transaction.atomic():
-            order = Order.objects.create(
-                customer=request.user,
-                vendor_id=vendor_id,
-                status=Order.Status.PENDING,
-                subtotal_amount=0,
-                delivery_fee=delivery_fee,
-                total_amount=0,
+        try:
+            order = place_order(
+                request.user,
+                vendor_id,
+                items,
+                delivery_fee=data.get("delivery_fee"),
+                delivery_address=str(data.get("delivery_address") or "")[:255],
+                delivery_latitude=delivery_latitude,
+                delivery_longitude=delivery_longitude,
             )
-            subtotal = 0
-            for item in items:
-                product_id = int(item.get("product"))
-                quantity = int(item.get("quantity", 1))
-                if quantity <= 0:
-                    transaction.set_rollback(True)
-                    return response.Response({"detail": "Quantity must be positive"}, status=status.HTTP_400_BAD_REQUEST)
-                product = Product.objects.select_for_update().get(id=product_id)
-                price = product.price
-                OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price)
-                subtotal += float(price) * quantity
-            order.subtotal_amount = subtotal
-            order.total_amount = subtotal + float(delivery_fee)
-            order.save(update_fields=["subtotal_amount", "total_amount", "updated_at"])
-        # Broadcast order creation
-        channel_layer = get_channel_layer()
-        order_data = OrderSerializer(order).data
-
-        # Broadcast to vendor
-        async_to_sync(channel_layer.group_send)(
-            f"vendor_{order.vendor.id}",
-            {
-                "type": "order_created",
-                "order": order_data
-            }
-        )
-
-        # Broadcast to customer
-        async_to_sync(channel_layer.group_send)(
-            f"customer_{order.customer.id}",
-            {
-                "type": "order_created",
-                "order": order_data
-            }
-        )
-
-        # Broadcast to admin dashboard
-        async_to_sync(channel_layer.group_send)(
-            "admin_dashboard",
-            {
-                "type": "analytics_update",
-                "data": {
-                    "orders_today": Order.objects.filter(created_at__date=timezone.now().date()).count(),
-                    "total_orders": Order.objects.count()
-                }
-            }
-        )
+        except PlacementError as e:
+            return response.Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Reload with the item products so serializing the cart stays a fixed number of queries
+        order = for_serializer(self.queryset).get(pk=order.pk)
+        # Vendor, customer and admin dashboard are notified from Order post_save (outbox)
 
         serializer = OrderSerializer(order)
         headers = self.get_success_headers(serializer.data)
         return response.Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @decorators.action(detail=True, methods=["get"])
+    def track(self, request, pk=None):
+        """Lightweight tracking view: status plus the rider's latest in-memory position"""
+        document = self.get_snapshot()
+        rider_id, order_status = document["rider"], document["status"]
+        rider_location = None
+        pickup_eta_minutes = None
+        if rider_id and order_status in (Order.Status.ASSIGNED, Order.Status.ON_WAY):
+            fix = location_store.get(rider_id)
+            if fix is None:
+                # Nothing in memory yet; fall back to the position stored on the rider
+                rider = Rider.objects.filter(pk=rider_id).first()
+                fix = location_store.position(rider) if rider else None
+            if fix:
+                rider_location = {
+                    "latitude": fix[0],
+                    "longitude": fix[1],
+                    "updated_at": fix[2],
+                }
+                vendor = document["vendor_location"]
+                if order_status == Order.Status.ASSIGNED and vendor is not None:
+                    distance = haversine_km(fix[0], fix[1], vendor["latitude"], vendor["longitude"])
+                    pickup_eta_minutes = eta_minutes(fix[0], fix[1], distance)
+        return response.Response({
+            "id": document["id"],
+            "status": order_status,
+            "rider_id": rider_id,
+            "rider_location": rider_location,
+            "pickup_eta_minutes": pickup_eta_minutes,
+            "updated_at": document["updated_at"],
+        })
+
+    @decorators.action(detail=True, methods=["get"])
+    def route(self, request, pk=None):
+        """Replay the rider's recorded trace for this order as [epoch, lat, lon] points"""
+        order = self.get_object()
+        points = LocationPing.objects.filter(order_id=order.id).order_by('recorded_at', 'id').values_list(
+            'recorded_at', 'latitude_e6', 'longitude_e6'
+        )
+        return response.Response({
+            "order_id": order.id,
+            "rider_id": order.rider_id,
+            "points": [[t, lat / 1e6, lon / 1e6] for t, lat, lon in points],
+        })
+
     @decorators.action(detail=True, methods=["post"], url_path="set-status")
     def set_status(self, request, pk=None):
         order = self.get_object()
@@ -357,55 +414,43 @@ class OrderViewSet(viewsets.ModelViewSet):
         if new_status not in dict(Order.Status.choices):
             return response.Response({"detail": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
 
-        old_status = order.status
-        order.status = new_status
-
-        # If vendor is accepting an order, try to assign it to an available rider
-        if new_status == Order.Status.ACCEPTED and old_status == Order.Status.PENDING:
-            # Try to assign to an available rider
-            # First, get verified and online riders
-            available_riders = Rider.objects.filter(
-                verified=True,
-                is_online=True
-            ).select_related('user').order_by('-last_location_update')[:10]  # Get 10 most recently active riders
-
-            if available_riders.exists():
-                # For now, assign to the most recently active rider
-                # TODO: Implement location-based assignment for better optimization
-                assigned_rider = available_riders.first()
-                order.rider = assigned_rider
-                order.status = Order.Status.ASSIGNED  # Auto-assign to rider
-
-                # Create wallet for rider if it doesn't exist
-                try:
-                    wallet = assigned_rider.wallet
-                except Wallet.DoesNotExist:
-                    wallet = Wallet.objects.create(rider=assigned_rider, balance=0)
-
-                # Log assignment event
-                OrderEvent.objects.create(
-                    order=order,
-                    status=order.status,
-                    note=f"Order auto-assigned to rider {assigned_rider.user.username}"
-                )
-
-                # Broadcast assignment to rider
-                channel_layer = get_channel_layer()
-                rider_payload = {
-                    "type": "order_created",  # Rider gets full order data
-                    "order": OrderSerializer(order).data
-                }
-
-                # Send to rider's personal channel
-                async_to_sync(channel_layer.group_send)(
-                    f"rider_{assigned_rider.id}",
-                    rider_payload
-                )
-
-        order.save(update_fields=["status", "rider", "updated_at"])
-
-        # Log status change
-        OrderEvent.objects.create(order=order, status=new_status, note="Status updated")
+        # Status change, events and outbox rows commit together
+        with transaction.atomic():
+            # Read the status under a row lock so concurrent cancels release the stock once
+            old_status = Order.objects.select_for_update().values_list("status", flat=True).get(pk=order.pk)
+            order.status = new_status
+            if new_status == Order.Status.CANCELLED and old_status not in (Order.Status.CANCELLED, Order.Status.DELIVERED):
+                release_stock([order.id])
+
+            # If vendor is accepting an order, try to assign it to an available rider
+            if new_status == Order.Status.ACCEPTED and old_status == Order.Status.PENDING:
+                # Pick the nearest fresh, lightly loaded rider around the vendor
+                assigned_rider = select_rider(order.vendor)
+
+                if assigned_rider:
+                    order.rider = assigned_rider
+                    order.status = Order.Status.ASSIGNED  # Auto-assign to rider
+
+                    # Create wallet for rider if it doesn't exist
+                    try:
+                        wallet = assigned_rider.wallet
+                    except Wallet.DoesNotExist:
+                        wallet = Wallet.objects.create(rider=assigned_rider, balance=0)
+
+                    # Log assignment event
+                    OrderEvent.objects.create(
+                        order=order,
+                        status=order.status,
+                        note=f"Order auto-assigned to rider {assigned_rider.user.username}"
+                    )
+
+                    # Rider gets full order data on their personal channel
+                    enqueue(order.id, ASSIGNED, rider_id=assigned_rider.id)
+
+            order.save(update_fields=["status", "rider", "updated_at"])
+
+            # Log status change
+            OrderEvent.objects.create(order=order, status=new_status, note="Status updated")
 
         # Create wallet transaction if order is delivered and has a rider
         if new_status == 'delivered' and order.rider:
@@ -435,53 +480,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             except Exception as e:
                 print(f"Error creating wallet transaction: {e}")
 
-        # Broadcast status update
-        channel_layer = get_channel_layer()
-        order_data = OrderSerializer(order).data
-
-        # Broadcast to customer
-        async_to_sync(channel_layer.group_send)(
-            f"customer_{order.customer.id}",
-            {
-                "type": "order_status_changed",
-                "order_id": order.id,
-                "status": order.status
-            }
-        )
-
-        # Broadcast to vendor
-        async_to_sync(channel_layer.group_send)(
-            f"vendor_{order.vendor.id}",
-            {
-                "type": "order_updated",
-                "order": order_data
-            }
-        )
-
-        # Broadcast to rider if assigned
-        if order.rider:
-            async_to_sync(channel_layer.group_send)(
-                f"rider_{order.rider.id}",
-                {
-                    "type": "order_status_changed",
-                    "order_id": order.id,
-                    "status": order.status
-                }
-            )
-
-        # Broadcast to admin dashboard
-        async_to_sync(channel_layer.group_send)(
-            "admin_dashboard",
-            {
-                "type": "analytics_update",
-                "data": {
-                    "status_counts": {
-                        status: Order.objects.filter(status=status).count()
-                        for status, _ in Order.Status.choices
-                    }
-                }
-            }
-        )
+        # Customer, vendor, rider and admin dashboard are notified from Order post_save (outbox)
 
         return response.Response(OrderSerializer(order).data)
 
@@ -491,74 +490,8 @@ class OrderViewSet(viewsets.ModelViewSet):
 @decorators.permission_classes([IsAdmin])
 def admin_analytics_summary(request):
     """Get admin analytics summary data"""
-    today = timezone.now().date()
-
     try:
-        # Today's orders and revenue
-        orders_today = Order.objects.filter(created_at__date=today)
-        orders_today_count = orders_today.count()
-        gmv_today = orders_today.aggregate(total=Sum('total_amount'))['total'] or 0
-
-        # Orders by status
-        status_counts = {}
-        for status, _ in Order.Status.choices:
-            status_counts[status] = Order.objects.filter(status=status).count()
-
-        # Last 7 days data
-        last_7_days = []
-        for i in range(6, -1, -1):
-            date = today - timedelta(days=i)
-            count = Order.objects.filter(created_at__date=date).count()
-            last_7_days.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'count': count
-            })
-
-        # Recent activity (last 20 events)
-        recent_events = []
-        order_events = OrderEvent.objects.select_related('order').order_by('-created_at')[:20]
-        for event in order_events:
-            recent_events.append({
-                'type': 'order',
-                'id': event.order.id,
-                'timestamp': event.created_at.isoformat(),
-                'description': f'Order #{event.order.id} {event.status}',
-                'status': event.status
-            })
-
-        # Payment events (last 10)
-        from apps.payments.models import Payment
-        payment_events = Payment.objects.select_related('order').order_by('-created_at')[:10]
-        for payment in payment_events:
-            recent_events.append({
-                'type': 'payment',
-                'id': payment.id,
-                'timestamp': payment.created_at.isoformat(),
-                'description': f'Payment {payment.provider} - {payment.status}',
-                'amount': float(payment.amount),
-                'status': payment.status
-            })
-
-        # Sort by timestamp
-        recent_events.sort(key=lambda x: x['timestamp'], reverse=True)
-
-        # Overall statistics
-        total_stats = {
-            'total_orders': Order.objects.count(),
-            'total_revenue': float(Order.objects.aggregate(total=Sum('total_amount'))['total'] or 0),
-            'total_users': len(set(Order.objects.values_list('customer', flat=True))),
-            'active_vendors': len(set(Order.objects.values_list('vendor', flat=True))),
-            'active_riders': Rider.objects.filter(verified=True).count()
-        }
-
-        return response.Response({
-            'orders_today': orders_today_count,
-            'gmv_today': float(gmv_today),
-            'status_counts': status_counts,
-            'last_7_days': last_7_days,
-            'recent_activity': recent_events[:10],
-            'total_stats': total_stats
-        })
+        return response.Response(summary_snapshot())
 
     except Exception as e:
         return response.Response(
@@ -572,78 +505,10 @@ def admin_analytics_summary(request):
 def admin_analytics_detailed(request):
     """Get detailed analytics for specific date range"""
     date_range = request.GET.get('range', 'today')
-    today = timezone.now().date()
 
     try:
-        # Determine date range
-        if date_range == 'today':
-            start_date = today
-            end_date = today
-        elif date_range == 'yesterday':
-            yesterday = today - timedelta(days=1)
-            start_date = yesterday
-            end_date = yesterday
-        elif date_range == 'last_7_days':
-            start_date = today - timedelta(days=6)
-            end_date = today
-        elif date_range == 'last_30_days':
-            start_date = today - timedelta(days=29)
-            end_date = today
-        else:
-            start_date = today
-            end_date = today
-
-        # Get orders in date range
-        orders = Order.objects.filter(created_at__date__gte=start_date, created_at__date__lte=end_date)
-
-        # Revenue by day
-        revenue_by_day = []
-        current_date = start_date
-        while current_date <= end_date:
-            day_orders = orders.filter(created_at__date=current_date)
-            day_revenue = day_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-            day_count = day_orders.count()
-
-            revenue_by_day.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'revenue': float(day_revenue),
-                'orders': day_count
-            })
-            current_date += timedelta(days=1)
-
-        # Top vendors by revenue
-        top_vendors = orders.values('vendor__name').annotate(
-            revenue=Sum('total_amount'),
-            order_count=Count('id')
-        ).order_by('-revenue')[:10]
-
-        # Payment method breakdown
-        from apps.payments.models import Payment
-        payment_methods = Payment.objects.filter(
-            order__created_at__date__gte=start_date,
-            order__created_at__date__lte=end_date
-        ).values('provider').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
-        ).order_by('-total_amount')
-
-        # Vendor performance
-        vendor_performance = orders.values('vendor__name').annotate(
-            total_orders=Count('id'),
-            total_revenue=Sum('total_amount'),
-            avg_order_value=Avg('total_amount')
-        ).order_by('-total_revenue')[:10]
-
-        return response.Response({
-            'date_range': date_range,
-            'revenue_by_day': revenue_by_day,
-            'top_vendors': list(top_vendors),
-            'payment_methods': list(payment_methods),
-            'vendor_performance': list(vendor_performance),
-            'total_orders': orders.count(),
-            'total_revenue': float(orders.aggregate(total=Sum('total_amount'))['total'] or 0),
-            'average_order_value': float(orders.aggregate(avg=Avg('total_amount'))['avg'] or 0)
-        })
+        # Served from the shared snapshot cache, computed from the daily rollups
+        return response.Response(dict(detailed_snapshot(date_range), date_range=date_range))
 
     except Exception as e:
         return response.Response(
@@ -16,7 +16,6 @@ from django.urls import path
 
 # Import routing modules
 from apps.orders import routing as orders_routing
-from apps.core import routing as core_routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
@@ -26,7 +25,7 @@ application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
-            orders_routing.websocket_urlpatterns + core_routing.websocket_urlpatterns
+            orders_routing.websocket_urlpatterns
         )
     ),
 })
@@ -0,0 +1,422 @@
+"""
+Channel layer that shares groups between ASGI worker processes.
+
+Each ``manage.py run_channel_broker`` process is one shard. Every worker
+connects to all shards; a group lives on the shard its name hashes to, and
+a direct channel is reached through the shard its owning process hashes to.
+
+Workers subscribe to a group on its shard once, however many local
+consumers joined it. A group_send therefore crosses the socket once per
+interested process, and the broker relays the received line as-is. Outgoing
+frames are written in batches. Callers wait up to ``send_timeout`` when a
+worker's send buffer is full and then get ChannelFull; while a shard is
+disconnected a full buffer fails at once. The broker drops frames for a
+peer that stops reading, so one slow worker cannot stall the rest.
+
+Frames are newline-delimited JSON over TCP (``tcp://host:port``) or a
+Unix socket (``unix:///path``).
+"""
+import asyncio
+import collections
+import json
+import logging
+import random
+import string
+import threading
+import zlib
+from urllib.parse import urlparse
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = "tcp://127.0.0.1:8765"
+LINE_LIMIT = 2 ** 24          # largest frame accepted, in bytes
+WRITE_BATCH = 256             # frames coalesced into one socket write
+RECONNECT_SECONDS = 1.0
+
+
+def shard_index(name, count):
+    return zlib.crc32(name.encode()) % count
+
+
+def _frame(**fields):
+    return (json.dumps(fields, separators=(',', ':')) + "\n").encode()
+
+
+async def _connect(address):
+    url = urlparse(address)
+    if url.scheme == "unix":
+        return await asyncio.open_unix_connection(url.path, limit=LINE_LIMIT)
+    return await asyncio.open_connection(url.hostname, url.port, limit=LINE_LIMIT)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _Inbox:
+    """Pending messages of one local channel; filled from the I/O thread, read from any event loop"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.messages = collections.deque()
+        self.waiter = None
+        self.lock = threading.Lock()
+
+    def put(self, message):
+        with self.lock:
+            if len(self.messages) >= self.capacity:
+                return False
+            self.messages.append(message)
+            waiter, self.waiter = self.waiter, None
+        if waiter is not None:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+        return True
+
+    async def get(self):
+        while True:
+            with self.lock:
+                if self.messages:
+                    return self.messages.popleft()
+                waiter = self.waiter = asyncio.get_running_loop().create_future()
+            await waiter
+
+
+class _Shard:
+    """Connection from this process to one broker shard, living on the layer's I/O loop"""
+
+    def __init__(self, layer, address):
+        self.layer = layer
+        self.address = address
+        self.outgoing = collections.deque()
+        self.lock = threading.Lock()
+        self.ready = asyncio.Event()   # frames waiting to be written
+        self.room = asyncio.Event()    # the writer freed buffer space
+        self.connected = False
+
+    def offer(self, frame):
+        """Queue ``frame`` from any thread; False when the buffer is full"""
+        with self.lock:
+            if len(self.outgoing) >= self.layer.max_buffer:
+                return False
+            self.outgoing.append(frame)
+            wake = len(self.outgoing) == 1
+        if wake:
+            self.layer._loop.call_soon_threadsafe(self.ready.set)
+        return True
+
+    async def put(self, frame):
+        """Queue ``frame`` once there is room; runs on the I/O loop"""
+        while not self.offer(frame):
+            self.room.clear()
+            await self.room.wait()
+
+    async def run(self):
+        while True:
+            try:
+                reader, writer = await _connect(self.address)
+            except OSError as exc:
+                logger.warning("Channel broker %s unavailable: %s", self.address, exc)
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            # Re-register after every (re)connect; the broker forgets peers that disconnect
+            writer.write(self.layer.handshake(self))
+            writing = asyncio.ensure_future(self.write(writer))
+            self.connected = True
+            try:
+                while line := await reader.readline():
+                    self.layer.dispatch(json.loads(line))
+            except (OSError, ValueError) as exc:
+                logger.warning("Channel broker %s connection lost: %s", self.address, exc)
+            finally:
+                self.connected = False
+                writing.cancel()
+                writer.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def write(self, writer):
+        while True:
+            with self.lock:
+                batch = [self.outgoing.popleft() for _ in range(min(WRITE_BATCH, len(self.outgoing)))]
+            if not batch:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            self.room.set()
+            writer.write(b"".join(batch))
+            await writer.drain()
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """
+    Channel layer for several worker processes on one box, relayed by
+    run_channel_broker shards.
+
+    ``shards`` lists broker addresses; every worker must use the same list in
+    the same order. ``max_buffer`` bounds the frames waiting to be written to
+    each shard, and ``send_timeout`` how long a send waits for room in a
+    full buffer before raising ChannelFull.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(self, shards=None, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 max_buffer=1000, send_timeout=5.0):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.shard_addresses = list(shards or [DEFAULT_SHARD])
+        self.max_buffer = max_buffer
+        self.send_timeout = send_timeout
+        self.client_prefix = "".join(random.choice(string.ascii_letters) for _ in range(12))
+        self._inboxes = {}
+        self._groups = {}   # group -> local member channels
+        self._lock = threading.Lock()
+        self._loop = None
+        self._shards = None
+
+    # I/O thread
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+            threading.Thread(target=self._serve, args=(ready,), name="channel-broker-client", daemon=True).start()
+            ready.wait()
+
+    def _serve(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._shards = [_Shard(self, address) for address in self.shard_addresses]
+        for shard in self._shards:
+            loop.create_task(shard.run())
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+        loop.close()
+
+    def handshake(self, shard):
+        index = self._shards.index(shard)
+        with self._lock:
+            groups = [group for group in self._groups if shard_index(group, len(self._shards)) == index]
+        return _frame(op="hello", client=self.client_prefix) + b"".join(
+            _frame(op="sub", group=group) for group in groups
+        )
+
+    async def _put(self, name, frame):
+        """
+        Queue ``frame`` for the shard owning ``name``. A full buffer raises
+        ChannelFull at once while the shard is disconnected, and after
+        ``send_timeout`` seconds of waiting for room otherwise.
+        """
+        self._start()
+        shard = self._shards[shard_index(name, len(self._shards))]
+        if shard.offer(frame):
+            return
+        if not shard.connected:
+            raise ChannelFull(name)
+        queued = asyncio.wrap_future(asyncio.run_coroutine_threadsafe(shard.put(frame), self._loop))
+        try:
+            await asyncio.wait_for(queued, self.send_timeout)
+        except asyncio.TimeoutError:
+            raise ChannelFull(name)
+
+    async def _subscription(self, group, frame):
+        """Queue a sub/unsub frame; a dropped one is repaired by the handshake on reconnect"""
+        try:
+            await self._put(group, frame)
+        except ChannelFull:
+            logger.warning("Channel broker buffer full, subscription change for %s deferred", group)
+
+    def dispatch(self, frame):
+        """Deliver a frame from the broker to the local channels it targets"""
+        op, message = frame.get("op"), frame.get("message")
+        if op == "group":
+            with self._lock:
+                channels = list(self._groups.get(frame["group"], ()))
+            for channel in channels:
+                self._inbox(channel).put(message)
+        elif op == "send":
+            self._inbox(frame["channel"]).put(message)
+
+    def _inbox(self, channel):
+        with self._lock:
+            inbox = self._inboxes.get(channel)
+            if inbox is None:
+                inbox = self._inboxes[channel] = _Inbox(self.get_capacity(channel))
+            return inbox
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific"):
+        suffix = "".join(random.choice(string.ascii_letters) for _ in range(12))
+        return f"{prefix}.{self.client_prefix}!{suffix}"
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        owner = channel.split(".", 1)[-1].split("!", 1)[0] if "!" in channel else None
+        if owner is None or owner == self.client_prefix:
+            if not self._inbox(channel).put(message):
+                raise ChannelFull(channel)
+            return
+        await self._put(owner, _frame(op="send", client=owner, channel=channel, message=message))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        self._start()
+        inbox = self._inbox(channel)
+        try:
+            return await inbox.get()
+        except asyncio.CancelledError:
+            # The consumer went away; drop its inbox unless messages are waiting
+            with self._lock:
+                if not inbox.messages and self._inboxes.get(channel) is inbox:
+                    del self._inboxes[channel]
+            raise
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        with self._lock:
+            members = self._groups.setdefault(group, set())
+            first = not members
+            members.add(channel)
+        if first:
+            await self._subscription(group, _frame(op="sub", group=group))
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        with self._lock:
+            members = self._groups.get(group)
+            if not members or channel not in members:
+                return
+            members.discard(channel)
+            last = not members
+            if last:
+                del self._groups[group]
+        if last:
+            await self._subscription(group, _frame(op="unsub", group=group))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        await self._put(group, _frame(op="group", group=group, message=message))
+
+    async def flush(self):
+        with self._lock:
+            groups, self._groups = list(self._groups), {}
+            self._inboxes = {}
+        for group in groups:
+            await self._subscription(group, _frame(op="unsub", group=group))
+
+    async def close(self):
+        """Disconnect from every shard and stop the I/O thread"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        def stop():
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+            loop.call_soon(loop.stop)
+
+        loop.call_soon_threadsafe(stop)
+
+
+class _Peer:
+    """A worker connected to the broker, with a bounded queue of lines to write to it"""
+
+    def __init__(self, writer, max_buffer):
+        self.writer = writer
+        self.max_buffer = max_buffer
+        self.pending = collections.deque()
+        self.ready = asyncio.Event()
+        self.groups = set()
+        self.client = None
+        self.dropped = 0
+
+    def push(self, line):
+        if len(self.pending) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self.pending.append(line)
+        self.ready.set()
+
+    async def write(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.pending:
+                batch = [self.pending.popleft() for _ in range(min(WRITE_BATCH, len(self.pending)))]
+                self.writer.write(b"".join(batch))
+                await self.writer.drain()
+
+
+class Broker:
+    """One shard: tracks which workers follow which groups and relays frames between them"""
+
+    def __init__(self, max_buffer=10000):
+        self.max_buffer = max_buffer
+        self.clients = {}
+        self.groups = collections.defaultdict(set)
+
+    async def handle(self, reader, writer):
+        peer = _Peer(writer, self.max_buffer)
+        writing = asyncio.ensure_future(peer.write())
+        try:
+            while line := await reader.readline():
+                self.route(peer, line)
+        except (OSError, ValueError) as exc:
+            logger.warning("Channel broker peer %s failed: %s", peer.client, exc)
+        finally:
+            writing.cancel()
+            self.forget(peer)
+            writer.close()
+
+    def route(self, peer, line):
+        frame = json.loads(line)
+        op = frame.get("op")
+        if op == "group":
+            # Relay the received bytes; the message is never re-encoded
+            for member in self.groups.get(frame["group"], ()):
+                member.push(line)
+        elif op == "send":
+            target = self.clients.get(frame["client"])
+            if target is not None:
+                target.push(line)
+        elif op == "sub":
+            self.groups[frame["group"]].add(peer)
+            peer.groups.add(frame["group"])
+        elif op == "unsub":
+            self.groups[frame["group"]].discard(peer)
+            peer.groups.discard(frame["group"])
+            if not self.groups[frame["group"]]:
+                del self.groups[frame["group"]]
+        elif op == "hello":
+            peer.client = frame["client"]
+            self.clients[peer.client] = peer
+
+    def forget(self, peer):
+        if peer.client is not None and self.clients.get(peer.client) is peer:
+            del self.clients[peer.client]
+        for group in peer.groups:
+            self.groups[group].discard(peer)
+            if not self.groups[group]:
+                del self.groups[group]
+        if peer.dropped:
+            logger.warning("Channel broker dropped %s frames for slow peer %s", peer.dropped, peer.client)
+
+    async def serve(self, address):
+        url = urlparse(address)
+        if url.scheme == "unix":
+            server = await asyncio.start_unix_server(self.handle, url.path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self.handle, url.hostname, url.port, limit=LINE_LIMIT)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,73 @@
+from rest_framework import serializers
+
+
+def _query_list(request, name):
+    value = request.query_params.get(name) if request is not None else None
+    if value is None:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def field_names(request):
+    """Top-level fields the client kept with ``?fields=``; None when the parameter is absent"""
+    return _query_list(request, 'fields')
+
+
+def trim_fields(data, request):
+    """``data`` reduced to the top-level keys kept with ``?fields=``"""
+    keep = field_names(request)
+    if keep is None:
+        return data
+    return {name: value for name, value in data.items() if name in keep}
+
+
+def expand_paths(request):
+    """
+    Relations the client asked to expand with ``?expand=``, including the
+    parents of dotted paths; None when the parameter is absent, meaning
+    every relation is expanded.
+    """
+    paths = _query_list(request, 'expand')
+    if paths is None:
+        return None
+    expanded = set()
+    for path in paths:
+        parts = path.split('.')
+        expanded.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return expanded
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients trim a response with ``?fields=`` and ``?expand=``.
+
+    ``fields`` lists the top-level fields to keep. Relations named in
+    ``expandable_fields`` are nested in full only when listed in ``expand``
+    (dotted for deeper levels, e.g. ``expand=items.product.vendor``);
+    otherwise a related object collapses to its primary key and a computed
+    field is left out. Without ``expand`` everything is nested as before.
+    """
+    expandable_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        prefix = getattr(self, 'expand_prefix', '')
+        if not prefix:
+            keep = field_names(request)
+            if keep is not None:
+                fields = {name: field for name, field in fields.items() if name in keep}
+        expanded = expand_paths(request)
+        for name in list(fields):
+            field = fields[name]
+            if expanded is not None and name in self.expandable_fields and prefix + name not in expanded:
+                if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField)):
+                    fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, source=field.source)
+                else:
+                    del fields[name]
+                continue
+            # Nested serializers resolve their own expandable fields under this path
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, SparseFieldsMixin):
+                nested.expand_prefix = f"{prefix}{name}."
+        return fields
@@ -0,0 +1,97 @@
+import asyncio
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from channels.exceptions import ChannelFull
+from django.test import SimpleTestCase
+
+from .layers import Broker, BrokerChannelLayer
+
+
+class BrokerChannelLayerTests(SimpleTestCase):
+    """Two worker layers exchange messages through one broker shard"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.address = f"unix://{Path(cls.directory.name) / 'broker.sock'}"
+        cls.broker = Broker()
+        cls.loop = asyncio.new_event_loop()
+        threading.Thread(target=cls.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(cls.broker.serve(cls.address), cls.loop)
+
+    @classmethod
+    def tearDownClass(cls):
+        # The layers' I/O threads stay connected until the process exits,
+        # so the broker keeps running; only its socket file goes
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    async def subscribed(self, group, peers):
+        """Wait until ``peers`` worker processes follow ``group`` on the broker"""
+        for _ in range(500):
+            if len(self.broker.groups.get(group, ())) == peers:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"{group} never reached {peers} subscribers")
+
+    def test_group_send_reaches_other_worker(self):
+        async def scenario():
+            sender, receiver = BrokerChannelLayer(shards=[self.address]), BrokerChannelLayer(shards=[self.address])
+            local = await sender.new_channel()
+            remote = await receiver.new_channel()
+            await sender.group_add("order_7", local)
+            await receiver.group_add("order_7", remote)
+            await self.subscribed("order_7", 2)
+
+            message = {"type": "order.event", "text": '{"order_id":7}'}
+            await sender.group_send("order_7", message)
+            self.assertEqual(await asyncio.wait_for(receiver.receive(remote), 5), message)
+            self.assertEqual(await asyncio.wait_for(sender.receive(local), 5), message)
+
+            await receiver.group_discard("order_7", remote)
+            await self.subscribed("order_7", 1)
+
+        asyncio.run(scenario())
+
+    def test_send_reaches_channel_of_other_worker(self):
+        async def scenario():
+            sender, receiver = BrokerChannelLayer(shards=[self.address]), BrokerChannelLayer(shards=[self.address])
+            channel = await receiver.new_channel()
+            # The receiving layer registers with the broker once its I/O thread connects
+            receiving = asyncio.ensure_future(receiver.receive(channel))
+            for _ in range(500):
+                if receiver.client_prefix in self.broker.clients:
+                    break
+                await asyncio.sleep(0.01)
+            await sender.send(channel, {"type": "rider.location", "lat": 2046000})
+            self.assertEqual(await asyncio.wait_for(receiving, 5), {"type": "rider.location", "lat": 2046000})
+
+        asyncio.run(scenario())
+
+
+class BrokerOutageTests(SimpleTestCase):
+    """Senders never hang when no broker is reachable"""
+
+    def test_full_buffer_fails_fast_without_broker(self):
+        async def scenario():
+            with tempfile.TemporaryDirectory() as directory:
+                layer = BrokerChannelLayer(shards=[f"unix://{directory}/missing.sock"], max_buffer=5, send_timeout=0.5)
+                try:
+                    message = {"type": "order.event", "text": "{}"}
+                    for _ in range(5):
+                        await layer.group_send("orders", message)
+                    started = time.monotonic()
+                    with self.assertRaises(ChannelFull):
+                        await asyncio.wait_for(layer.group_send("orders", message), 2)
+                    self.assertLess(time.monotonic() - started, 0.5)
+                    # Joining a group still works; the subscription is sent once a broker is reachable
+                    await layer.group_add("orders", await layer.new_channel())
+                finally:
+                    await layer.close()
+
+        with self.assertLogs('core.layers', 'WARNING'):
+            asyncio.run(scenario())
@@ -50,6 +50,7 @@ urlpatterns = [
     path('api/', include(router.urls)),  # Add router URLs
     path('api/riders', RiderViewSet.as_view({'get': 'list', 'post': 'create'}), name='rider-list'),
     path('api/rider/profile/', RiderViewSet.as_view({'get': 'profile', 'put': 'profile'}), name='rider-profile'),
+    path('api/vendors/nearby', VendorViewSet.as_view({'get': 'nearby'}), name='vendor-nearby'),
     path('api/vendor/profile/', VendorViewSet.as_view({'get': 'profile', 'put': 'profile'}), name='vendor-profile'),
     path('api/admin/analytics/summary/', admin_analytics_summary, name='admin-analytics-summary'),
     path('api/admin/analytics/detailed/', admin_analytics_detailed, name='admin-analytics-detailed'),
@@ -163,8 +163,9 @@ export async function createRider(payload) {
   return data
 }
 
-export async function fetchOrders(params) {
-  const { data } = await api.get('/orders/', { params })
+// One page of orders, newest first: { results, next }. Pass a page's `next` to fetch the one after it.
+export async function fetchOrders(params, next) {
+  const { data } = next ? await api.get(next) : await api.get('/orders/', { params })
   return data
 }
 
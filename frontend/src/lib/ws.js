@@ -1,4 +1,5 @@
 import { webSocketService } from '../services/api'
+import { getAuthTokens } from '../utils/auth'
 
 /**
  * Legacy function for backward compatibility
@@ -42,6 +43,42 @@ export function connectOrderDetail(orderId, onMessage) {
   }
 }
 
+/**
+ * Subscribe to one order's tracking stream.
+ * The server sends a full `rider_location` keyframe followed by
+ * `rider_location_delta` frames in microdegrees; this rebuilds positions.
+ * @param {string|number} orderId - Order to track
+ * @param {Function} onLocation - Called with { riderId, lat, lon, ts }
+ * @param {Function} onStatus - Called when an order status broadcast arrives
+ */
+export function connectOrderLocation(orderId, onLocation, onStatus) {
+  const base = import.meta.env.VITE_WEBSOCKET_URL || 'ws://localhost:8000/ws'
+  const socket = new WebSocket(`${base}/orders/${orderId}/`)
+  let fix = null
+
+  socket.onopen = () => {
+    const { access } = getAuthTokens()
+    if (access) socket.send(JSON.stringify({ type: 'auth', token: access }))
+  }
+
+  socket.onmessage = (event) => {
+    const data = JSON.parse(event.data)
+    if (data.type === 'rider_location') {
+      fix = { riderId: data.rider_id, lat: data.lat, lon: data.lon, ts: data.ts }
+    } else if (data.type === 'rider_location_delta' && fix) {
+      fix = { ...fix, lat: fix.lat + data.dlat, lon: fix.lon + data.dlon, ts: fix.ts + data.dt }
+    } else {
+      if (onStatus && data.type !== 'auth_success' && data.type !== 'auth_error') onStatus(data)
+      return
+    }
+    onLocation({ riderId: fix.riderId, lat: fix.lat / 1e6, lon: fix.lon / 1e6, ts: fix.ts })
+  }
+
+  return {
+    close: () => socket.close()
+  }
+}
+
 /**
  * Connect to admin dashboard WebSocket for real-time updates
  * @param {Function} onMessage - Callback when a message is received
@@ -1,12 +1,9 @@
 import React, { useEffect, useState, useCallback } from 'react'
-import { fetchOrders, fetchPayments } from '../lib/api'
 import { Link } from 'react-router-dom'
 import { connectAdminDashboard } from '../lib/ws'
 import api from '../services/api'
 
 export default function Admin() {
-  const [orders, setOrders] = useState([])
-  const [payments, setPayments] = useState([])
   const [analytics, setAnalytics] = useState(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
@@ -16,19 +13,10 @@ export default function Admin() {
       setLoading(true)
       setError(null)
 
-      // Fetch analytics summary data
+      // Every dashboard figure comes from the analytics summary, computed over all orders
       const analyticsResponse = await api.get('/admin/analytics/summary/')
       setAnalytics(analyticsResponse.data)
 
-      // Also fetch recent orders and payments for detailed views
-      const [ordersData, paymentsData] = await Promise.all([
-        fetchOrders().catch(err => []),
-        fetchPayments().catch(err => [])
-      ])
-
-      setOrders(Array.isArray(ordersData) ? ordersData : [])
-      setPayments(Array.isArray(paymentsData) ? paymentsData : [])
-
     } catch (error) {
       console.error('Error loading admin data:', error)
       setError('Failed to load analytics data. Please try again.')
@@ -60,29 +48,6 @@ export default function Admin() {
     loadAnalyticsData()
   }
 
-  const todayStr = new Date().toISOString().slice(0,10)
-  const isToday = (iso) => (iso||'').startsWith(todayStr)
-  const ordersToday = (orders || []).filter(o => isToday(o.created_at))
-  const gmvToday = (ordersToday || []).reduce((s, o) => s + Number(o.total_amount||0), 0)
-  const byStatus = (orders || []).reduce((acc, o) => { acc[o.status] = (acc[o.status]||0)+1; return acc }, {})
-  const last7 = (() => {
-    const map = {}
-    const now = new Date()
-    for (let i=6;i>=0;i--) {
-      const d = new Date(now)
-      d.setDate(d.getDate()-i)
-      const key = d.toISOString().slice(0,10)
-      map[key] = 0
-    }
-    (orders || []).forEach(o => {
-      const key = (o.created_at||'').slice(0,10)
-      if (key in map) map[key] += 1
-    })
-    return map
-  })()
-
-  const chip = (text, cls) => <span className={`chip ${cls}`}>{text}</span>
-
   if (loading) {
     return (
       <div className="flex items-center justify-center min-h-64">
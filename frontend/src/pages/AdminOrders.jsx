@@ -5,19 +5,31 @@ import { connectOrders } from '../lib/ws'
 
 export default function AdminOrders() {
   const [orders, setOrders] = useState([])
+  const [next, setNext] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [status, setStatus] = useState('')
   const [from, setFrom] = useState('')
   const [to, setTo] = useState('')
 
   useEffect(() => {
     let active = true
+    let first = true
+    setOrders([])
+    setNext(null)
     const poll = async () => {
       const params = {}
       if (status) params.status = status
       if (from) params.from = from
       if (to) params.to = to
-      const data = await fetchOrders(params)
-      if (active) setOrders(data)
+      const page = await fetchOrders(params)
+      if (!active) return
+      // Refresh the newest page in place and keep any older pages already loaded
+      const fresh = new Set(page.results.map(o => o.id))
+      setOrders(prev => [...page.results, ...prev.filter(o => !fresh.has(o.id))])
+      if (first) {
+        setNext(page.next)
+        first = false
+      }
     }
     poll()
     const id = setInterval(poll, 3000)
@@ -29,6 +41,21 @@ export default function AdminOrders() {
     return () => { active = false; clearInterval(id) }
   }, [status, from, to])
 
+  const loadMore = async () => {
+    if (!next) return
+    setLoadingMore(true)
+    try {
+      const page = await fetchOrders(null, next)
+      setOrders(prev => {
+        const seen = new Set(prev.map(o => o.id))
+        return [...prev, ...page.results.filter(o => !seen.has(o.id))]
+      })
+      setNext(page.next)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const statusChip = (s) => {
     const map = {
       pending: 'bg-yellow-50 text-yellow-800 border-yellow-200',
@@ -118,13 +145,20 @@ export default function AdminOrders() {
             <tr key={o.id}>
               <td className="p-2 border"><Link to={`/orders/${o.id}`} className="text-brand-blue underline">#{o.id}</Link></td>
               <td className="p-2 border">{o.customer?.username}</td>
-              <td className="p-2 border">{o.vendor}</td>
+              <td className="p-2 border">{o.vendor_name || o.vendor}</td>
               <td className="p-2 border">{statusChip(o.status)}</td>
               <td className="p-2 border">${o.total_amount}</td>
             </tr>
           ))}
         </tbody>
       </table>
+      {next && (
+        <div className="mt-3 text-center">
+          <button className="btn-primary text-sm" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   )
 }
@@ -1,12 +1,13 @@
 import React, { useEffect, useState } from 'react'
 import { useParams, Link } from 'react-router-dom'
 import { fetchOrder } from '../lib/api'
-import { connectOrderDetail } from '../lib/ws'
+import { connectOrderLocation } from '../lib/ws'
 
 export default function OrderTracking() {
   const { orderId } = useParams()
   const [order, setOrder] = useState(null)
   const [loading, setLoading] = useState(false)
+  const [riderLocation, setRiderLocation] = useState(null)
 
   const load = async () => {
     setLoading(true)
@@ -20,11 +21,13 @@ export default function OrderTracking() {
 
   useEffect(() => {
     load()
-    const id = setInterval(load, 3000)
-    const ws = connectOrderDetail(orderId, () => {
-      load()
-    })
-    return () => clearInterval(id)
+    // Rider position and status changes arrive over the socket; polling is only a fallback
+    const id = setInterval(load, 30000)
+    const ws = connectOrderLocation(orderId, setRiderLocation, () => load())
+    return () => {
+      clearInterval(id)
+      ws.close()
+    }
   }, [orderId])
 
   const Step = ({ name, active }) => (
@@ -58,7 +61,7 @@ export default function OrderTracking() {
         <h1 className="text-2xl font-semibold">Order Tracking #{order.id}</h1>
         {statusChip(order.status)}
       </div>
-      <div className="mb-4 text-sm text-gray-600">Vendor: {order.vendor} • Total: ${order.total_amount}</div>
+      <div className="mb-4 text-sm text-gray-600">Vendor: {order.vendor_name || order.vendor} • Total: ${order.total_amount}</div>
       <div className="grid gap-2 mb-6">
         {steps.map(s => <Step key={s} name={s.replace('_',' ')} active={reached(s)} />)}
       </div>
@@ -66,6 +69,15 @@ export default function OrderTracking() {
         <div className="border rounded p-3 bg-white"><div className="text-gray-500">Created at</div><div className="font-medium">{order.created_at ? new Date(order.created_at).toLocaleString() : '—'}</div></div>
         <div className="border rounded p-3 bg-white"><div className="text-gray-500">Last updated</div><div className="font-medium">{order.updated_at ? new Date(order.updated_at).toLocaleString() : '—'}</div></div>
       </div>
+      {riderLocation && ['assigned', 'on_way'].includes(order.status) && (
+        <div className="mb-6 border rounded p-3 bg-white text-sm">
+          <div className="text-gray-500">Rider location</div>
+          <div className="font-medium">
+            {riderLocation.lat.toFixed(5)}, {riderLocation.lon.toFixed(5)}
+            <span className="text-gray-500 ml-2">{new Date(riderLocation.ts * 1000).toLocaleTimeString()}</span>
+          </div>
+        </div>
+      )}
       {!!order.events?.length && (
         <div className="mb-6">
           <div className="font-medium mb-2">Events</div>
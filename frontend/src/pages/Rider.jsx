@@ -104,7 +104,7 @@ const RiderDashboard = () => {
         setAvailableDeliveries(availableResponse.data || []);
 
         const myDeliveriesResponse = await riderDeliveryAPI.getMyDeliveries();
-        setMyDeliveries(myDeliveriesResponse.data || []);
+        setMyDeliveries(myDeliveriesResponse.data.results || []);
 
       } catch (error) {
         console.error('Error loading rider data:', error);
@@ -112,9 +112,10 @@ export const authAPI = {
 };
 
 // General Orders API functions (must be declared before vendorAPI object)
-export async function fetchOrders(params = {}) {
+// One page of orders, newest first: { results, next }. Pass a page's `next` to fetch the one after it.
+export async function fetchOrders(params = {}, next = null) {
   try {
-    const response = await api.get('/orders/', { params });
+    const response = next ? await api.get(next) : await api.get('/orders/', { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching orders:', error);